@@ -13,6 +13,15 @@ GCS_BUCKET_URI = f"gs://{BUCKET_ID}/data/"
 # Tables BigQuery
 BQ_LOGS_TABLE = f"{PROJECT_ID}.working.logs"
 
+# Connexions HTTP gardées ouvertes par client BigQuery partagé (voir src/bigquery_clients.py)
+BQ_HTTP_POOL_SIZE = 32
+
+# Résultats des requêtes (/execute, Streamlit) : lignes par page, plafonds de lignes et
+# d'octets (taille Arrow en mémoire) renvoyés pour une requête
+RESULT_PAGE_SIZE = 500
+RESULT_MAX_ROWS = 100_000
+RESULT_MAX_BYTES = 64 * 1024 * 1024
+
 # Fichiers pour fine-tuning
 FINETUNE_PATH = "Finetuning_dataset/finetuning_data.jsonl"
 VALIDATION_PATH = "Finetuning_dataset/validation_dataset.jsonl"
@@ -30,3 +39,83 @@ FIELDS_TO_ENHANCE = {
     "typo_produit": ["LIGNE", "FAMILLE"]
 }
 
+
+# Pré-classifieur de scope local (seuils de confiance sur la probabilité in_scope)
+SCOPE_CLASSIFIER_PATH = "models/scope_classifier.npz"
+SCOPE_LOCAL_THRESHOLDS = (0.25, 0.75)
+
+# Cache des requêtes SQL générées
+SQL_CACHE_MAXSIZE = 1024
+SQL_CACHE_TTL_SECONDS = 6 * 3600
+
+# Prédiction par lots (/predict/batch) : générations simultanées et taille maximale d'un lot
+BATCH_CONCURRENCY = 8
+BATCH_MAX_QUESTIONS = 1000
+
+# Génération en flux (/predict/stream) : fenêtre des mesures de TTFT, API lue par Streamlit
+# (vide : Streamlit exécute le pipeline en local)
+STREAM_METRICS_WINDOW = 1000
+STREAMLIT_API_URL = ""
+
+# Moteur d'évaluation (metrics.py, robust_eval.py) : lignes traitées en parallèle, débit par backend
+# (requêtes/s, rafale) et reprises avec backoff exponentiel sur les erreurs de quota
+EVAL_ROWS_IN_FLIGHT = 16
+EVAL_RATE_LIMITS = {"gemini": (10.0, 20), "bigquery": (5.0, 10)}
+EVAL_MAX_RETRIES = 5
+EVAL_RETRY_BASE_DELAY = 1.0
+EVAL_MAX_WORKERS = 32
+# Journaux JSONL des runs d'évaluation (reprise après interruption, agrégats en cours de run)
+EVAL_RUNS_DIR = "evaluation/runs"
+# Mémo SQLite des générations et notes du juge, partagé par les runs (None : pas d'expiration)
+EVAL_MEMO_PATH = "cache/eval_memo.sqlite3"
+EVAL_MEMO_MAX_AGE_SECONDS = None
+# Juge par lots : paires notées par appel (1 : un appel par paire), nouvelles demandes des paires
+# mal notées, attente maximale (s) avant d'envoyer un lot incomplet
+JUDGE_BATCH_SIZE = 10
+JUDGE_BATCH_MAX_REASKS = 2
+JUDGE_BATCH_MAX_WAIT_SECONDS = 0.2
+# Comparaison des résultats sur des fixtures DuckDB (lignes par table, 300 par défaut) ; une requête
+# dont le résultat est identique à la référence n'est pas envoyée au juge
+EXECUTION_MATCH_FIXTURE_ROWS = {"ticket_caisse": 5000}
+EXECUTION_MATCH_SEED = 0
+EVAL_EXECUTION_MATCH = True
+EVAL_SKIP_JUDGE_ON_MATCH = True
+
+# Cache sémantique (paraphrases)
+SEMANTIC_CACHE_ENABLED = True
+SEMANTIC_CACHE_THRESHOLD = 0.92
+SEMANTIC_CACHE_CAPACITY = 5000
+SEMANTIC_CACHE_DIR = "cache/semantic"
+SEMANTIC_CACHE_EMBEDDING_MODEL = "text-multilingual-embedding-002"
+
+# Snapshot local du schéma (partagé par le serving, Streamlit, l'évaluation et la génération du dataset)
+SCHEMA_SNAPSHOT_DIR = "schema_snapshots"
+SCHEMA_REFRESH_INTERVAL_SECONDS = 3600
+
+# Datasets (`projet.dataset`) que le SQL généré a le droit de lire (voir `sanitize_sql_output`)
+SQL_ALLOWED_DATASETS = (f"{PROJECT_ID}.{DATASET_ID}",)
+
+# Validation locale du SQL généré contre le snapshot de schéma (tables, colonnes, alias) avant tout appel BigQuery :
+# "reject" (la requête n'est ni renvoyée ni exécutée), "flag" (simple avertissement) ou "off"
+SQL_SCHEMA_VALIDATION = "reject"
+
+# Schema linking : le prompt ne contient que les tables/colonnes pertinentes pour la question
+SCHEMA_LINKING_ENABLED = True
+SCHEMA_LINKING_TOP_TABLES = 4
+SCHEMA_LINKING_TOP_COLUMNS = 8
+
+# Encodage du schéma dans le prompt v1 : "bullets", "ddl", "terse", "dedup" ou "json" (voir src/schema/render.py)
+SCHEMA_ENCODING = "bullets"
+
+# Index local des valeurs des colonnes FIELDS_TO_ENHANCE (seules les valeurs citées vont dans le prompt)
+VALUE_INDEX_PATH = "schema_snapshots/value_index.json"
+VALUE_INDEX_FUZZY_THRESHOLD = 0.85
+VALUE_INDEX_MAX_PARTIAL = 10
+# Candidats (ceux qui partagent le plus de trigrammes) comparés par n-gramme dans la passe approximative
+VALUE_INDEX_MAX_FUZZY_CANDIDATES = 8
+
+# Catalogue des valeurs distinctes : "union" (une requête UNION ALL) ou "parallel" (une requête par colonne)
+VALUE_CATALOG_METHOD = "union"
+VALUE_CATALOG_MAX_WORKERS = 8
+VALUE_CATALOG_LIMIT = 150
+VALUE_CATALOG_MAX_AGE_SECONDS = 86400  # tables sans date de modification (vues) : relecture quotidienne
@@ -0,0 +1,87 @@
+# scripts/benchmark_bq_clients.py
+"""
+Surcoût par requête du client BigQuery : un client créé à chaque appel (ancien code) contre le
+client partagé du registre (`src/bigquery_clients.py`).
+
+Sans `--live`, seule la préparation du client est mesurée (création + identifiants contre
+lecture du registre), hors-ligne : identifiants par défaut s'ils existent, anonymes sinon.
+Avec `--live N`, N dry-runs `SELECT 1` sont envoyés à BigQuery avec un client neuf par appel
+(nouvelle session HTTP, nouvelle connexion TLS, jeton rechargé) puis avec le client partagé.
+
+    PYTHONPATH=. python scripts/benchmark_bq_clients.py [--calls 200] [--live 20]
+"""
+import argparse
+import statistics
+import time
+from google.cloud import bigquery
+from config.settings import PROJECT_ID, BQ_LOCATION
+from src.bigquery_clients import BigQueryClientRegistry
+
+
+def load_credentials():
+    import google.auth
+    from google.auth.credentials import AnonymousCredentials
+
+    try:
+        credentials, _ = google.auth.default(scopes=bigquery.Client.SCOPE)
+        return credentials, "par défaut"
+    except Exception:
+        return AnonymousCredentials(), "anonymes (pas d'identifiants par défaut)"
+
+
+def timings(fn, calls: int):
+    durations = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def report(label: str, durations, reference=None):
+    p50 = statistics.median(durations) * 1e3
+    line = f"{label:<28} p50 {p50:9.3f} ms | moyenne {statistics.mean(durations) * 1e3:9.3f} ms"
+    if reference:
+        line += f"  (x{statistics.median(reference) / statistics.median(durations):.0f})"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200, help="Clients préparés par mode (hors-ligne)")
+    parser.add_argument("--live", type=int, default=0, help="Dry-runs envoyés à BigQuery par mode")
+    args = parser.parse_args()
+
+    credentials, origin = load_credentials()
+    print(f"Identifiants : {origin}\n")
+
+    def per_call_client():
+        import google.auth
+
+        # Ancien code : `bigquery.Client(project=...)` recharge les identifiants à chaque appel
+        if origin == "par défaut":
+            google.auth.default(scopes=bigquery.Client.SCOPE)
+        return bigquery.Client(project=PROJECT_ID, location=BQ_LOCATION, credentials=credentials)
+
+    registry = BigQueryClientRegistry(factory=lambda project_id, location: bigquery.Client(
+        project=project_id, location=location, credentials=credentials))
+    registry.get(PROJECT_ID, BQ_LOCATION)
+
+    per_call = timings(per_call_client, args.calls)
+    report("Client créé par appel", per_call)
+    report("Registre partagé", timings(lambda: registry.get(PROJECT_ID, BQ_LOCATION), args.calls), per_call)
+
+    if args.live:
+        from src.bigquery_clients import get_bq_client
+
+        config = bigquery.QueryJobConfig(dry_run=True, use_query_cache=False)
+        shared = get_bq_client()
+        shared.query("SELECT 1", job_config=config)  # connexion ouverte avant la mesure
+        print(f"\nDry-run `SELECT 1` ({args.live} appels par mode)")
+        fresh = timings(lambda: bigquery.Client(project=PROJECT_ID, location=BQ_LOCATION).query("SELECT 1", job_config=config), args.live)
+        report("Client créé par appel", fresh)
+        report("Client partagé (pool HTTP)", timings(lambda: shared.query("SELECT 1", job_config=config), args.live), fresh)
+
+
+if __name__ == "__main__":
+    main()
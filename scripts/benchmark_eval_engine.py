@@ -0,0 +1,113 @@
+# scripts/benchmark_eval_engine.py
+"""
+Durée d'une évaluation robuste (scope, 2 générations, 2 exécutions, 2 notes du juge par ligne) :
+ancienne boucle série contre `EvaluationEngine`.
+
+Les appels distants sont simulés (latences par étape, taux d'erreurs de quota `--quota-errors`),
+le juge note les paires par lots (`JUDGE_BATCH_SIZE`). `--time-scale` divise toutes les durées
+et multiplie les débits autorisés, pour mesurer en quelques secondes une évaluation qui
+prendrait des minutes. Les temps affichés sont ramenés à l'échelle réelle. Un second run avec le mémo (`MemoStore` en mémoire) mesure la reprise d'une
+évaluation inchangée et le temps d'une lecture du mémo.
+
+    PYTHONPATH=. python scripts/benchmark_eval_engine.py [--rows 200] [--quota-errors 0.02] [--time-scale 50]
+"""
+import argparse
+import asyncio
+import random
+import time
+import timeit
+from config.settings import EVAL_RATE_LIMITS, EVAL_ROWS_IN_FLIGHT
+from src.evaluation.engine import EvaluationEngine, EvaluationStages
+from src.evaluation.memo import MemoStore
+
+# Latences simulées par étape (s), ordre de grandeur mesuré sur Vertex AI / BigQuery
+LATENCIES = {"scope": 0.6, "generate": 1.5, "execute": 1.2, "judge": 0.8, "judge_batch": 2.0}
+
+
+class QuotaExceeded(Exception):
+    code = 429
+
+
+def simulated_stages(scale: float, quota_errors: float, seed: int = 0) -> EvaluationStages:
+    rng = random.Random(seed)
+
+    async def wait(stage: str):
+        await asyncio.sleep(LATENCIES[stage] * rng.uniform(0.7, 1.3) / scale)
+        if rng.random() < quota_errors:
+            raise QuotaExceeded("429 RESOURCE_EXHAUSTED")
+
+    async def scope(question):
+        await wait("scope")
+        return "in_scope"
+
+    async def generate(question, use_ft_model):
+        await wait("generate")
+        return f"SELECT {len(question)} AS n"
+
+    async def execute(sql):
+        await wait("execute")
+        return True
+
+    async def judge(question, expected_sql, predicted_sql):
+        await wait("judge")
+        return 2.0
+
+    async def judge_batch(pairs):
+        await wait("judge_batch")
+        return [2.0] * len(pairs)
+
+    return EvaluationStages(scope=scope, generate=generate, execute=execute, judge=judge, judge_batch=judge_batch, match=None, validate=None,
+                            generation_key=lambda question, use_ft_model: ("ft" if use_ft_model else "base", "sim", 0.2))
+
+
+def serial_duration(rows: int) -> float:
+    """Durée de l'ancienne boucle : les 7 appels de chaque ligne l'un après l'autre."""
+    return rows * (LATENCIES["scope"] + 2 * (LATENCIES["generate"] + LATENCIES["execute"] + LATENCIES["judge"]))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--rows-in-flight", type=int, default=EVAL_ROWS_IN_FLIGHT)
+    parser.add_argument("--quota-errors", type=float, default=0.02, help="Proportion d'appels rejetés pour quota")
+    parser.add_argument("--time-scale", type=float, default=50.0, help="Accélération de la simulation")
+    args = parser.parse_args()
+
+    scale = args.time_scale
+    rows = [(f"Question {i} ?", f"SELECT {i}") for i in range(args.rows)]
+    memo = MemoStore(":memory:")
+
+    def make_engine():
+        return EvaluationEngine(
+            stages=simulated_stages(scale, args.quota_errors),
+            memo=memo,
+            rate_limits={backend: (rate * scale, burst) for backend, (rate, burst) in EVAL_RATE_LIMITS.items()},
+            rows_in_flight=args.rows_in_flight,
+            retry_base_delay=1.0 / scale,
+        )
+
+    engine = make_engine()
+    start = time.perf_counter()
+    results = engine.run(rows, with_scope=True, desc="⏱️ Simulation")
+    elapsed = (time.perf_counter() - start) * scale
+    rerun = make_engine()
+    start = time.perf_counter()
+    rerun.run(rows, with_scope=True, desc="⏱️ Simulation (mémo)")
+    rerun_elapsed = (time.perf_counter() - start) * scale
+    memo_stats = memo.stats()
+    lookup_us = timeit.timeit(lambda: memo.get_judgment("j", "p", "Question 1 ?", "SELECT 1", "SELECT 1 AS n"), number=2000) / 2000 * 1e6
+
+    serial = serial_duration(args.rows)
+    assert [r["question"] for r in results] == [q for q, _ in rows], "ordre des lignes non conservé"
+    print(f"Lignes : {args.rows} | débits : {EVAL_RATE_LIMITS} | lignes en parallèle : {args.rows_in_flight}")
+    print(f"Boucle série (estimée) : {serial:8.0f} s")
+    print(f"Moteur                 : {elapsed:8.0f} s  (x{serial / elapsed:.1f})")
+    print(f"Moteur, 2e run (mémo)  : {rerun_elapsed:8.0f} s  (appels : {dict(rerun.stats.calls)}, exécutions non mémorisées)")
+    print(f"Appels : {dict(engine.stats.calls)} | reprises sur quota : {dict(engine.stats.retries)} | "
+          f"échecs : {dict(engine.stats.failures)}")
+    print(f"Lecture du mémo : {lookup_us:.1f} µs | taux de succès : "
+          + ", ".join(f"{kind} {stats['hit_rate'] * 100:.0f}%" for kind, stats in memo_stats.items()))
+
+
+if __name__ == "__main__":
+    main()
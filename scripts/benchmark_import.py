@@ -0,0 +1,46 @@
+# scripts/benchmark_import.py
+"""
+Mesure le temps d'import des points d'entrée et vérifie qu'aucun accès réseau n'a lieu à l'import.
+
+Toute tentative de connexion (socket ou résolution DNS) pendant l'import est comptée et refusée.
+
+    PYTHONPATH=. python scripts/benchmark_import.py [module ...]
+"""
+import importlib
+import socket
+import sys
+import time
+
+DEFAULT_MODULES = ["src.inference.serve"]
+
+
+def block_network(attempts: list):
+    """Remplace les primitives réseau par des versions qui enregistrent puis refusent l'appel."""
+    def refuse(kind):
+        def _refuse(*args, **kwargs):
+            attempts.append((kind, args[1:2] if kind == "connect" else args[:2]))
+            raise OSError(f"Accès réseau interdit pendant l'import ({kind})")
+        return _refuse
+
+    socket.socket.connect = refuse("connect")
+    socket.socket.connect_ex = refuse("connect")
+    socket.getaddrinfo = refuse("getaddrinfo")
+    socket.create_connection = refuse("create_connection")
+
+
+def main(modules):
+    attempts = []
+    block_network(attempts)
+    for module in modules:
+        start = time.perf_counter()
+        importlib.import_module(module)
+        print(f"⏱️  import {module} : {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    if attempts:
+        print(f"❌ {len(attempts)} accès réseau pendant l'import : {attempts}")
+        sys.exit(1)
+    print("✅ Aucun accès réseau à l'import")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or DEFAULT_MODULES)
@@ -0,0 +1,85 @@
+# scripts/benchmark_schema_encoding.py
+"""
+Coût en tokens, temps de rendu et (option) qualité de génération de chaque encodage du schéma.
+
+Les tokens sont estimés localement (`estimate_tokens`) pour le schéma complet et pour le
+schéma réduit par le schema linking, en moyenne sur les questions du jeu de validation.
+Avec --with-model, le modèle de base génère le SQL des N premières questions avec chaque
+encodage ; la qualité est la note du juge (0 à 2) et, avec --execute, le taux d'exécution
+réussie sur BigQuery.
+
+    PYTHONPATH=. python scripts/benchmark_schema_encoding.py [--with-model 10] [--execute] [--live]
+"""
+import argparse
+import timeit
+import numpy as np
+from src.data.validation_set import load_validation_examples, load_validation_snapshot
+from src.prompts.prompt_v1 import SYSTEM_INSTRUCTION_TEMPLATE
+from src.schema.linking import SchemaLinker
+from src.schema.render import SCHEMA_RENDERERS, render_schema
+from src.text_utils import estimate_tokens
+
+
+def _prompt(tables, encoding: str) -> str:
+    return SYSTEM_INSTRUCTION_TEMPLATE.format(formatted_schema=render_schema(tables, encoding))
+
+
+def _linked_prompt(linked, encoding: str) -> str:
+    return SYSTEM_INSTRUCTION_TEMPLATE.format(formatted_schema=linked.render(encoding))
+
+
+def evaluate_generation(examples, tables, encoding: str, linker=None, execute: bool = False) -> dict:
+    """Note moyenne du juge (et taux d'exécution) du modèle de base avec cet encodage."""
+    from src.inference.predict import generate_sql_with_prompt
+    from src.security.safety_checks import dry_run_sql, evaluate_judge
+
+    scores, executed = [], []
+    for example in examples:
+        question = example["question"]
+        prompt = _linked_prompt(linker.link(question), encoding) if linker else _prompt(tables, encoding)
+        sql, _ = generate_sql_with_prompt(question, prompt)
+        scores.append(evaluate_judge(question, example["sql"], sql))
+        if execute:
+            executed.append(dry_run_sql(sql).valid)
+    return {
+        "judge": float(np.mean(scores)) if scores else 0.0,
+        "execution": float(np.mean(executed)) if executed else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--with-model", type=int, default=0, metavar="N", help="Génère le SQL des N premières questions")
+    parser.add_argument("--execute", action="store_true", help="Valide le SQL généré sur BigQuery en dry-run (avec --with-model)")
+    parser.add_argument("--no-linking", action="store_true", help="Génération avec le schéma complet")
+    parser.add_argument("--live", action="store_true", help="Snapshot de schéma courant au lieu du jeu de validation")
+    args = parser.parse_args()
+
+    if args.live:
+        from src.schema.snapshot import get_schema_snapshot
+        tables = get_schema_snapshot().tables
+    else:
+        tables = load_validation_snapshot().tables
+    examples = load_validation_examples()
+    linker = SchemaLinker(tables)
+    linked = [linker.link(example["question"]) for example in examples]
+
+    print(f"{'Encodage':<9} {'Tokens':>7} {'Avec linking':>13} {'Rendu (ms)':>11}" + (f" {'Juge':>6} {'Exéc.':>6}" if args.with_model else ""))
+    for encoding in SCHEMA_RENDERERS:
+        full_tokens = estimate_tokens(_prompt(tables, encoding))
+        linked_tokens = np.mean([estimate_tokens(_linked_prompt(l, encoding)) for l in linked])
+        runs = 50
+        render_ms = timeit.timeit(lambda: render_schema(tables, encoding), number=runs) / runs * 1000
+        line = f"{encoding:<9} {full_tokens:>7} {linked_tokens:>13.0f} {render_ms:>11.2f}"
+        if args.with_model:
+            quality = evaluate_generation(
+                examples[:args.with_model], tables, encoding,
+                linker=None if args.no_linking else linker, execute=args.execute,
+            )
+            execution = f"{quality['execution'] * 100:.0f}%" if quality["execution"] is not None else "-"
+            line += f" {quality['judge']:>6.2f} {execution:>6}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# scripts/benchmark_schema_fetch.py
+"""
+Compare l'extraction du schéma en une requête INFORMATION_SCHEMA à la boucle
+`list_tables` + un `get_table` par table (N+1 allers-retours).
+
+Hors-ligne, le schéma du jeu de validation est servi par `InMemorySchemaBackend`
+avec une latence simulée par aller-retour (un job de requête est plus lent qu'un
+appel `get_table` : `--query-latency` vs `--latency`) ; `--scale` duplique les tables pour
+simuler un dataset plus grand. `--live` mesure les deux méthodes sur BigQuery.
+
+    PYTHONPATH=. python scripts/benchmark_schema_fetch.py [--latency 0.15] [--query-latency 0.8] [--scale 5] [--live]
+"""
+import argparse
+import time
+from src.data.validation_set import load_validation_snapshot
+from src.schema.extract_schema import get_table_schemas_by_table
+from src.schema.information_schema import BigQuerySchemaBackend, InMemorySchemaBackend, fetch_schema
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.15, help="Latence simulée d'un appel d'API (s)")
+    parser.add_argument("--query-latency", type=float, default=0.8, help="Latence simulée d'un job de requête (s)")
+    parser.add_argument("--scale", type=int, default=1, help="Nombre de copies des tables du jeu de validation")
+    parser.add_argument("--live", action="store_true", help="Mesure sur BigQuery au lieu du backend simulé")
+    args = parser.parse_args()
+
+    if args.live:
+        client = BigQuerySchemaBackend().client
+        loop_client, backend = client, BigQuerySchemaBackend(client)
+    else:
+        tables = {
+            f"{table}_{i}" if i else table: info
+            for i in range(args.scale)
+            for table, info in load_validation_snapshot().tables.items()
+        }
+        loop_client = InMemorySchemaBackend(tables, latency=args.latency)
+        backend = InMemorySchemaBackend(tables, latency=args.query_latency)
+
+    loop_schemas, loop_time = _timed(lambda: get_table_schemas_by_table(client=loop_client))
+    (single_schemas, _), single_time = _timed(lambda: fetch_schema(backend=backend))
+
+    print(f"📊 {len(single_schemas)} tables, {sum(len(t['fields']) for t in single_schemas.values())} colonnes")
+    if not args.live:
+        print(f"   list_tables + get_table : {loop_client.round_trips} allers-retours")
+        print(f"   INFORMATION_SCHEMA      : {backend.round_trips} aller-retour")
+    print(f"⏱️  list_tables + get_table : {loop_time * 1000:.0f} ms")
+    print(f"⏱️  INFORMATION_SCHEMA      : {single_time * 1000:.0f} ms (x{loop_time / single_time:.1f})")
+    print(f"{'✅' if loop_schemas == single_schemas else '❌'} Schémas identiques")
+
+
+if __name__ == "__main__":
+    main()
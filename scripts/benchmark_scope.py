@@ -0,0 +1,95 @@
+# scripts/benchmark_scope.py
+"""
+Benchmark du pré-classifieur de scope local face au juge Gemini.
+
+Rapporte le taux de repli vers le LLM, l'accord avec le juge (ou avec les
+étiquettes connues avec --no-llm) et la latence économisée.
+
+Les questions de test_scope font aussi partie des exemples d'amorce : par défaut, le
+classifieur mesuré est réentraîné sans aucune des questions du benchmark (jeu tenu à
+l'écart). --shared-model mesure le modèle servi (`get_scope_classifier`), qui a pu voir
+ces questions à l'entraînement.
+
+    PYTHONPATH=. python scripts/benchmark_scope.py [--no-llm] [--with-logs] [--shared-model]
+"""
+import argparse
+import json
+import time
+import numpy as np
+from src.security.scope_classifier import get_scope_classifier, load_logged_questions, train_scope_classifier
+
+VALIDATION_JSON = "Finetuning_dataset/validation_dataset.json"
+
+# Questions de scripts/test_scope.py, avec l'étiquette attendue
+TEST_SCOPE_QUESTIONS = [
+    ("Quel est le chiffre d'affaires total en 2023 ?", "in_scope"),
+    ("Combien de clients ont acheté un produit en solde ?", "in_scope"),
+    ("Quelle est la capitale de la France ?", "out_of_scope"),
+    ("Combien de tickets ont été vendus à Paris ?", "in_scope"),
+    ("Combien de temps met la lumière à traverser la galaxie ?", "out_of_scope"),
+    ("Qui a gagné la coupe du monde en 2018 ?", "out_of_scope"),
+    ("Quels sont les produits les plus vendus par région ?", "in_scope"),
+]
+
+
+def load_benchmark_questions(with_logs: bool = False):
+    """Questions étiquetées : test_scope + validation (in_scope) + logs approuvés (in_scope)."""
+    questions = list(TEST_SCOPE_QUESTIONS)
+    with open(VALIDATION_JSON, encoding="utf-8") as f:
+        for example in json.load(f):
+            questions.append((example["contents"][0]["parts"][0]["text"], "in_scope"))
+    if with_logs:
+        questions += [(q, "in_scope") for q in load_logged_questions()]
+    return questions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--no-llm", action="store_true", help="Compare aux étiquettes connues sans appeler Gemini")
+    parser.add_argument("--with-logs", action="store_true", help="Ajoute les questions approuvées de working.logs")
+    parser.add_argument("--shared-model", action="store_true",
+                        help="Mesure le modèle servi au lieu d'un modèle entraîné sans les questions du benchmark")
+    args = parser.parse_args()
+
+    questions = load_benchmark_questions(args.with_logs)
+    if args.shared_model:
+        classifier = get_scope_classifier()
+    else:
+        classifier = train_scope_classifier(exclude=[question for question, _ in questions])
+
+    local_latencies, llm_latencies = [], []
+    confident, agree = 0, 0
+    for question, label in questions:
+        start = time.perf_counter()
+        local_scope = classifier.classify(question)
+        local_latencies.append(time.perf_counter() - start)
+
+        reference = label
+        if not args.no_llm:
+            from src.security.scope_filter import classify_scope_llm
+
+            start = time.perf_counter()
+            reference = classify_scope_llm(question)
+            llm_latencies.append(time.perf_counter() - start)
+
+        if local_scope is not None:
+            confident += 1
+            agree += local_scope == reference
+
+    total = len(questions)
+    local_mean_us = np.mean(local_latencies) * 1e6
+    origin = "modèle servi" if args.shared_model else "tenues à l'écart de l'entraînement"
+    print(f"📊 Questions évaluées : {total} ({origin})")
+    print(f"↪️  Taux de repli vers le LLM : {(total - confident) / total * 100:.1f}%")
+    print(f"🤝 Accord ({'étiquettes' if args.no_llm else 'juge Gemini'}) sur les cas tranchés : "
+          f"{(agree / confident * 100) if confident else 0:.1f}% ({agree}/{confident})")
+    print(f"⚡ Latence locale : moyenne {local_mean_us:.0f} µs, p95 {np.percentile(local_latencies, 95) * 1e6:.0f} µs")
+    if llm_latencies:
+        llm_mean = np.mean(llm_latencies)
+        saved = confident * llm_mean - np.sum(local_latencies)
+        print(f"🐢 Latence juge Gemini : moyenne {llm_mean * 1000:.0f} ms")
+        print(f"⏱️  Latence économisée : {saved:.2f} s au total, {saved / total * 1000:.0f} ms par question")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# scripts/benchmark_sql_safety.py
+"""
+`sanitize_sql_output` (une expression parcourue une seule fois, mots-clés et datasets de
+toutes les tables vérifiés dans le même parcours) contre l'ancienne boucle (un `re.search`
+par mot-clé interdit) : durée par requête sur le corpus de SQL généré, et verdicts
+différents entre les deux.
+
+Corpus : requêtes de référence du jeu de validation et, avec --run-id, SQL de base et
+fine-tuné d'un run d'évaluation ; plus quelques requêtes piégées (mot-clé dans une chaîne,
+colonnes `update_date` ou `load`, plusieurs instructions, MERGE, autre dataset).
+
+    PYTHONPATH=. python scripts/benchmark_sql_safety.py [--run-id RUN] [--repeat 200]
+"""
+import argparse
+import re
+import timeit
+from src.data.validation_set import load_validation_examples
+from src.evaluation.run_log import RunLog
+from src.security.safety_checks import sanitize_sql_output
+
+LEGACY_KEYWORDS = ["DROP", "DELETE", "ALTER", "TRUNCATE", "UPDATE", "INSERT"]
+
+TRAPS = [
+    "SELECT COUNT(*) FROM ticket_caisse WHERE LIBELLE = 'DELETE'",
+    "SELECT MAX(update_date) FROM ticket_caisse",
+    "SELECT t.load, COUNT(*) set FROM ticket_caisse t GROUP BY t.load",
+    "SELECT 1; SELECT * FROM ticket_caisse",
+    "WITH t AS (SELECT 1 AS x) MERGE ticket_caisse USING t ON FALSE WHEN NOT MATCHED THEN INSERT ROW",
+    "SELECT * FROM autre_dataset.clients",
+    "SELECT * FROM reine_des_maracas.magasin m, autre_dataset.clients c WHERE m.id = c.id",
+    "SELECT 1; BEGIN DECLARE x INT64; END",
+]
+
+
+def legacy_sanitize_sql_output(sql):
+    """Version précédente de `sanitize_sql_output` (référence du benchmark)."""
+    sql = sql.strip().strip('"').strip("'").strip()
+    if not sql:
+        return False, "Sortie vide"
+    if sql.lower() in ["true", "false"]:
+        return False, "Sortie booléenne invalide"
+    if not sql.lower().startswith("select") and not sql.lower().startswith("with"):
+        return False, "La requête ne commence pas par SELECT ou WITH"
+    for keyword in LEGACY_KEYWORDS:
+        if re.search(rf'\b{keyword}\b', sql, re.IGNORECASE):
+            return False, f"Mot-clé interdit détecté : {keyword}"
+    return True, "OK"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--run-id", help="Run d'évaluation dont le SQL généré complète le corpus")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    corpus = [example["sql"] for example in load_validation_examples()]
+    if args.run_id:
+        corpus += [row[f"{model}_sql"] for row in RunLog(args.run_id).read() for model in ("base", "ft") if row[f"{model}_sql"]]
+    corpus += TRAPS
+
+    timings = {}
+    for name, fn in (("boucle par mot-clé", legacy_sanitize_sql_output), ("passage unique", sanitize_sql_output)):
+        seconds = timeit.timeit(lambda: [fn(sql) for sql in corpus], number=args.repeat)
+        timings[name] = seconds / (args.repeat * len(corpus)) * 1e6
+    print(f"{len(corpus)} requête(s), {sum(len(sql) for sql in corpus) / len(corpus):.0f} caractères en moyenne")
+    for name, us in timings.items():
+        print(f"{name:<22} {us:7.1f} µs / requête")
+
+    print("\nVerdicts différents :")
+    for sql in corpus:
+        before, after = legacy_sanitize_sql_output(sql), sanitize_sql_output(sql)
+        if before[0] != after[0]:
+            print(f"  {'accepté' if before[0] else before[1]} → {'accepté' if after[0] else after[1]} : {sql[:90]}")
+
+
+if __name__ == "__main__":
+    main()
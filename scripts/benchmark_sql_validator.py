@@ -0,0 +1,76 @@
+# scripts/benchmark_sql_validator.py
+"""
+Validation locale du SQL (`SchemaValidator`) sur le jeu de validation : durée par requête
+(comparée à une analyse complète par sqlglot), faux rejets sur les requêtes de référence et
+détection d'erreurs typiques injectées (colonne inventée, table mal nommée, alias inconnu).
+
+    PYTHONPATH=. python scripts/benchmark_sql_validator.py [--repeat 20]
+"""
+import argparse
+import re
+import time
+import numpy as np
+from src.data.validation_set import load_validation_examples, load_validation_snapshot
+from src.schema.validator import SchemaValidator
+
+
+def corrupt(sql: str, tables) -> dict:
+    """Variantes invalides d'une requête de référence, par type d'erreur."""
+    variants = {}
+    for table, info in tables.items():
+        for field in info["fields"]:
+            if re.search(rf"\b{field['name']}\b", sql):
+                variants["colonne inventée"] = re.sub(rf"\b{field['name']}\b", f"{field['name']}_X", sql, count=1)
+                break
+        if re.search(rf"\b{table}\b", sql):
+            variants["table mal nommée"] = re.sub(rf"\b{table}\b", f"{table}s", sql, count=1)
+    qualified = re.search(r"\b([a-z]\w*)\.([A-Z_]+)\b", sql)
+    if qualified:
+        variants["alias inconnu"] = sql[:qualified.start(1)] + "zz" + sql[qualified.end(1):]
+    return variants
+
+
+def timed(fn, sqls, repeat):
+    durations = []
+    for sql in sqls:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn(sql)
+        durations.append((time.perf_counter() - start) / repeat * 1e6)
+    return durations
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    snapshot = load_validation_snapshot()
+    validator = SchemaValidator(snapshot.tables, snapshot.project_id, snapshot.dataset_id, mode="reject")
+    gold = [example["sql"] for example in load_validation_examples()]
+
+    false_rejections = [sql for sql in gold if not validator.check(sql).valid]
+    detected, total = {}, {}
+    for sql in gold:
+        for kind, variant in corrupt(sql, snapshot.tables).items():
+            total[kind] = total.get(kind, 0) + 1
+            detected[kind] = detected.get(kind, 0) + (not validator.check(variant).valid)
+
+    local = timed(validator.check, gold, args.repeat)
+    print(f"{len(gold)} requêtes de référence, {len(false_rejections)} rejetée(s) à tort")
+    print(f"Validation locale : p50 {np.percentile(local, 50):.0f} µs, p95 {np.percentile(local, 95):.0f} µs")
+    try:
+        import sqlglot
+
+        parsed = timed(lambda sql: sqlglot.parse_one(sql, read="bigquery"), gold, max(1, args.repeat // 4))
+        print(f"Analyse sqlglot   : p50 {np.percentile(parsed, 50):.0f} µs, p95 {np.percentile(parsed, 95):.0f} µs")
+    except ImportError:
+        pass
+    for kind in total:
+        print(f"  {kind:<18} détectée(s) : {detected[kind]}/{total[kind]}")
+    for sql in false_rejections:
+        print(f"⚠️ {validator.check(sql).reason} : {sql[:120]}")
+
+
+if __name__ == "__main__":
+    main()
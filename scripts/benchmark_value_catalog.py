@@ -0,0 +1,71 @@
+# scripts/benchmark_value_catalog.py
+"""
+Compare les façons de lire les valeurs distinctes des colonnes `FIELDS_TO_ENHANCE` :
+une requête par colonne en série (ancienne boucle), les mêmes requêtes en parallèle
+(`--workers`), une seule requête `UNION ALL`, puis un rafraîchissement incrémental du
+catalogue après la modification d'une seule table.
+
+Hors-ligne, les valeurs du jeu de validation sont servies par `InMemorySchemaBackend` avec
+une latence simulée par job (`--query-latency`) ; `--scale` duplique les tables. `--live`
+mesure sur BigQuery.
+
+    PYTHONPATH=. python scripts/benchmark_value_catalog.py [--query-latency 0.8] [--workers 8] [--scale 3] [--live]
+"""
+import argparse
+import time
+from config.settings import FIELDS_TO_ENHANCE
+from src.data.validation_set import load_validation_snapshot
+from src.schema.information_schema import BigQuerySchemaBackend, InMemorySchemaBackend
+from src.schema.value_catalog import ValueCatalog, fetch_distinct_values
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--query-latency", type=float, default=0.8, help="Latence simulée d'un job de requête (s)")
+    parser.add_argument("--workers", type=int, default=8, help="Requêtes simultanées pour la méthode parallèle")
+    parser.add_argument("--scale", type=int, default=1, help="Nombre de copies des tables du jeu de validation")
+    parser.add_argument("--live", action="store_true", help="Mesure sur BigQuery au lieu du backend simulé")
+    args = parser.parse_args()
+
+    if args.live:
+        backend, fields = BigQuerySchemaBackend(), FIELDS_TO_ENHANCE
+    else:
+        snapshot = load_validation_snapshot()
+        copies = [(f"{table}_{i}" if i else table, table) for i in range(args.scale) for table in snapshot.tables]
+        backend = InMemorySchemaBackend({name: snapshot.tables[table] for name, table in copies},
+                                        latency=args.query_latency)
+        fields = {name: FIELDS_TO_ENHANCE[table] for name, table in copies if table in FIELDS_TO_ENHANCE}
+    columns = [(table, column) for table, names in fields.items() for column in names]
+    print(f"📊 {len(columns)} colonnes dans {len(fields)} tables")
+
+    results = {}
+    for label, method, workers in (("Série (1 requête/colonne)", "parallel", 1),
+                                   (f"Parallèle ({args.workers} requêtes)", "parallel", args.workers),
+                                   ("UNION ALL", "union", 1)):
+        before = getattr(backend, "round_trips", 0)
+        results[label], elapsed = _timed(lambda: fetch_distinct_values(columns, backend=backend, method=method, max_workers=workers))
+        jobs = f", {backend.round_trips - before} job(s)" if not args.live else ""
+        print(f"⏱️  {label:<28}: {elapsed * 1000:>6.0f} ms{jobs}")
+    reference = next(iter(results.values()))
+    print(f"{'✅' if all(r == reference for r in results.values()) else '❌'} Valeurs identiques")
+
+    catalog = ValueCatalog()
+    _, cold = _timed(lambda: catalog.refresh(fields, backend))
+    _, warm = _timed(lambda: catalog.refresh(fields, backend))
+    print(f"⏱️  Catalogue à froid           : {cold * 1000:>6.0f} ms ({len(columns)} colonnes)")
+    print(f"⏱️  Catalogue à jour            : {warm * 1000:>6.0f} ms (0 colonne relue)")
+    if not args.live:
+        table = next(iter(fields))
+        backend.touch(table)
+        refreshed, elapsed = _timed(lambda: catalog.refresh(fields, backend))
+        print(f"⏱️  Après modification de {table} : {elapsed * 1000:.0f} ms ({len(refreshed)} colonne(s) relue(s))")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# scripts/benchmark_value_index.py
+"""
+Latence de l'index des valeurs de colonnes (`ValueIndex`) : construction, recherche par
+question (p50/p99) et mise à jour incrémentale d'une colonne ; affiche les valeurs
+reconnues dans les questions du jeu de validation.
+
+`--live` utilise l'index courant (`VALUE_INDEX_PATH`, sinon le snapshot de schéma).
+
+    PYTHONPATH=. python scripts/benchmark_value_index.py [--runs 20] [--live] [--verbose]
+"""
+import argparse
+import time
+import numpy as np
+from src.data.validation_set import load_validation_examples, load_validation_snapshot
+from src.schema.value_index import ValueIndex, get_value_index
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=20, help="Nombre de passes sur les questions")
+    parser.add_argument("--live", action="store_true", help="Index courant au lieu du jeu de validation")
+    parser.add_argument("--verbose", action="store_true", help="Affiche les valeurs reconnues par question")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = get_value_index() if args.live else ValueIndex.from_tables(load_validation_snapshot().tables)
+    build_ms = (time.perf_counter() - start) * 1000
+    questions = [example["question"] for example in load_validation_examples()]
+
+    latencies = []
+    for _ in range(args.runs):
+        for question in questions:
+            start = time.perf_counter()
+            index.lookup(question)
+            latencies.append(time.perf_counter() - start)
+    latencies_us = np.array(latencies) * 1e6
+
+    (table, column), entry = next(iter(index.columns.items()))
+    start = time.perf_counter()
+    index.update_column(table, column, list(entry["values"]) + ["Nouvelle valeur"], version="bench")
+    update_ms = (time.perf_counter() - start) * 1000
+
+    matched = [index.lookup(question) for question in questions]
+    print(f"📚 {len(index)} valeurs indexées sur {len(index.columns)} colonnes, construction {build_ms:.1f} ms")
+    print(f"⏱️  Recherche : p50 {np.percentile(latencies_us, 50):.0f} µs | p99 {np.percentile(latencies_us, 99):.0f} µs"
+          f" ({len(latencies)} recherches)")
+    print(f"🔄 Mise à jour d'une colonne : {update_ms:.1f} ms")
+    print(f"🎯 Questions avec au moins une valeur reconnue : {sum(bool(m) for m in matched)}/{len(questions)}")
+    if args.verbose:
+        for question, matches in zip(questions, matched):
+            if matches:
+                found = ", ".join(f"{m.column}={m.value} ({m.kind})" for m in matches)
+                print(f"   {question[:70]} → {found}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# scripts/compare_judge_batching.py
+"""
+Juge par paire contre juge par lots : nombre d'appels, tokens (entrée / sortie), durée et
+accord des notes avec le juge par paire (notes identiques, écart absolu moyen).
+
+Les paires viennent d'un run d'évaluation (`--run-id` : SQL de base et fine-tuné de chaque
+ligne) ou, par défaut, du jeu de validation : chaque question est notée avec sa propre
+requête de référence (note attendue 2) et avec celle de la question suivante (note attendue 0).
+
+    PYTHONPATH=. python scripts/compare_judge_batching.py [--run-id RUN] [--limit 40] [--batch-sizes 5,10,20]
+"""
+import argparse
+import time
+from src.data.validation_set import load_validation_examples
+from src.evaluation.run_log import RunLog
+from src.security.safety_checks import judge_sql, judge_sql_batch
+
+
+def load_pairs(run_id, limit):
+    if run_id:
+        rows = RunLog(run_id).read()
+        pairs = [(r["question"], r["expected_sql"], r[f"{model}_sql"] or "") for r in rows for model in ("base", "ft")]
+    else:
+        examples = load_validation_examples()
+        pairs = []
+        for i, example in enumerate(examples):
+            pairs.append((example["question"], example["sql"], example["sql"]))
+            pairs.append((example["question"], example["sql"], examples[(i + 1) % len(examples)]["sql"]))
+    return pairs[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--run-id", help="Run d'évaluation dont les paires sont notées")
+    parser.add_argument("--limit", type=int, default=40, help="Nombre de paires")
+    parser.add_argument("--batch-sizes", default="5,10,20")
+    args = parser.parse_args()
+
+    pairs = load_pairs(args.run_id, args.limit)
+    usage = {}
+    start = time.perf_counter()
+    reference = [judge_sql(q, ref, pred, usage=usage) for q, ref, pred in pairs]
+    print(f"{len(pairs)} paire(s)\n")
+    print(f"{'Mode':<10} {'Appels':>7} {'Tok. entrée':>12} {'Tok. sortie':>12} {'Durée (s)':>10} {'Accord':>7} {'Écart':>6} {'Sans note':>10}")
+    print(f"{'paire':<10} {usage['calls']:>7} {usage['prompt_tokens']:>12} {usage['output_tokens']:>12} "
+          f"{time.perf_counter() - start:>10.1f} {'-':>7} {'-':>6} {0:>10}")
+
+    for batch_size in (int(size) for size in args.batch_sizes.split(",")):
+        usage = {}
+        start = time.perf_counter()
+        scores = judge_sql_batch(pairs, batch_size=batch_size, usage=usage)
+        elapsed = time.perf_counter() - start
+        scored = [(s, r) for s, r in zip(scores, reference) if s is not None]
+        agreement = sum(s == r for s, r in scored) / len(scored) * 100 if scored else 0.0
+        gap = sum(abs(s - r) for s, r in scored) / len(scored) if scored else 0.0
+        print(f"{f'lots de {batch_size}':<10} {usage['calls']:>7} {usage['prompt_tokens']:>12} {usage['output_tokens']:>12} "
+              f"{elapsed:>10.1f} {agreement:>6.0f}% {gap:>6.2f} {len(scores) - len(scored):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# scripts/evaluate_execution_match.py
+"""
+Fiabilité et coût de la comparaison des résultats sur les fixtures DuckDB (`execution_match`).
+
+Sur le jeu de validation : part des requêtes de référence exécutables après traduction
+GoogleSQL -> DuckDB (chaque requête comparée à elle-même doit donner "match"), et part des
+paires de questions différentes distinguées ("mismatch"). Avec --run-id, accord entre la
+comparaison et la note du juge (2 = mêmes résultats) sur les lignes d'un run d'évaluation.
+
+    PYTHONPATH=. python scripts/evaluate_execution_match.py [--run-id RUN]
+"""
+import argparse
+import time
+from collections import Counter
+import numpy as np
+from src.data.validation_set import load_validation_examples
+from src.evaluation.execution_match import MATCH, MISMATCH, execution_match, get_fixture_database
+from src.evaluation.run_log import RunLog
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--run-id", help="Run d'évaluation à comparer aux notes du juge")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    db = get_fixture_database()
+    print(f"Fixtures construites en {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    examples = load_validation_examples()
+    timings, self_status, cross_status = [], Counter(), Counter()
+    for i, example in enumerate(examples):
+        start = time.perf_counter()
+        self_status[execution_match(example["sql"], example["sql"], db).status] += 1
+        timings.append((time.perf_counter() - start) * 1000)
+        cross_status[execution_match(example["sql"], examples[(i + 1) % len(examples)]["sql"], db).status] += 1
+    print(f"Référence vs elle-même      : {dict(self_status)}")
+    print(f"Référence vs autre question : {dict(cross_status)}")
+    print(f"Durée d'une comparaison : p50 {np.percentile(timings, 50):.0f} ms, p95 {np.percentile(timings, 95):.0f} ms")
+
+    if args.run_id:
+        agreement = Counter()
+        for row in RunLog(args.run_id).read():
+            for model in ("base", "ft"):
+                status = execution_match(row["expected_sql"], row[f"{model}_sql"] or "", db).status
+                if status in (MATCH, MISMATCH):
+                    agreement[(status, row[f"{model}_semantic"] == 2)] += 1
+                else:
+                    agreement[(status, None)] += 1
+        conclusive = sum(n for (status, _), n in agreement.items() if status in (MATCH, MISMATCH))
+        agree = agreement[(MATCH, True)] + agreement[(MISMATCH, False)]
+        print(f"\nRun {args.run_id} : {conclusive} comparaison(s) concluante(s), accord avec le juge "
+              f"{agree / conclusive * 100 if conclusive else 0:.0f}%")
+        for (status, judged_equal), n in sorted(agreement.items(), key=str):
+            print(f"  {status:<11} juge=2 : {judged_equal!s:<5} {n}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,16 @@
 # scripts/evaluate_models.py
 
+import argparse
 from src.evaluation.eval import evaluate
+from src.evaluation.memo import MEMO_MODES
 
-def evaluate_models():
-    evaluate()
+def evaluate_models(run_id=None, memo="on", memo_max_age=None):
+    evaluate(run_id, memo, memo_max_age)
 
 if __name__ == "__main__":
-    evaluate_models()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--run-id", help="Identifiant du run à reprendre (nouveau run par défaut)")
+    parser.add_argument("--memo", choices=MEMO_MODES, default="on", help="Mémo des générations et du juge")
+    parser.add_argument("--memo-max-age", type=float, help="Âge maximal (s) d'une entrée du mémo")
+    args = parser.parse_args()
+    evaluate_models(args.run_id, args.memo, args.memo_max_age)
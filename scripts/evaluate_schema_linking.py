@@ -0,0 +1,59 @@
+# scripts/evaluate_schema_linking.py
+"""
+Rappel du schema linking sur le jeu de validation (les tables du SQL de référence
+survivent-elles à l'élagage ?) et réduction du nombre de tokens du schéma injecté.
+
+Les tokens sont estimés pour les deux formats de schéma : liste du prompt v1
+et JSON enrichi du dataset de fine-tuning. Le schéma réduit est rendu comme dans le prompt
+(`LinkedSchema.render`) : sans la liste des valeurs connues, mais avec les valeurs citées.
+
+    PYTHONPATH=. python scripts/evaluate_schema_linking.py [--top_tables 4] [--top_columns 8] [--live]
+"""
+import argparse
+import numpy as np
+from src.data.validation_set import load_validation_examples, load_validation_snapshot
+from src.prompts.prompt_v1 import SYSTEM_INSTRUCTION_TEMPLATE
+from src.schema.extract_schema import format_schema_bullets, format_schema_for_prompt
+from src.schema.linking import SchemaLinker, evaluate_schema_linking
+from src.schema.snapshot import enrich_tables
+from src.text_utils import estimate_tokens
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--top_tables", type=int, default=None, help="Nombre maximal de tables retenues")
+    parser.add_argument("--top_columns", type=int, default=None, help="Nombre maximal de colonnes par table")
+    parser.add_argument("--live", action="store_true", help="Utilise le snapshot de schéma courant au lieu du jeu de validation")
+    args = parser.parse_args()
+
+    if args.live:
+        from src.schema.snapshot import get_schema_snapshot
+        snapshot = get_schema_snapshot()
+    else:
+        snapshot = load_validation_snapshot()
+    kwargs = {k: v for k, v in (("top_tables", args.top_tables), ("top_columns", args.top_columns)) if v is not None}
+    linker = SchemaLinker(snapshot.tables, **kwargs)
+    examples = load_validation_examples()
+
+    report = evaluate_schema_linking(linker, examples)
+    print(f"🔗 Questions : {report['total']}")
+    print(f"🎯 Exemples dont toutes les tables de référence sont conservées : {report['table_recall_examples'] * 100:.1f}%")
+    print(f"   Rappel des tables : {report['table_recall'] * 100:.1f}% | rappel des colonnes : {report['column_recall'] * 100:.1f}%")
+    for miss in report["misses"]:
+        print(f"   ⚠️ {', '.join(miss['missing'])} manquante(s) : {miss['question'][:90]}")
+
+    full_v1 = estimate_tokens(SYSTEM_INSTRUCTION_TEMPLATE.format(formatted_schema=format_schema_bullets(snapshot.tables)))
+    full_json = estimate_tokens(format_schema_for_prompt(enrich_tables(snapshot.tables)))
+    linked_v1, linked_json = [], []
+    for example in examples:
+        linked = linker.link(example["question"])
+        linked_v1.append(estimate_tokens(SYSTEM_INSTRUCTION_TEMPLATE.format(formatted_schema=linked.render("bullets"))))
+        linked_json.append(estimate_tokens(linked.render("json")))
+
+    for label, full, linked in (("Prompt v1", full_v1, linked_v1), ("Schéma JSON enrichi", full_json, linked_json)):
+        mean = float(np.mean(linked))
+        print(f"📉 {label} : {full} → {mean:.0f} tokens en moyenne (-{(1 - mean / full) * 100:.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+# scripts/evaluate_templates.py
+"""
+Couverture et précision du moteur de gabarits sur le jeu de validation (leave-one-out).
+
+    PYTHONPATH=. python scripts/evaluate_templates.py [--min_support 1] [--min_slots 1]
+"""
+import argparse
+from src.data.validation_set import load_validation_examples, load_validation_slot_values
+from src.inference.templates import evaluate_template_engine
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--min_support", type=int, default=1, help="Occurrences minimales d'un gabarit")
+    parser.add_argument("--min_slots", type=int, default=1, help="Nombre minimal d'emplacements par gabarit")
+    args = parser.parse_args()
+
+    report = evaluate_template_engine(
+        load_validation_examples(),
+        load_validation_slot_values(),
+        min_support=args.min_support,
+        min_slots=args.min_slots,
+    )
+    print(f"🧩 Questions : {report['total']}")
+    print(f"📈 Couverture : {report['coverage'] * 100:.1f}% ({report['answered']} réponses par gabarit)")
+    print(f"🎯 Précision (SQL identique à la référence) : {report['precision'] * 100:.1f}% ({report['correct']}/{report['answered']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,16 @@ import json
 import pandas as pd
 import argparse
 from typing import List, Dict, Any
-from google.cloud import bigquery, storage
+from google.cloud import storage
+from src.bigquery_clients import get_bq_client
 from langchain_core.globals import set_verbose, set_debug
 import matplotlib.pyplot as plt
 from src.prompts.utils import get_prompt
+from src.schema.extract_schema import (
+    get_table_schemas, get_distinct_values, enhance_schema_with_values, format_schema_for_prompt
+)
+from src.schema.render import SCHEMA_RENDERERS, render_schema
+from src.schema.snapshot import get_schema_snapshot
 from config.settings import (
     PROJECT_ID,
     DATASET_ID,
@@ -23,63 +29,8 @@ set_debug(False)
 
 # === Fonctions utilitaires ===
 
-def get_table_schemas(project_id, dataset_id, fields_to_ignore) -> Dict[str, Dict[str, Any]]:
-    client = bigquery.Client(project=project_id)
-    schemas = {}
-    for table in client.list_tables(dataset_id):
-        table_obj = client.get_table(table)
-        fields = []
-        for field in table_obj.schema:
-            if field.name not in fields_to_ignore:
-                desc = field.description or ""
-                if field.name == "DATE_TICKET":
-                    desc += " (Format: JJ/MM/AAAA. Utilisez PARSE_DATE('%d/%m/%Y', DATE_TICKET))."
-                fields.append({
-                    "name": field.name,
-                    "type": field.field_type,
-                    "mode": field.mode,
-                    "description": desc
-                })
-        schemas[table.table_id] = {
-            "fields": fields,
-            "description": table_obj.description or ""
-        }
-    return schemas
-
-def get_distinct_values(client, project_id, dataset_id, table, column) -> list:
-    query = f"""
-        SELECT DISTINCT {column}
-        FROM `{project_id}.{dataset_id}.{table}`
-        ORDER BY {column}
-        LIMIT 150
-    """
-    return [row[column] for row in client.query(query).result()]
-
-def enhance_schema_with_values(project_id, dataset_id, schemas, fields_to_enhance):
-    client = bigquery.Client(project=project_id)
-    for table, columns in fields_to_enhance.items():
-        for col in columns:
-            values = get_distinct_values(client, project_id, dataset_id, table, col)
-            for field in schemas[table]["fields"]:
-                if field["name"] == col:
-                    val_str = ', '.join(f'"{v}"' for v in values)
-                    field["description"] += f" Available values: {val_str}"
-    return schemas
-
-def format_schema_for_prompt(schemas: Dict[str, Any]) -> str:
-    formatted = []
-    for table_name, info in schemas.items():
-        table_data = {
-            "table": table_name,
-            "columns": info["fields"]
-        }
-        if info.get("description"):
-            table_data["description"] = info["description"]
-        formatted.append(table_data)
-    return json.dumps(formatted, ensure_ascii=False, indent=2)
-
 def get_logs_dataframe(bq_logs_table_name: str) -> pd.DataFrame:
-    client = bigquery.Client(project=PROJECT_ID)
+    client = get_bq_client()
     query = f"""
         SELECT DISTINCT original_question, query
         FROM `{bq_logs_table_name}`
@@ -114,10 +65,13 @@ def plot_complexity_distribution(df):
     plt.savefig("evaluation/complexity_distribution.png")
     plt.close()
 
-def create_finetuning_jsonl(top_n: int = None, filter_complexity: str = None, append: bool = False, output_path=FINETUNE_PATH):
-    schemas = get_table_schemas(PROJECT_ID, DATASET_ID, FIELDS_TO_IGNORE)
-    enhanced = enhance_schema_with_values(PROJECT_ID, DATASET_ID, schemas, FIELDS_TO_ENHANCE)
-    schema_str = format_schema_for_prompt(enhanced)
+def create_finetuning_jsonl(top_n: int = None, filter_complexity: str = None, append: bool = False, output_path=FINETUNE_PATH,
+                            schema_encoding: str = "json"):
+    # Même snapshot de schéma que le serving : entraînement et inférence voient la même version
+    snapshot = get_schema_snapshot(PROJECT_ID, DATASET_ID)
+    print(f"📚 Snapshot de schéma utilisé : {snapshot.fingerprint} ({snapshot.created_at})")
+    # "json" reproduit le format des datasets existants ; tout autre encodage impose de ré-entraîner
+    schema_str = render_schema(snapshot.tables, schema_encoding, PROJECT_ID, DATASET_ID)
     logs_df = get_logs_dataframe(BQ_LOGS_TABLE)
 
     # Ajout du score de complexité
@@ -185,13 +139,15 @@ if __name__ == "__main__":
     parser.add_argument("--top_n", type=int, default=None, help="Nombre d'exemples complexes à inclure")
     parser.add_argument("--filter_complexity", type=str, choices=["simple", "medium", "advanced"], help="Filtrer par complexité SQL")
     parser.add_argument("--append", action="store_true", help="Ajouter les exemples sans écraser le fichier existant")
+    parser.add_argument("--schema_encoding", type=str, default="json", choices=list(SCHEMA_RENDERERS), help="Encodage du schéma dans le systemInstruction")
     args = parser.parse_args()
 
     create_finetuning_jsonl(
         top_n=args.top_n,
         filter_complexity=args.filter_complexity,
         append=args.append,
-        output_path=args.output
+        output_path=args.output,
+        schema_encoding=args.schema_encoding
     )
 
 
@@ -3,11 +3,13 @@ import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import streamlit as st
-from src.inference.predict import predict_sql
+import pandas as pd
+from src.inference.streaming import stream_prediction
 from src.security.safety_checks import validate_input, sanitize_sql_output
-from src.security.scope_filter import classify_scope
-from google.cloud import bigquery
-from config.settings import PROJECT_ID, BQ_LOCATION
+from src.schema.validator import check_sql_schema
+from src.bigquery_clients import get_bq_client
+from src.inference.results import fetch_page, page_count, run_query
+from config.settings import PROJECT_ID, BQ_LOCATION, STREAMLIT_API_URL, RESULT_PAGE_SIZE, RESULT_MAX_ROWS
 from datetime import datetime # Added import
 import logging # Added import
 
@@ -57,6 +59,7 @@ LOG_TABLE_ID = f"{PROJECT_ID}.working.conversation_history" # Added table ID def
 
 # Action sur clic bouton
 if st.button("🚀 Générer et Exécuter la requête SQL"):
+    st.session_state.pop("result", None) # Le résultat précédent n'est plus affiché
     # Initialize log data
     current_time = datetime.utcnow() # Get current time once
     log_entry = {
@@ -78,7 +81,7 @@ if st.button("🚀 Générer et Exécuter la requête SQL"):
     cost = None # Initialize cost variable
 
     try:
-        bq_client = bigquery.Client(project=PROJECT_ID, location=BQ_LOCATION) # Initialize client earlier
+        bq_client = get_bq_client(PROJECT_ID, BQ_LOCATION) # Client partagé entre les clics (voir src/bigquery_clients.py)
 
         if not validate_input(user_input):
             st.error("❌ Entrée invalide. Veuillez formuler une question plus complète.")
@@ -86,59 +89,106 @@ if st.button("🚀 Générer et Exécuter la requête SQL"):
             # st.stop()
 
         else: # Only proceed if input is valid
-            scope_result = classify_scope(user_input)
-            log_entry["scope"] = scope_result
-            if scope_result == "out_of_scope":
+            # Génération en flux : le SQL partiel s'affiche dès le premier morceau,
+            # seul le SQL final (sanitisé sur le texte complet) est exécuté
+            sql_placeholder = st.empty()
+            partial_sql, result = "", None
+            try:
+                with st.spinner("💡 Génération de la requête SQL en cours..."):
+                    for event, data in stream_prediction(user_input, STREAMLIT_API_URL or None):
+                        if event == "delta":
+                            partial_sql += data["text"]
+                            sql_placeholder.code(partial_sql, language="sql")
+                        elif event == "result":
+                            result = data
+                if result is None:
+                    raise RuntimeError("Flux de génération interrompu avant le résultat final.")
+                log_entry["scope"] = result["scope"]
+                log_entry["estimated_cost"] = cost = result["estimated_cost"] # Log the estimated cost
+                if result["status"] in ("ok", "incomplete_schema"):
+                    sql = result["sql"]
+                log_entry["generated_sql"] = sql
+
+            except Exception as pred_e:
+                logger.error(f"❌ Erreur lors de la prédiction SQL : {pred_e}", exc_info=True)
+                st.error(f"❌ Erreur lors de la génération SQL : {pred_e}")
+                log_entry["execution_status"] = "Prediction Error"
+                log_entry["error_message"] = str(pred_e)
+                # Stop further processing if prediction failed
+                sql = None # Ensure sql is None so subsequent checks fail safely or are skipped
+                cost = None # Ensure cost is None
+                result = None
+
+            if result is not None and result["status"] == "invalid_input":
+                st.error("❌ Entrée invalide. Veuillez formuler une question plus complète.")
+                log_entry["execution_status"] = "Input Validation Failed"
+            elif result is not None and result["status"] == "out_of_scope":
+                sql_placeholder.empty()
                 st.warning("🚫 Question hors-scope détectée.")
                 log_entry["execution_status"] = "Out of Scope"
-                # st.stop()
-            else:
-                try:
-                    with st.spinner("💡 Génération de la requête SQL en cours..."):
-                        # Unpack the result tuple from predict_sql
-                        sql, cost = predict_sql(user_input)
-                    log_entry["generated_sql"] = sql
-                    log_entry["estimated_cost"] = cost # Log the estimated cost
-
-                except Exception as pred_e:
-                    logger.error(f"❌ Erreur lors de la prédiction SQL : {pred_e}", exc_info=True)
-                    st.error(f"❌ Erreur lors de la génération SQL : {pred_e}")
-                    log_entry["execution_status"] = "Prediction Error"
-                    log_entry["error_message"] = str(pred_e)
-                    # Stop further processing if prediction failed
-                    sql = None # Ensure sql is None so subsequent checks fail safely or are skipped
-                    cost = None # Ensure cost is None
-
-                if sql and sql != "INCOMPLETE_SCHEMA": # Only proceed if SQL was generated successfully
-                    is_safe, reason = sanitize_sql_output(sql)
-                    log_entry["safety_status"] = "Safe" if is_safe else "Unsafe"
-                    log_entry["safety_reason"] = reason
-                    if not is_safe:
-                        st.error(f"🚫 Requête refusée : {reason}")
-                        log_entry["execution_status"] = "Safety Check Failed"
-                    else:
-                        st.success("✅ Requête SQL générée :")
-                        st.code(sql, language="sql")
-
-                        # Exécution BigQuery
+            elif result is not None and result["status"] == "unsafe":
+                sql_placeholder.empty()
+                st.error(f"🚫 Requête refusée : {result['reason']}")
+                log_entry["safety_status"] = "Unsafe"
+                log_entry["safety_reason"] = result["reason"]
+                log_entry["execution_status"] = "Safety Check Failed"
+            elif result is not None and result["status"] == "invalid_sql":
+                sql_placeholder.empty()
+                st.error(f"🧾 Requête incohérente avec le schéma : {result['reason']}")
+                log_entry["execution_status"] = "Schema Check Failed"
+                log_entry["error_message"] = result["reason"]
+            elif result is not None and result["status"] == "error":
+                st.error(f"❌ Erreur lors de la génération SQL : {result['reason']}")
+                log_entry["execution_status"] = "Prediction Error"
+                log_entry["error_message"] = result["reason"]
+
+            elif sql and sql != "INCOMPLETE_SCHEMA": # Only proceed if SQL was generated successfully
+                is_safe, reason = sanitize_sql_output(sql)
+                log_entry["safety_status"] = "Safe" if is_safe else "Unsafe"
+                log_entry["safety_reason"] = reason
+                if not is_safe:
+                    sql_placeholder.empty()
+                    st.error(f"🚫 Requête refusée : {reason}")
+                    log_entry["execution_status"] = "Safety Check Failed"
+                else:
+                    st.success("✅ Requête SQL générée :")
+                    sql_placeholder.code(sql, language="sql")
+                    if result.get("ttft_ms") is not None:
+                        st.caption(f"⏱️ Premier morceau de SQL reçu en {result['ttft_ms']:.0f} ms")
+
+                    # Validation locale contre le schéma : une requête incohérente n'est pas envoyée à BigQuery
+                    schema_error = check_sql_schema(sql)
+                    if schema_error is not None:
+                        st.error(f"🧾 Requête incohérente avec le schéma : {schema_error}")
+                        log_entry["execution_status"] = "Schema Check Failed"
+                        log_entry["error_message"] = schema_error
+                    else:  # Exécution BigQuery
                         try:
+                            # Seule la première page est rapatriée, les suivantes sont lues à la demande
                             with st.spinner("📊 Exécution de la requête sur BigQuery..."):
-                                df = bq_client.query(sql).result().to_dataframe()
-                            st.markdown("### 📋 Résultat de la requête")
-                            st.dataframe(df)
+                                query_result = run_query(sql, bq_client)
+                                first = next(query_result.batches(max_rows=RESULT_PAGE_SIZE, use_storage=False), None)
+                            st.session_state["result"] = {
+                                "job_id": query_result.job_id,
+                                "location": query_result.location,
+                                "total_rows": query_result.total_rows,
+                                "page": 0,
+                                "pages": {0: first.to_pandas() if first is not None else pd.DataFrame(columns=[f.name for f in query_result.rows.schema])},
+                            }
                             log_entry["execution_status"] = "Success"
-                            log_entry["result_rows"] = len(df)
+                            log_entry["result_rows"] = query_result.total_rows
                         except Exception as exec_e:
                             logger.error(f"❌ Erreur lors de l'exécution SQL : {exec_e}", exc_info=True)
                             st.error(f"❌ Erreur lors de l'exécution SQL : {exec_e}")
                             log_entry["execution_status"] = "Execution Error"
                             log_entry["error_message"] = str(exec_e)
 
-                elif sql == "INCOMPLETE_SCHEMA":
-                    st.warning("🤖 Le modèle ne peut pas répondre : schéma incomplet ou question trop vague.")
-                    log_entry["execution_status"] = "Incomplete Schema"
-                # If sql is None (due to prediction error), this part is skipped,
-                # and the finally block will log the "Prediction Error" status.
+            elif sql == "INCOMPLETE_SCHEMA":
+                sql_placeholder.empty()
+                st.warning("🤖 Le modèle ne peut pas répondre : schéma incomplet ou question trop vague.")
+                log_entry["execution_status"] = "Incomplete Schema"
+            # If sql is None (due to prediction error), this part is skipped,
+            # and the finally block will log the "Prediction Error" status.
 
     except Exception as app_e:
         # Catch potential errors during client init or early stages
@@ -180,3 +230,31 @@ if st.button("🚀 Générer et Exécuter la requête SQL"):
                 # log_entry["logging_error"] = str(log_e) # Requires schema change
         else:
              st.error("⚠️ Client BigQuery non initialisé, impossible d'écrire les logs.")
+
+
+# Résultat de la dernière requête, page par page (les clics de pagination relancent le script)
+result = st.session_state.get("result")
+if result:
+    total_rows = result["total_rows"]
+    pages = page_count(total_rows)
+    page = result["page"]
+    if page not in result["pages"]:
+        try:
+            with st.spinner("📄 Lecture de la page..."):
+                client = get_bq_client(PROJECT_ID, result["location"])
+                result["pages"][page] = fetch_page(result["job_id"], page, location=result["location"], client=client).table.to_pandas()
+        except Exception as page_e:
+            logger.error(f"❌ Erreur lors de la lecture de la page {page + 1} : {page_e}", exc_info=True)
+            st.error(f"❌ Erreur lors de la lecture de la page {page + 1} : {page_e}")
+    st.markdown("### 📋 Résultat de la requête")
+    if page in result["pages"]:
+        st.dataframe(result["pages"][page])
+    prev_col, info_col, next_col = st.columns([1, 4, 1])
+    if prev_col.button("◀️", disabled=page == 0):
+        result["page"] -= 1
+        st.rerun()
+    capped = f" (pages limitées aux {RESULT_MAX_ROWS} premières)" if total_rows > RESULT_MAX_ROWS else ""
+    info_col.caption(f"Page {page + 1} / {pages} · {total_rows} ligne(s){capped}")
+    if next_col.button("▶️", disabled=page >= pages - 1):
+        result["page"] += 1
+        st.rerun()
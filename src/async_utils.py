@@ -0,0 +1,46 @@
+# src/async_utils.py
+import asyncio
+import os
+import threading
+from typing import Any, AsyncIterator, Awaitable, Iterator, Optional
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_pid: Optional[int] = None
+_loop_lock = threading.Lock()
+
+
+def background_loop() -> asyncio.AbstractEventLoop:
+    """
+    Boucle d'événements du processus, dans un thread dédié et jamais fermée. Les clients
+    asynchrones mis en cache (`get_genai_client().aio`, son pool httpx) restent liés à la boucle
+    qui les a utilisés en premier : le code synchrone (Streamlit, scripts, évaluation) passe
+    toujours par celle-ci au lieu d'en créer une par appel. Recréée après un fork.
+    """
+    global _loop, _loop_pid
+    if _loop is None or _loop_pid != os.getpid():
+        with _loop_lock:
+            if _loop is None or _loop_pid != os.getpid():
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="async-loop", daemon=True).start()
+                _loop, _loop_pid = loop, os.getpid()
+    return _loop
+
+
+def run_sync(awaitable: Awaitable[Any]) -> Any:
+    """Attend un coroutine sur la boucle partagée depuis du code synchrone."""
+    async def wrapper():
+        return await awaitable
+
+    return asyncio.run_coroutine_threadsafe(wrapper(), background_loop()).result()
+
+
+def iterate_sync(stream: AsyncIterator[Any]) -> Iterator[Any]:
+    """Consomme un générateur asynchrone depuis du code synchrone, sur la boucle partagée."""
+    try:
+        while True:
+            try:
+                yield run_sync(stream.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        run_sync(stream.aclose())
@@ -0,0 +1,121 @@
+# src/bigquery_clients.py
+
+import os
+import threading
+from typing import Callable, Dict, Optional, Tuple
+from google.cloud import bigquery
+from config.settings import PROJECT_ID, BQ_LOCATION, BQ_HTTP_POOL_SIZE
+from src.logging_config import logger
+
+ClientFactory = Callable[[str, Optional[str]], bigquery.Client]
+
+
+class BigQueryClientRegistry:
+    """
+    Clients BigQuery partagés par tout le processus, un par (projet, location).
+
+    - Les identifiants (`google.auth.default`) sont chargés une seule fois et partagés par
+      les clients : le jeton d'accès est rafraîchi une fois pour tous.
+    - Chaque client garde sa session HTTP, avec un pool de `pool_size` connexions : les
+      appels concurrents (threads de l'évaluation, requêtes du serving) réutilisent les
+      connexions TLS au lieu d'en ouvrir une par requête.
+    - Thread-safe : un client n'est créé qu'une fois, même si plusieurs threads le demandent
+      en même temps.
+    - Fork-safe : un processus enfant (workers uvicorn / gunicorn créés par fork) repart
+      d'un registre vide et ne réutilise pas les connexions ouvertes par le parent.
+    """
+
+    def __init__(self, pool_size: int = BQ_HTTP_POOL_SIZE, factory: Optional[ClientFactory] = None):
+        self.pool_size = pool_size
+        self._factory = factory or self._create_client
+        self._credentials = None
+        self._clients: Dict[Tuple[str, Optional[str]], bigquery.Client] = {}
+        self._storage_client = None
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self.created = 0
+
+    def get(self, project_id: str = PROJECT_ID, location: Optional[str] = BQ_LOCATION) -> bigquery.Client:
+        if self._pid != os.getpid():
+            self.reset_after_fork()
+        key = (project_id, location)
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = self._clients[key] = self._factory(project_id, location)
+                    self.created += 1
+        return client
+
+    def storage(self):
+        """
+        Client de l'API BigQuery Storage Read (lecture des résultats en Arrow), partagé comme
+        les clients REST. None si `google-cloud-bigquery-storage` n'est pas installé.
+        """
+        if self._pid != os.getpid():
+            self.reset_after_fork()
+        if self._storage_client is None:
+            try:
+                from google.cloud import bigquery_storage
+            except ImportError:
+                return None
+            with self._lock:
+                if self._storage_client is None:
+                    self._storage_client = bigquery_storage.BigQueryReadClient(credentials=self._shared_credentials())
+        return self._storage_client
+
+    def _shared_credentials(self):
+        """Identifiants par défaut, chargés au premier appel ; l'appelant tient `_lock`."""
+        if self._credentials is None:
+            import google.auth
+
+            self._credentials, _ = google.auth.default(scopes=bigquery.Client.SCOPE)
+        return self._credentials
+
+    def _create_client(self, project_id: str, location: Optional[str]) -> bigquery.Client:
+        from requests.adapters import HTTPAdapter
+
+        client = bigquery.Client(project=project_id, location=location, credentials=self._shared_credentials())
+        client._http.mount("https://", HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size))
+        logger.info(f"🔌 Client BigQuery créé : {project_id} ({location or 'location auto'})")
+        return client
+
+    def reset_after_fork(self):
+        """Oublie les clients (et leurs connexions) hérités du processus parent."""
+        self._clients = {}
+        self._storage_client = None
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self.created = 0
+
+    def close(self):
+        with self._lock:
+            clients, self._clients = list(self._clients.values()), {}
+            storage, self._storage_client = self._storage_client, None
+        for client in clients:
+            client.close()
+        if storage is not None:
+            storage.transport.close()
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+
+_registry = BigQueryClientRegistry()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_registry.reset_after_fork)
+
+
+def get_bq_client(project_id: str = PROJECT_ID, location: Optional[str] = BQ_LOCATION) -> bigquery.Client:
+    """Client BigQuery partagé du processus pour ce projet et cette location (voir `BigQueryClientRegistry`)."""
+    return _registry.get(project_id, location)
+
+
+def get_bqstorage_client():
+    """Client BigQuery Storage partagé du processus, ou None si la bibliothèque est absente."""
+    return _registry.storage()
+
+
+def close_bq_clients():
+    _registry.close()
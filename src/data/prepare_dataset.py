@@ -4,10 +4,10 @@ import pandas as pd
 import json
 from src.schema.extract_schema import extract_formatted_schema_for_prompt
 from config.settings import PROJECT_ID, DATASET_ID
-from google.cloud import bigquery
+from src.bigquery_clients import get_bq_client
 
 def prepare_jsonl_dataset(output_path):
-    bq_client = bigquery.Client(project=PROJECT_ID)
+    bq_client = get_bq_client()
     logs_query = f"""
         SELECT DISTINCT original_question, query 
         FROM `{PROJECT_ID}.working.logs`
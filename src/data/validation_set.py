@@ -0,0 +1,85 @@
+# src/data/validation_set.py
+
+import json
+import re
+from functools import lru_cache
+from typing import Dict, List
+from config.settings import PROJECT_ID, DATASET_ID, FIELDS_TO_ENHANCE
+
+VALIDATION_JSON = "Finetuning_dataset/validation_dataset.json"
+
+_AVAILABLE_VALUES = re.compile(r"Available values:\s*(.*)$", re.DOTALL)
+
+
+@lru_cache()
+def _load(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_validation_examples(path: str = VALIDATION_JSON) -> List[Dict[str, str]]:
+    """
+    Paires (question, SQL de référence) du jeu de validation.
+
+    Returns:
+        List[Dict[str, str]]: [{"question": ..., "sql": ...}, ...]
+    """
+    examples = []
+    for example in _load(path):
+        contents = example["contents"]
+        examples.append({
+            "question": contents[0]["parts"][0]["text"].strip(),
+            "sql": contents[1]["parts"][0]["text"].strip(),
+        })
+    return examples
+
+
+def load_validation_schema(path: str = VALIDATION_JSON) -> List[dict]:
+    """
+    Schéma JSON embarqué dans le `systemInstruction` du jeu de validation
+    (format de `format_schema_for_prompt`) : permet de travailler hors-ligne.
+    """
+    instruction = _load(path)[0]["systemInstruction"]["parts"][0]["text"]
+    return json.loads(instruction[instruction.index("\n[", instruction.index("📚 Schéma de la base")) + 1:])
+
+
+def parse_available_values(description: str) -> List[str]:
+    """Extrait la liste `Available values: "A", "B"` ajoutée par l'enrichissement du schéma."""
+    match = _AVAILABLE_VALUES.search(description or "")
+    return re.findall(r'"([^"]*)"', match.group(1)) if match else []
+
+
+def load_validation_slot_values(path: str = VALIDATION_JSON) -> Dict[str, List[str]]:
+    """Valeurs connues des colonnes `FIELDS_TO_ENHANCE`, lues dans le schéma du jeu de validation."""
+    slot_values = {}
+    for table in load_validation_schema(path):
+        for column in table["columns"]:
+            if column["name"] in FIELDS_TO_ENHANCE.get(table["table"], []):
+                slot_values[column["name"]] = parse_available_values(column["description"])
+    return slot_values
+
+
+def load_validation_snapshot(path: str = VALIDATION_JSON):
+    """
+    Snapshot de schéma reconstruit à partir du jeu de validation (valeurs connues
+    séparées des descriptions), pour les benchmarks et tests hors-ligne.
+    """
+    from src.schema.snapshot import SchemaSnapshot
+
+    tables = {}
+    for table in load_validation_schema(path):
+        fields = []
+        for column in table["columns"]:
+            description = column.get("description", "")
+            values = parse_available_values(description)
+            field = {
+                "name": column["name"],
+                "type": column["type"],
+                "mode": column.get("mode"),
+                "description": _AVAILABLE_VALUES.sub("", description).rstrip(),
+            }
+            if values:
+                field["values"] = values
+            fields.append(field)
+        tables[table["table"]] = {"fields": fields, "description": table.get("description", "")}
+    return SchemaSnapshot(PROJECT_ID, DATASET_ID, tables)
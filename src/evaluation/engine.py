@@ -0,0 +1,488 @@
+# src/evaluation/engine.py
+
+import asyncio
+import random
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import pandas as pd
+from tqdm import tqdm
+from config.settings import (
+    EVAL_EXECUTION_MATCH,
+    EVAL_MAX_RETRIES,
+    EVAL_MAX_WORKERS,
+    EVAL_RATE_LIMITS,
+    EVAL_RETRY_BASE_DELAY,
+    EVAL_ROWS_IN_FLIGHT,
+    EVAL_SKIP_JUDGE_ON_MATCH,
+    JUDGE_BATCH_MAX_REASKS,
+    JUDGE_BATCH_MAX_WAIT_SECONDS,
+    JUDGE_BATCH_SIZE,
+)
+from src.async_utils import run_sync
+from src.bigquery_clients import get_bq_client
+from src.evaluation.run_log import RunLog, row_key
+from src.evaluation.execution_match import MATCH, match_for_eval
+from src.evaluation.memo import MemoStore, content_hash
+from src.schema.validator import check_sql_schema
+from src.security.safety_checks import (
+    JUDGE_BATCH_PAIR,
+    JUDGE_BATCH_PROMPT,
+    JUDGE_MODEL_NAME,
+    JUDGE_PROMPT,
+    JudgePair,
+    SqlValidation,
+    dry_run_sql,
+    judge_sql,
+    judge_sql_pairs,
+    sanitize_sql_output,
+)
+from src.logging_config import logger
+
+# Marqueurs des erreurs de quota / limitation de débit (Gemini : 429 RESOURCE_EXHAUSTED,
+# BigQuery : 429 ou 403 rateLimitExceeded / quotaExceeded)
+_QUOTA_MARKERS = ("429", "resource_exhausted", "resource exhausted", "ratelimitexceeded",
+                  "quotaexceeded", "too many requests", "quota exceeded")
+
+# Valeur par défaut d'un appel en échec, à ne pas enregistrer dans le mémo
+_FAILED = object()
+
+
+def is_quota_error(error: BaseException) -> bool:
+    """True si l'erreur signale un dépassement de quota ou de débit (à réessayer plus tard)."""
+    if getattr(error, "code", None) == 429:
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in _QUOTA_MARKERS)
+
+
+class TokenBucket:
+    """
+    Limiteur de débit asynchrone : `rate` jetons par seconde, au plus `burst` d'avance.
+
+    Chaque appel distant consomme un jeton (`acquire`) ; les appelants en attente sont
+    servis dans l'ordre d'arrivée.
+    """
+
+    def __init__(self, rate: float, burst: int = 1, clock: Callable[[], float] = time.monotonic):
+        if rate <= 0:
+            raise ValueError(f"Débit invalide : {rate} (doit être > 0)")
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._clock = clock
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+
+async def generate_for_eval(question: str, use_ft_model: bool) -> str:
+    """
+    Génération brute + contrôles de sortie, sans cache (mesure du modèle seul). Le scope est
+    appliqué par `evaluate_row` : une question hors-scope n'est pas générée, comme dans `predict_sql`.
+    """
+    from src.inference.predict import generate_raw_sql_async, review_sql_response
+
+    response_text, _ = await generate_raw_sql_async(question, use_ft_model)
+    sql, _ = review_sql_response(response_text)
+    return sql
+
+
+def execute_for_eval(sql: str) -> SqlValidation:
+    """
+    Valide la requête sur BigQuery en dry-run (`dry_run_sql`) : rien n'est exécuté ni facturé.
+
+    Une requête invalide renvoie `valid=False` ; les erreurs de quota sont propagées pour être réessayées.
+    """
+    try:
+        return dry_run_sql(sql, get_bq_client())
+    except Exception as e:
+        if is_quota_error(e):
+            raise
+        return SqlValidation(False, error=str(e))
+
+
+def generation_key_for_eval(question: str, use_ft_model: bool) -> Tuple[str, str, float]:
+    """(modèle, empreinte du prompt système de la question, température) : clé du mémo des générations."""
+    from src.inference.predict import BASE_MODEL_NAME, FT_MODEL_NAME, GENERATION_CONFIG, PROMPT_VERSION
+    from src.prompts.utils import get_prompt
+
+    model_name = FT_MODEL_NAME if use_ft_model else BASE_MODEL_NAME
+    return model_name, content_hash(get_prompt(PROMPT_VERSION, question)), GENERATION_CONFIG.temperature
+
+
+async def classify_scope_for_eval(question: str) -> str:
+    from src.security.scope_filter import classify_scope_async
+
+    return await classify_scope_async(question)
+
+
+RowCallback = Callable[[int, dict, int], None]
+
+
+@dataclass
+class EvaluationStages:
+    """
+    Appels distants d'une ligne d'évaluation, remplaçables (tests, benchmark).
+
+    Les fonctions `async` sont attendues sur la boucle ; les autres sont exécutées dans le
+    pool de threads du moteur. `judge_batch` note une liste de paires en un appel (None si
+    indisponible) ; `match` compare localement les résultats de la référence et de la
+    prédiction (statut de `execution_match`, None pour ne pas comparer) ; `validate` renvoie
+    le motif de rejet local d'une requête avant `execute` (None pour toujours l'envoyer).
+    `generation_key`, `judge_id` et `judge_batch_id` identifient le modèle et le prompt dans
+    le mémo (`MemoStore`).
+    """
+    scope: Callable[[str], Any] = classify_scope_for_eval
+    generate: Callable[[str, bool], Any] = generate_for_eval
+    execute: Callable[[str], Any] = execute_for_eval
+    judge: Callable[[str, str, str], Any] = judge_sql
+    generation_key: Callable[[str, bool], Tuple[str, str, float]] = generation_key_for_eval
+    judge_batch: Optional[Callable[[List[JudgePair]], Any]] = judge_sql_pairs
+    match: Optional[Callable[[str, str], Any]] = match_for_eval
+    validate: Optional[Callable[[str], Optional[str]]] = check_sql_schema
+    judge_id: Tuple[str, str] = (JUDGE_MODEL_NAME, content_hash(JUDGE_PROMPT))
+    judge_batch_id: Tuple[str, str] = (JUDGE_MODEL_NAME, content_hash(JUDGE_BATCH_PROMPT, JUDGE_BATCH_PAIR))
+
+
+class JudgeBatcher:
+    """
+    Regroupe les notes demandées par les lignes en cours en lots d'au plus `batch_size`
+    paires, envoyés par `engine.call` (limiteur, reprises sur quota). Un lot incomplet part
+    après `max_wait` secondes. Les paires mal notées sont redemandées (au plus `max_reasks`
+    fois) dans un nouvel appel ; une paire jamais notée compte comme un appel en échec.
+    """
+
+    def __init__(self, engine: "EvaluationEngine", batch_size: int, max_wait: float, max_reasks: int):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.max_reasks = max_reasks
+        self.batches = 0
+        self.pairs = 0
+        self._pending: List[Tuple[JudgePair, asyncio.Future, Optional[List[str]]]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+
+    async def score(self, pair: JudgePair, failures: Optional[List[str]] = None) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((pair, future, failures))
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch):
+        self.pairs += len(batch)
+        scores: List[Any] = [None] * len(batch)
+        pending = list(range(len(batch)))
+        for _ in range(self.max_reasks + 1):
+            self.batches += 1
+            result = await self.engine.call(
+                "gemini", self.engine.stages.judge_batch, [batch[i][0] for i in pending], default=None,
+            )
+            if result is None:
+                break
+            for index, score in zip(pending, result):
+                scores[index] = score
+            pending = [i for i in pending if scores[i] is None]
+            if not pending:
+                break
+        for (pair, future, failures), score in zip(batch, scores):
+            if score is None and failures is not None:
+                failures.append("gemini")
+            if not future.done():
+                future.set_result(_FAILED if score is None else score)
+
+
+@dataclass
+class EngineStats:
+    calls: Counter = field(default_factory=Counter)
+    retries: Counter = field(default_factory=Counter)
+    failures: Counter = field(default_factory=Counter)
+    judge_skipped: int = 0
+    refusals_scored: int = 0
+    bytes_processed: int = 0
+    executions_saved: int = 0
+    elapsed: float = 0.0
+
+
+class EvaluationEngine:
+    """
+    Évalue des lignes (question, SQL attendu) en parallèle.
+
+    Au plus `rows_in_flight` lignes sont en cours ; dans une ligne, les deux générations,
+    puis les deux validations BigQuery (dry-run) et les deux notes du juge, partent en même temps. Chaque appel
+    passe par le limiteur de son backend (`rate_limits` : {backend: (requêtes/s, rafale)}),
+    partagé par toutes les lignes, et est réessayé avec un backoff exponentiel (avec gigue)
+    sur les erreurs de quota. Les résultats sont renvoyés dans l'ordre des lignes reçues.
+
+    Avec `memo`, les générations et notes du juge déjà calculées sont lues dans le mémo
+    (sans passer par le limiteur) et les nouvelles y sont enregistrées. Avec
+    `execution_match`, chaque requête sûre est aussi comparée à la référence sur les
+    fixtures DuckDB (colonnes `base_match` / `ft_match`) ; si les résultats sont identiques
+    et `skip_judge_on_match`, la note vaut 2 sans appel au juge. Un refus (`INCOMPLETE_SCHEMA` :
+    question hors-scope, génération en échec) vaut 0 sans appel au juge, sauf si la référence
+    est elle-même un refus.
+    """
+
+    def __init__(self, stages: Optional[EvaluationStages] = None, memo: Optional[MemoStore] = None,
+                 rate_limits: Dict[str, Tuple[float, int]] = EVAL_RATE_LIMITS,
+                 rows_in_flight: int = EVAL_ROWS_IN_FLIGHT, max_retries: int = EVAL_MAX_RETRIES,
+                 retry_base_delay: float = EVAL_RETRY_BASE_DELAY, max_workers: int = EVAL_MAX_WORKERS,
+                 judge_batch_size: int = JUDGE_BATCH_SIZE, judge_batch_max_wait: float = JUDGE_BATCH_MAX_WAIT_SECONDS,
+                 judge_batch_max_reasks: int = JUDGE_BATCH_MAX_REASKS,
+                 execution_match: bool = EVAL_EXECUTION_MATCH, skip_judge_on_match: bool = EVAL_SKIP_JUDGE_ON_MATCH):
+        self.stages = stages or EvaluationStages()
+        self.memo = memo
+        self.rate_limits = dict(rate_limits)
+        self.rows_in_flight = max(1, rows_in_flight)
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.max_workers = max_workers
+        self.judge_batch_size = judge_batch_size
+        self.judge_batch_max_wait = judge_batch_max_wait
+        self.judge_batch_max_reasks = judge_batch_max_reasks
+        self.judge_batcher: Optional[JudgeBatcher] = None
+        self.execution_match = execution_match and self.stages.match is not None
+        self.skip_judge_on_match = skip_judge_on_match
+        self.stats = EngineStats()
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    async def call(self, backend: str, fn: Callable, *args, default: Any = None,
+                   failures: Optional[List[str]] = None) -> Any:
+        """
+        Appelle `fn(*args)` sous le limiteur de `backend`, avec reprises sur quota.
+
+        Toute autre erreur (ou un quota encore dépassé après `max_retries` reprises) est
+        journalisée, ajoutée à `failures` et remplacée par `default`.
+        """
+        if backend not in self._buckets:
+            self._buckets[backend] = TokenBucket(*self.rate_limits[backend])
+        for attempt in range(self.max_retries + 1):
+            await self._buckets[backend].acquire()
+            self.stats.calls[backend] += 1
+            try:
+                if asyncio.iscoroutinefunction(fn):
+                    return await fn(*args)
+                return await asyncio.get_running_loop().run_in_executor(self._executor, partial(fn, *args))
+            except Exception as e:
+                if is_quota_error(e) and attempt < self.max_retries:
+                    delay = self.retry_base_delay * 2 ** attempt * random.uniform(0.5, 1.5)
+                    self.stats.retries[backend] += 1
+                    logger.warning(f"⏳ Quota {backend} atteint, nouvel essai dans {delay:.1f} s ({attempt + 1}/{self.max_retries})")
+                    await asyncio.sleep(delay)
+                    continue
+                self.stats.failures[backend] += 1
+                if failures is not None:
+                    failures.append(backend)
+                logger.error(f"❌ Appel {backend} ({getattr(fn, '__name__', fn)}) en échec : {e}")
+                return default
+
+    async def evaluate_row(self, question: str, expected_sql: str, with_scope: bool = False,
+                           failures: Optional[List[str]] = None) -> dict:
+        """Note une ligne ; les appels en échec (remplacés par leur valeur par défaut) sont ajoutés à `failures`."""
+        from src.inference.predict import INCOMPLETE_SCHEMA
+
+        stages = self.stages
+        call = partial(self.call, failures=failures)
+        row: Dict[str, Any] = {"question": question, "expected_sql": expected_sql}
+        if with_scope:
+            row["scope"] = await call("gemini", stages.scope, question, default="in_scope")
+
+        async def generate(use_ft_model: bool) -> str:
+            # Comme `predict_sql` : une question hors-scope est refusée avant toute génération
+            if row.get("scope") == "out_of_scope":
+                return INCOMPLETE_SCHEMA
+            if self.memo is None:
+                return await call("gemini", stages.generate, question, use_ft_model, default=INCOMPLETE_SCHEMA)
+            model, prompt_hash, temperature = stages.generation_key(question, use_ft_model)
+            sql = self.memo.get_generation(model, prompt_hash, question, temperature)
+            if sql is None:
+                sql = await call("gemini", stages.generate, question, use_ft_model, default=_FAILED)
+                if sql is _FAILED:
+                    return INCOMPLETE_SCHEMA
+                self.memo.put_generation(model, prompt_hash, question, temperature, sql)
+            return sql
+
+        batcher = self.judge_batcher
+        judge_id = stages.judge_batch_id if batcher is not None else stages.judge_id
+
+        async def judge(predicted_sql: str) -> float:
+            score = self.memo.get_judgment(*judge_id, question, expected_sql, predicted_sql) if self.memo is not None else None
+            if score is None:
+                if batcher is not None:
+                    score = await batcher.score((question, expected_sql, predicted_sql), failures)
+                else:
+                    score = await call("gemini", stages.judge, question, expected_sql, predicted_sql, default=_FAILED)
+                if score is _FAILED:
+                    return 0.0
+                if self.memo is not None:
+                    self.memo.put_judgment(*judge_id, question, expected_sql, predicted_sql, score)
+            return score
+
+        base_sql, ft_sql = await asyncio.gather(generate(False), generate(True))
+        base_safe, _ = sanitize_sql_output(base_sql)
+        ft_safe, _ = sanitize_sql_output(ft_sql)
+
+        async def execute(sql: str, is_safe: bool) -> bool:
+            if not is_safe:
+                return False
+            if stages.validate is not None and stages.validate(sql) is not None:
+                self.stats.executions_saved += 1
+                return False
+            result = await call("bigquery", stages.execute, sql, default=False)
+            if isinstance(result, SqlValidation):
+                self.stats.bytes_processed += result.bytes_processed
+                return result.valid
+            return bool(result)
+
+        async def match_then_judge(sql: str, is_safe: bool) -> Tuple[Optional[str], float]:
+            # Refus (hors-scope, génération en échec) : noté sans appel au juge, échec sauf si le refus est attendu
+            if sql == INCOMPLETE_SCHEMA:
+                self.stats.refusals_scored += 1
+                return None, 2.0 if expected_sql.strip() == INCOMPLETE_SCHEMA else 0.0
+            status = None
+            if self.execution_match and is_safe:
+                try:
+                    loop = asyncio.get_running_loop()
+                    status = await loop.run_in_executor(self._executor, stages.match, expected_sql, sql)
+                except Exception as e:
+                    logger.warning(f"⚠️ Comparaison des résultats impossible pour « {question} » : {e}")
+            if status == MATCH and self.skip_judge_on_match:
+                self.stats.judge_skipped += 1
+                return status, 2.0
+            return status, await judge(sql or "")
+
+        base_exec, ft_exec, (base_match, base_semantic), (ft_match, ft_semantic) = await asyncio.gather(
+            execute(base_sql, base_safe),
+            execute(ft_sql, ft_safe),
+            match_then_judge(base_sql, base_safe),
+            match_then_judge(ft_sql, ft_safe),
+        )
+        row.update({
+            "base_sql": base_sql, "ft_sql": ft_sql,
+            "base_safe": base_safe, "ft_safe": ft_safe,
+            "base_exec": base_exec, "ft_exec": ft_exec,
+            "base_semantic": base_semantic, "ft_semantic": ft_semantic,
+        })
+        if self.execution_match:
+            row.update({"base_match": base_match, "ft_match": ft_match})
+        return row
+
+    async def run_async(self, rows: Sequence[Tuple[str, str]], with_scope: bool = False,
+                        desc: str = "📐 Évaluation", on_result: Optional[RowCallback] = None) -> List[dict]:
+        """
+        Évalue toutes les lignes ; le résultat i correspond à la ligne i.
+
+        `on_result(index, row, failed_calls)` est appelé dès qu'une ligne est terminée
+        (`failed_calls` : nombre d'appels remplacés par leur valeur par défaut).
+        """
+        start = time.perf_counter()
+        results: List[Optional[dict]] = [None] * len(rows)
+        semaphore = asyncio.Semaphore(self.rows_in_flight)
+        self._buckets = {}  # liés à la boucle d'événements courante
+        self.judge_batcher = JudgeBatcher(
+            self, self.judge_batch_size, self.judge_batch_max_wait, self.judge_batch_max_reasks,
+        ) if self.judge_batch_size > 1 and self.stages.judge_batch else None
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        progress = tqdm(total=len(rows), desc=desc)
+
+        async def run_row(index: int, question: str, expected_sql: str):
+            failures: List[str] = []
+            async with semaphore:
+                results[index] = await self.evaluate_row(question, expected_sql, with_scope, failures)
+            if on_result is not None:
+                on_result(index, results[index], len(failures))
+            progress.update(1)
+            if self.stats.retries:
+                progress.set_postfix(retries=sum(self.stats.retries.values()))
+
+        try:
+            await asyncio.gather(*(run_row(i, q, sql) for i, (q, sql) in enumerate(rows)))
+        finally:
+            progress.close()
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self.stats.elapsed = time.perf_counter() - start
+        logger.info(
+            f"📐 {len(rows)} ligne(s) évaluée(s) en {self.stats.elapsed:.1f} s | appels : {dict(self.stats.calls)} | "
+            f"reprises : {dict(self.stats.retries)} | échecs : {dict(self.stats.failures)}"
+        )
+        if self.stats.executions_saved:
+            logger.info(f"🧾 {self.stats.executions_saved} validation(s) BigQuery évitée(s) par la validation locale du SQL")
+        if self.stats.bytes_processed:
+            logger.info(f"💾 Requêtes valides : {self.stats.bytes_processed / 1e9:.2f} Go estimés (dry-run, non facturés)")
+        if self.execution_match:
+            logger.info(f"🦆 {self.stats.judge_skipped} note(s) du juge remplacée(s) par un résultat identique sur les fixtures")
+        if self.stats.refusals_scored:
+            logger.info(f"🚫 {self.stats.refusals_scored} refus (INCOMPLETE_SCHEMA) noté(s) sans appel au juge")
+        if self.judge_batcher is not None:
+            logger.info(f"⚖️ Juge par lots : {self.judge_batcher.pairs} paire(s) en {self.judge_batcher.batches} appel(s)")
+        if self.memo is not None:
+            logger.info("🗄️ Mémo : " + " | ".join(
+                f"{kind} {stats['hit_rate'] * 100:.0f}% ({stats['hits']}/{stats['hits'] + stats['misses']})"
+                for kind, stats in self.memo.stats().items()
+            ))
+        return results
+
+    def run(self, rows: Sequence[Tuple[str, str]], with_scope: bool = False, desc: str = "📐 Évaluation",
+            on_result: Optional[RowCallback] = None) -> List[dict]:
+        return run_sync(self.run_async(rows, with_scope, desc, on_result))
+
+
+def evaluate_rows(rows: Sequence[Tuple[str, str]], with_scope: bool = False, desc: str = "📐 Évaluation",
+                  engine: Optional[EvaluationEngine] = None, run_id: Optional[str] = None) -> pd.DataFrame:
+    """
+    Évalue des paires (question, SQL attendu) et renvoie un DataFrame dans l'ordre des lignes.
+
+    Avec `run_id`, chaque ligne terminée sans appel en échec est ajoutée au journal du run
+    (`RunLog`) ; les lignes déjà présentes dans le journal ne sont pas réévaluées.
+    """
+    engine = engine or EvaluationEngine()
+    rows = list(rows)
+    log = RunLog(run_id) if run_id else None
+    done = log.completed() if log else {}
+    pending = [(question, expected_sql) for question, expected_sql in rows if row_key(question, expected_sql) not in done]
+    if log:
+        logger.info(f"🗂️ Run {run_id} ({log.path}) : {len(rows) - len(pending)} ligne(s) déjà notée(s), {len(pending)} à évaluer")
+
+    def checkpoint(index: int, row: dict, failed_calls: int):
+        if failed_calls:
+            logger.warning(f"⚠️ {failed_calls} appel(s) en échec pour « {row['question']} » : ligne non journalisée, réévaluée à la reprise")
+        else:
+            log.append(row)
+
+    evaluated = iter(engine.run(pending, with_scope, desc, on_result=checkpoint if log else None))
+    results = []
+    for question, expected_sql in rows:
+        previous = done.get(row_key(question, expected_sql))
+        results.append({k: v for k, v in previous.items() if k != "key"} if previous else next(evaluated))
+    return pd.DataFrame(results)
@@ -1,13 +1,15 @@
 import pandas as pd
 from src.evaluation.metrics import evaluate_model
-from src.evaluation.plots import plot_results, plot_deltas
+from src.evaluation.plots import plot_results, plot_comparatif_performance
+from src.evaluation.run_log import new_run_id
 import os
 
 RESULTS_PATH = "evaluation/evaluation_results_complete.csv"
 
-def evaluate():
-    print("📊 Lancement de l'évaluation...")
-    results_df = evaluate_model()
+def evaluate(run_id: str = None, memo: str = "on", memo_max_age: float = None):
+    run_id = run_id or new_run_id()
+    print(f"📊 Lancement de l'évaluation (run {run_id}, reprise : --run-id {run_id})...")
+    results_df = evaluate_model(run_id, memo, memo_max_age)
     os.makedirs("evaluation", exist_ok=True)
     results_df.to_csv(RESULTS_PATH, index=False)
     
@@ -28,4 +30,4 @@ def evaluate():
     print(f"Fine-tuned Execution Accuracy: {ft_exec:.2f}%")
 
     plot_results(base_exec, ft_exec, base_sem, ft_sem)
-    plot_deltas(filtered_df)
+    plot_comparatif_performance(filtered_df)
@@ -0,0 +1,230 @@
+# src/evaluation/execution_match.py
+
+import hashlib
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Set
+import numpy as np
+import pandas as pd
+from config.settings import DATASET_ID, EXECUTION_MATCH_FIXTURE_ROWS, EXECUTION_MATCH_SEED
+from src.logging_config import logger
+
+# Statuts d'une comparaison : seuls "match" et "mismatch" sont concluants
+MATCH, MISMATCH, EMPTY, GOLD_ERROR, PRED_ERROR = "match", "mismatch", "empty", "gold_error", "pred_error"
+
+DEFAULT_FIXTURE_ROWS = 300
+
+
+@dataclass
+class MatchResult:
+    status: str
+    gold_rows: Optional[int] = None
+    pred_rows: Optional[int] = None
+    error: Optional[str] = None
+
+    @property
+    def is_match(self) -> bool:
+        return self.status == MATCH
+
+
+def to_duckdb_sql(sql: str, dataset_id: str = DATASET_ID) -> str:
+    """
+    Traduit une requête GoogleSQL en SQL DuckDB (sqlglot) ; les tables `projet.dataset.table`
+    deviennent `dataset.table`, le schéma des fixtures.
+    """
+    import sqlglot
+    from sqlglot import exp
+
+    tree = sqlglot.parse_one(sql.strip().rstrip(";"), read="bigquery")
+    for table in tree.find_all(exp.Table):
+        if table.args.get("db") is not None:
+            table.set("catalog", None)
+            table.set("db", exp.to_identifier(dataset_id))
+    return tree.sql(dialect="duckdb")
+
+
+def literal_values(sqls: Iterable[str]) -> Dict[str, Set[str]]:
+    """Littéraux texte comparés à une colonne (`col = 'x'`, `col IN ('x', 'y')`) dans des requêtes."""
+    import sqlglot
+    from sqlglot import exp
+
+    values: Dict[str, Set[str]] = {}
+    for sql in sqls:
+        try:
+            tree = sqlglot.parse_one(sql, read="bigquery")
+        except Exception:
+            continue
+        for node in tree.find_all(exp.EQ, exp.In):
+            column = node.this if isinstance(node.this, exp.Column) else node.expression
+            if not isinstance(column, exp.Column):
+                continue
+            literals = node.expressions if isinstance(node, exp.In) else [node.this, node.expression]
+            for literal in literals:
+                if isinstance(literal, exp.Literal) and literal.is_string:
+                    values.setdefault(column.name.upper(), set()).add(literal.this)
+    return values
+
+
+def _string_column(name: str, size: int, rng: np.random.Generator, pool: List[str]) -> np.ndarray:
+    """Valeurs d'une colonne texte, au format attendu par les requêtes (dates `jj/mm/aaaa`, années...)."""
+    if pool:
+        return rng.choice(np.array(sorted(pool), dtype=object), size)
+    if name.endswith("_A"):
+        return rng.integers(1950, 2006, size).astype(str).astype(object)
+    if name.endswith("_M") or name.endswith("_J"):
+        return np.char.zfill(rng.integers(1, 29 if name.endswith("_J") else 13, size).astype(str), 2).astype(object)
+    if name.startswith("DATE"):
+        days = rng.integers(0, 4 * 365, size)
+        dates = pd.Timestamp("2021-01-01") + pd.to_timedelta(days, unit="D")
+        return dates.strftime("%d/%m/%Y").to_numpy(dtype=object)
+    return np.array([f"{name}_{i}" for i in rng.integers(0, 20, size)], dtype=object)
+
+
+def build_fixture_tables(tables: Dict[str, Dict[str, Any]], seed_sql: Iterable[str] = (),
+                         rows: Optional[Dict[str, int]] = None, seed: int = EXECUTION_MATCH_SEED) -> Dict[str, pd.DataFrame]:
+    """
+    Données synthétiques déterministes ayant la forme des tables du schéma.
+
+    - Une colonne présente dans plusieurs tables est une clé de jointure : ses valeurs sont
+      uniques dans la (les) plus petite(s) table(s) et tirées du même ensemble ailleurs.
+    - Les colonnes texte prennent les valeurs connues du schéma (`values`) et les littéraux
+      cités par `seed_sql`, pour que les filtres des requêtes de référence sélectionnent des lignes.
+    """
+    rows = {**EXECUTION_MATCH_FIXTURE_ROWS, **(rows or {})}
+    sizes = {table: rows.get(table, DEFAULT_FIXTURE_ROWS) for table in tables}
+    literals = literal_values(seed_sql)
+    owners: Dict[str, List[str]] = {}
+    for table, info in tables.items():
+        for field in info["fields"]:
+            owners.setdefault(field["name"], []).append(table)
+
+    fixtures = {}
+    for table, info in tables.items():
+        # Une graine par table : ajouter une table ne change pas les autres
+        rng = np.random.default_rng([seed, int(hashlib.sha1(table.encode()).hexdigest()[:8], 16)])
+        size = sizes[table]
+        columns = {}
+        for field in info["fields"]:
+            name, kind = field["name"], field["type"]
+            shared = len(owners[name]) > 1
+            key_size = min(sizes[t] for t in owners[name])
+            if shared:
+                keys = np.arange(1, key_size + 1) if size == key_size else rng.integers(1, key_size + 1, size)
+                column = keys if kind in ("INTEGER", "INT64") else np.array([f"{name}_{k}" for k in keys], dtype=object)
+            elif kind in ("INTEGER", "INT64"):
+                column = rng.integers(1, 101, size)
+            elif kind in ("FLOAT", "FLOAT64", "NUMERIC", "BIGNUMERIC"):
+                column = np.round(rng.uniform(0, 100, size), 2)
+            elif kind in ("BOOLEAN", "BOOL"):
+                column = rng.random(size) < 0.1
+            else:
+                pool = {str(v) for v in field.get("values", []) if v is not None} | literals.get(name.upper(), set())
+                column = _string_column(name, size, rng, list(pool))
+            columns[name] = column
+        fixtures[table] = pd.DataFrame(columns)
+    return fixtures
+
+
+class FixtureDatabase:
+    """
+    Base DuckDB en mémoire chargée avec les fixtures (`build_fixture_tables`), dans le schéma
+    `dataset_id`. Thread-safe : chaque appel utilise son propre curseur.
+    """
+
+    def __init__(self, fixtures: Dict[str, pd.DataFrame], dataset_id: str = DATASET_ID):
+        import duckdb
+
+        self.dataset_id = dataset_id
+        self._conn = duckdb.connect(":memory:")
+        self._conn.execute(f'CREATE SCHEMA "{dataset_id}"')
+        for table, df in fixtures.items():
+            self._conn.register("fixture_df", df)
+            self._conn.execute(f'CREATE TABLE "{dataset_id}"."{table}" AS SELECT * FROM fixture_df')
+            self._conn.unregister("fixture_df")
+        self._lock = threading.Lock()
+
+    def query(self, sql: str) -> pd.DataFrame:
+        """Exécute une requête GoogleSQL (traduite pour DuckDB) et renvoie le résultat."""
+        duckdb_sql = to_duckdb_sql(sql, self.dataset_id)
+        with self._lock:
+            cursor = self._conn.cursor()
+        try:
+            return cursor.execute(duckdb_sql).df()
+        finally:
+            cursor.close()
+
+
+def _normalize(df: pd.DataFrame) -> pd.DataFrame:
+    """Types comparables entre moteurs : nombres en float arrondis, le reste en texte."""
+    normalized = {}
+    for i, column in enumerate(df.columns):
+        values = df.iloc[:, i]
+        if pd.api.types.is_bool_dtype(values) or pd.api.types.is_numeric_dtype(values):
+            normalized[i] = values.astype("float64").round(6)
+        else:
+            converted = pd.to_numeric(values, errors="coerce")
+            if values.notna().any() and converted.notna().sum() == values.notna().sum():
+                normalized[i] = converted.astype("float64").round(6)
+            else:
+                normalized[i] = values.map(lambda v: None if v is None or v is pd.NaT or v != v else str(v))
+    return pd.DataFrame(normalized)
+
+
+def result_signature(df: pd.DataFrame) -> np.ndarray:
+    """
+    Empreinte d'un résultat indépendante de l'ordre des lignes, des colonnes et de leurs noms :
+    hachage vectorisé de chaque ligne (`hash_pandas_object`) puis tri.
+    """
+    normalized = _normalize(df)
+    if normalized.shape[1] == 0:
+        return np.array([], dtype=np.uint64)
+    column_keys = [
+        hashlib.sha1(np.sort(pd.util.hash_pandas_object(normalized[c], index=False).to_numpy()).tobytes()).hexdigest()
+        for c in normalized.columns
+    ]
+    ordered = normalized[[c for _, c in sorted(zip(column_keys, normalized.columns))]]
+    ordered.columns = range(ordered.shape[1])
+    return np.sort(pd.util.hash_pandas_object(ordered, index=False).to_numpy())
+
+
+def compare_results(gold: pd.DataFrame, pred: pd.DataFrame) -> str:
+    if gold.empty and pred.empty:
+        return EMPTY
+    if gold.shape != pred.shape:
+        return MISMATCH
+    return MATCH if np.array_equal(result_signature(gold), result_signature(pred)) else MISMATCH
+
+
+def execution_match(gold_sql: str, pred_sql: str, db: Optional[FixtureDatabase] = None) -> MatchResult:
+    """
+    Exécute la requête de référence et la requête prédite sur les fixtures et compare les
+    résultats (multiensembles de lignes). "empty" : deux résultats vides, non concluant.
+    """
+    db = db or get_fixture_database()
+    try:
+        gold = db.query(gold_sql)
+    except Exception as e:
+        return MatchResult(GOLD_ERROR, error=str(e).splitlines()[0])
+    try:
+        pred = db.query(pred_sql)
+    except Exception as e:
+        return MatchResult(PRED_ERROR, gold_rows=len(gold), error=str(e).splitlines()[0])
+    return MatchResult(compare_results(gold, pred), gold_rows=len(gold), pred_rows=len(pred))
+
+
+def match_for_eval(gold_sql: str, pred_sql: str) -> str:
+    """Statut de `execution_match` sur les fixtures partagées (étape du moteur d'évaluation)."""
+    return execution_match(gold_sql, pred_sql).status
+
+
+@lru_cache(maxsize=1)
+def get_fixture_database() -> FixtureDatabase:
+    """Fixtures construites sur le schéma et les requêtes du jeu de validation (hors-ligne, reproductible)."""
+    from src.data.validation_set import load_validation_examples, load_validation_snapshot
+
+    fixtures = build_fixture_tables(
+        load_validation_snapshot().tables, seed_sql=[example["sql"] for example in load_validation_examples()],
+    )
+    logger.info(f"🦆 Fixtures DuckDB : {', '.join(f'{t} ({len(df)})' for t, df in fixtures.items())}")
+    return FixtureDatabase(fixtures)
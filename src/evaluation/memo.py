@@ -0,0 +1,141 @@
+# src/evaluation/memo.py
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+from config.settings import EVAL_MEMO_MAX_AGE_SECONDS, EVAL_MEMO_PATH
+from src.logging_config import logger
+
+MEMO_MODES = ("on", "off", "refresh")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS generations (
+    key TEXT PRIMARY KEY, model TEXT, prompt_hash TEXT, question TEXT, temperature REAL,
+    sql TEXT NOT NULL, created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS judgments (
+    key TEXT PRIMARY KEY, judge_model TEXT, judge_prompt_hash TEXT, question TEXT,
+    reference_sql TEXT, predicted_sql TEXT, score REAL NOT NULL, created_at REAL NOT NULL
+);
+"""
+
+
+def content_hash(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class MemoStore:
+    """
+    Mémo SQLite des sorties de l'évaluation, partagé par tous les runs.
+
+    - générations : clé (modèle, empreinte du prompt, question, température) -> SQL ;
+    - notes du juge : clé (modèle juge, empreinte du prompt juge, question, SQL attendu, SQL prédit) -> note.
+
+    Les clés sont des empreintes du contenu : changer de modèle, de prompt (schéma compris)
+    ou de température crée de nouvelles entrées sans invalider les anciennes. `max_age`
+    ignore (et remplace) les entrées plus anciennes ; `read=False` force le recalcul tout en
+    enregistrant les nouvelles valeurs. Les taux de succès sont comptés par type (`stats`).
+    """
+
+    def __init__(self, path: str = EVAL_MEMO_PATH, max_age: Optional[float] = EVAL_MEMO_MAX_AGE_SECONDS,
+                 read: bool = True):
+        self.path = path
+        self.max_age = max_age
+        self.read = read
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self.hits: Counter = Counter()
+        self.misses: Counter = Counter()
+
+    @classmethod
+    def open(cls, mode: str = "on", max_age: Optional[float] = EVAL_MEMO_MAX_AGE_SECONDS,
+             path: str = EVAL_MEMO_PATH) -> Optional["MemoStore"]:
+        """Mémo selon le mode des scripts d'évaluation : "on", "refresh" (écriture seule) ou "off" (None)."""
+        if mode not in MEMO_MODES:
+            raise ValueError(f"Mode de mémo inconnu : {mode} (attendus : {', '.join(MEMO_MODES)})")
+        return None if mode == "off" else cls(path, max_age, read=(mode == "on"))
+
+    def _get(self, kind: str, table: str, column: str, key: str):
+        if not self.read:
+            self.misses[kind] += 1
+            return None
+        with self._lock:
+            row = self._conn.execute(f"SELECT {column}, created_at FROM {table} WHERE key = ?", (key,)).fetchone()
+        if row is None or (self.max_age is not None and time.time() - row[1] > self.max_age):
+            self.misses[kind] += 1
+            return None
+        self.hits[kind] += 1
+        return row[0]
+
+    def get_generation(self, model: str, prompt_hash: str, question: str, temperature: float) -> Optional[str]:
+        return self._get("generation", "generations", "sql", content_hash(model, prompt_hash, question, temperature))
+
+    def put_generation(self, model: str, prompt_hash: str, question: str, temperature: float, sql: str):
+        key = content_hash(model, prompt_hash, question, temperature)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO generations VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, model, prompt_hash, question, temperature, sql, time.time()),
+            )
+
+    def get_judgment(self, judge_model: str, judge_prompt_hash: str, question: str,
+                     reference_sql: str, predicted_sql: str) -> Optional[float]:
+        key = content_hash(judge_model, judge_prompt_hash, question, reference_sql, predicted_sql)
+        return self._get("judge", "judgments", "score", key)
+
+    def put_judgment(self, judge_model: str, judge_prompt_hash: str, question: str,
+                     reference_sql: str, predicted_sql: str, score: float):
+        key = content_hash(judge_model, judge_prompt_hash, question, reference_sql, predicted_sql)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO judgments VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, judge_model, judge_prompt_hash, question, reference_sql, predicted_sql, score, time.time()),
+            )
+
+    def expire(self, older_than: float) -> int:
+        """Supprime les entrées de plus de `older_than` secondes ; renvoie le nombre supprimé."""
+        cutoff = time.time() - older_than
+        with self._lock:
+            return sum(
+                self._conn.execute(f"DELETE FROM {table} WHERE created_at < ?", (cutoff,)).rowcount
+                for table in ("generations", "judgments")
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                       for table in ("generations", "judgments"))
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {
+            kind: {
+                "hits": self.hits[kind],
+                "misses": self.misses[kind],
+                "hit_rate": self.hits[kind] / (self.hits[kind] + self.misses[kind]) if self.hits[kind] + self.misses[kind] else 0.0,
+            }
+            for kind in ("generation", "judge")
+        }
+
+    def close(self):
+        self._conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mémo des générations et notes du juge de l'évaluation")
+    parser.add_argument("--expire", type=float, metavar="JOURS", help="Supprime les entrées plus anciennes")
+    args = parser.parse_args()
+    memo = MemoStore()
+    if args.expire is not None:
+        logger.info(f"🧹 {memo.expire(args.expire * 86400)} entrée(s) supprimée(s)")
+    print(f"🗄️ {memo.path} : {len(memo)} entrée(s)")
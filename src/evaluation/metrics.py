@@ -1,40 +1,25 @@
-import pandas as pd
-from tqdm import tqdm
-from src.inference.predict import generate_ft_sql, generate_base_sql
-from src.security.safety_checks import execute_sql, evaluate_judge
-from google.cloud import bigquery
+from src.bigquery_clients import get_bq_client
+from src.evaluation.engine import EvaluationEngine, evaluate_rows
+from src.evaluation.memo import MemoStore
 from config.settings import PROJECT_ID
 
-bq_client = bigquery.Client(project=PROJECT_ID)
 
-def evaluate_model():
+def evaluate_model(run_id: str = None, memo: str = "on", memo_max_age: float = None):
+    """
+    Évalue les deux modèles sur les questions approuvées des logs. Comme `predict_sql`, le
+    scope est classé d'abord (`with_scope=True`) : une question jugée hors-scope n'est pas
+    générée et compte comme un échec.
+    """
     query = f"""
         SELECT DISTINCT original_question, query 
         FROM `{PROJECT_ID}.working.logs` 
         WHERE approved = TRUE AND scope = 'RDM'
     """
-    validation_data = bq_client.query(query).result().to_dataframe()
-    
-    results = []
-    for _, row in tqdm(validation_data.iterrows(), total=len(validation_data), desc="📐 Évaluation des modèles"):
-        question = row['original_question']
-        expected_sql = row['query']
-
-        base_sql = generate_base_sql(question)
-        ft_sql = generate_ft_sql(question)
-
-        base_exec, _ = execute_sql(base_sql) if base_sql else (False, None)
-        ft_exec, _ = execute_sql(ft_sql) if ft_sql else (False, None)
+    validation_data = get_bq_client().query(query).result().to_dataframe()
 
-        results.append({
-            "question": question,
-            "expected_sql": expected_sql,
-            "base_sql": base_sql,
-            "ft_sql": ft_sql,
-            "base_semantic": evaluate_judge(question, expected_sql, base_sql or ""),
-            "ft_semantic": evaluate_judge(question, expected_sql, ft_sql or ""),
-            "base_exec": base_exec,
-            "ft_exec": ft_exec,
-        })
-    
-    return pd.DataFrame(results)
+    # Générations, exécutions et notes du juge de toutes les lignes en parallèle (voir engine.py)
+    rows = list(zip(validation_data["original_question"], validation_data["query"]))
+    return evaluate_rows(
+        rows, with_scope=True, desc="📐 Évaluation des modèles", run_id=run_id,
+        engine=EvaluationEngine(memo=MemoStore.open(memo, memo_max_age)),
+    )
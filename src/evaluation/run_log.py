@@ -0,0 +1,115 @@
+# src/evaluation/run_log.py
+
+import hashlib
+import json
+import os
+import sys
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+import pandas as pd
+from config.settings import EVAL_RUNS_DIR
+from src.logging_config import logger
+
+
+def new_run_id() -> str:
+    return datetime.now().strftime("%Y%m%d-%H%M%S")
+
+
+def row_key(question: str, expected_sql: str) -> str:
+    """Identifiant d'une ligne d'évaluation (question + SQL attendu)."""
+    return hashlib.sha1(f"{question}\x00{expected_sql}".encode("utf-8")).hexdigest()
+
+
+class RunLog:
+    """
+    Journal JSONL d'un run d'évaluation : une ligne par question notée, écrite dès qu'elle
+    est terminée (`evaluation/runs/{run_id}.jsonl`).
+
+    Relancer un run avec le même `run_id` ne note que les questions absentes du journal.
+    Le journal est lisible pendant le run (`summarize`) ; une dernière ligne tronquée par un
+    arrêt brutal est ignorée à la relecture.
+    """
+
+    def __init__(self, run_id: str, directory: str = EVAL_RUNS_DIR):
+        self.run_id = run_id
+        self.path = os.path.join(directory, f"{run_id}.jsonl")
+        self._lock = threading.Lock()
+        self._checked_tail = False
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def read(self) -> List[dict]:
+        if not self.exists():
+            return []
+        rows = []
+        with open(self.path, encoding="utf-8") as f:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    rows.append(json.loads(line))
+                except ValueError:
+                    logger.warning(f"⚠️ Ligne {number} illisible dans {self.path}, ignorée")
+        return rows
+
+    def completed(self) -> Dict[str, dict]:
+        """Lignes déjà notées, par `row_key`."""
+        return {row["key"]: row for row in self.read() if "key" in row}
+
+    def append(self, row: dict):
+        record = {"key": row_key(row["question"], row["expected_sql"]), **row}
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            if not self._checked_tail:
+                # Reprise après un arrêt en pleine écriture : la ligne tronquée reste isolée
+                self._checked_tail = True
+                if self.exists() and os.path.getsize(self.path):
+                    with open(self.path, "rb") as f:
+                        f.seek(-1, os.SEEK_END)
+                        if f.read(1) != b"\n":
+                            line = "\n" + line
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def to_dataframe(self) -> pd.DataFrame:
+        return pd.DataFrame(self.read()).drop(columns=["key"], errors="ignore")
+
+
+def summarize(df: pd.DataFrame) -> Dict[str, Optional[float]]:
+    """Agrégats (en %) d'un run, complet ou en cours."""
+    if df.empty:
+        return {"rows": 0}
+    in_scope = df[df["scope"] == "in_scope"] if "scope" in df else df
+    summary: Dict[str, Optional[float]] = {
+        "rows": len(df),
+        "base_exec": in_scope["base_exec"].mean() * 100,
+        "ft_exec": in_scope["ft_exec"].mean() * 100,
+        "base_semantic": in_scope["base_semantic"].mean() / 2 * 100,
+        "ft_semantic": in_scope["ft_semantic"].mean() / 2 * 100,
+    }
+    for model in ("base", "ft"):
+        if f"{model}_match" in in_scope:
+            summary[f"{model}_match"] = (in_scope[f"{model}_match"] == "match").mean() * 100
+    if "scope" in df:
+        out_scope = df[df["scope"] == "out_of_scope"]
+        summary["out_of_scope"] = len(out_scope)
+        summary["ft_refusal"] = (~out_scope["ft_safe"].astype(bool)).mean() * 100 if len(out_scope) else None
+        summary["base_refusal"] = (~out_scope["base_safe"].astype(bool)).mean() * 100 if len(out_scope) else None
+    return summary
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage : PYTHONPATH=. python -m src.evaluation.run_log <run_id>")
+        sys.exit(1)
+    log = RunLog(sys.argv[1])
+    if not log.exists():
+        print(f"❌ Run introuvable : {log.path}")
+        sys.exit(1)
+    for name, value in summarize(log.to_dataframe()).items():
+        print(f"{name:<14} {value if value is None or name in ('rows', 'out_of_scope') else f'{value:.1f}%'}")
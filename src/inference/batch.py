@@ -0,0 +1,110 @@
+# src/inference/batch.py
+
+import asyncio
+import time
+from dataclasses import dataclass, asdict
+from typing import AsyncIterator, Dict, List, Optional
+from config.settings import BATCH_CONCURRENCY
+from src.async_utils import run_sync
+from src.inference.cache import normalize_question
+from src.inference.pipeline import PredictionPipeline, PredictionResult
+from src.logging_config import logger
+
+
+@dataclass
+class BatchItemResult:
+    """
+    Résultat d'une question d'un lot.
+
+    index : position de la question dans le lot reçu.
+    latency_ms : temps de traitement de la question, attente d'une place de génération exclue.
+    duplicate_of : position de la première occurrence si la question (normalisée) est répétée ;
+    le SQL est alors partagé et le coût n'est compté qu'une fois.
+    """
+    index: int
+    question: str
+    status: str
+    sql: Optional[str] = None
+    estimated_cost: Optional[float] = None
+    latency_ms: float = 0.0
+    source: Optional[str] = None
+    reason: Optional[str] = None
+    duplicate_of: Optional[int] = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+async def predict_sql_batch_async(questions: List[str], use_ft_model: bool = True,
+                                  concurrency: int = BATCH_CONCURRENCY,
+                                  pipeline: Optional[PredictionPipeline] = None) -> AsyncIterator[BatchItemResult]:
+    """
+    Génère le SQL d'un lot de questions et renvoie chaque résultat dès qu'il est prêt.
+
+    Les questions identiques (après normalisation) ne sont traitées qu'une fois. Les étapes
+    sans modèle (validation, cache, gabarits) sont lancées pour toutes les questions dès le
+    départ : les réponses en cache sortent immédiatement. Les autres passent par le pipeline
+    complet (scope + génération), au plus `concurrency` à la fois. Une question qui échoue
+    n'interrompt pas le lot (statut "error").
+    """
+    pipeline = pipeline or PredictionPipeline(use_ft_model=use_ft_model)
+    groups: Dict[str, List[int]] = {}
+    for index, question in enumerate(questions):
+        groups.setdefault(normalize_question(question), []).append(index)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    start = time.perf_counter()
+
+    async def answer(indices: List[int]):
+        question = questions[indices[0]]
+        elapsed = 0.0
+        try:
+            began = time.perf_counter()
+            result = await pipeline.answer_without_model(question)
+            elapsed = time.perf_counter() - began
+            if result is None:
+                async with semaphore:
+                    began = time.perf_counter()
+                    result = await pipeline.generate(question)
+                    elapsed += time.perf_counter() - began
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de la prédiction (lot) : {e}", exc_info=True)
+            result = PredictionResult(status="error", reason="Erreur lors de la génération SQL.")
+        return indices, result, elapsed * 1000
+
+    tasks = [asyncio.create_task(answer(indices)) for indices in groups.values()]
+    statuses: Dict[str, int] = {}
+    try:
+        for completed in asyncio.as_completed(tasks):
+            indices, result, latency_ms = await completed
+            status = result.status if result.source != "cache" else "cache"
+            statuses[status] = statuses.get(status, 0) + 1
+            for index in indices:
+                first = index == indices[0]
+                yield BatchItemResult(
+                    index=index,
+                    question=questions[index],
+                    status=result.status,
+                    sql=result.sql,
+                    estimated_cost=result.estimated_cost if first or result.estimated_cost is None else 0.0,
+                    latency_ms=round(latency_ms, 1),
+                    source=result.source if result.status == "ok" else None,
+                    reason=result.reason,
+                    duplicate_of=None if first else indices[0],
+                )
+    finally:
+        # Client déconnecté ou lot abandonné : les générations restantes sont annulées
+        for task in tasks:
+            task.cancel()
+    logger.info(
+        f"📦 Lot de {len(questions)} question(s) ({len(groups)} distinctes) en {time.perf_counter() - start:.1f} s : "
+        + ", ".join(f"{count} {status}" for status, count in sorted(statuses.items()))
+    )
+
+
+def predict_sql_batch(questions: List[str], use_ft_model: bool = True,
+                      concurrency: int = BATCH_CONCURRENCY) -> List[BatchItemResult]:
+    """Version synchrone de `predict_sql_batch_async` : résultats dans l'ordre des questions."""
+    async def collect():
+        return [item async for item in predict_sql_batch_async(questions, use_ft_model, concurrency)]
+
+    return sorted(run_sync(collect()), key=lambda item: item.index)
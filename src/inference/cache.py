@@ -0,0 +1,111 @@
+# src/inference/cache.py
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+from config.settings import SQL_CACHE_MAXSIZE, SQL_CACHE_TTL_SECONDS
+from src.text_utils import strip_accents
+
+CacheKey = Tuple[str, str, str, str]
+
+# Variantes typographiques ramenées à leur forme ASCII (apostrophes, guillemets, signe moins)
+_TYPOGRAPHY = str.maketrans({"’": "'", "‘": "'", "“": '"', "”": '"', "«": '"', "»": '"', "−": "-", "–": "-"})
+
+
+def normalize_question(question: str) -> str:
+    """
+    Forme canonique d'une question pour le cache : seuls la casse, les accents, les espaces et
+    le point d'interrogation final sont ignorés. Les opérateurs (`<`, `>`, `=`, `%`), les signes
+    et la ponctuation des nombres sont conservés : "CA > 1000" et "CA < 1000" ne partagent pas
+    la même clé.
+    """
+    text = strip_accents((question or "").lower()).translate(_TYPOGRAPHY)
+    return " ".join(text.split()).rstrip("?! ")
+
+
+class SQLCache:
+    """
+    Cache en mémoire des requêtes SQL générées, borné (LRU) et à durée de vie (TTL).
+
+    La clé combine la question normalisée, le modèle appelé, la version du prompt et
+    l'empreinte du schéma : un changement de schéma ou d'endpoint ne peut donc pas
+    servir une requête périmée, et `invalidate` permet de purger explicitement les
+    entrées concernées. Thread-safe.
+    """
+
+    def __init__(self, maxsize: int = SQL_CACHE_MAXSIZE, ttl: float = SQL_CACHE_TTL_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[CacheKey, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def make_key(question: str, model_key: str, prompt_version: str, schema_fingerprint: str) -> CacheKey:
+        return normalize_question(question), model_key, prompt_version, schema_fingerprint
+
+    def get(self, question: str, model_key: str, prompt_version: str, schema_fingerprint: str) -> Optional[str]:
+        key = self.make_key(question, model_key, prompt_version, schema_fingerprint)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, sql = entry
+            if self._clock() - stored_at > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return sql
+
+    def set(self, question: str, model_key: str, prompt_version: str, schema_fingerprint: str, sql: str):
+        key = self.make_key(question, model_key, prompt_version, schema_fingerprint)
+        with self._lock:
+            self._entries[key] = (self._clock(), sql)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, model_key: Optional[str] = None, schema_fingerprint: Optional[str] = None) -> int:
+        """
+        Supprime les entrées d'un modèle et/ou d'une empreinte de schéma (tout le cache si aucun filtre).
+
+        Returns:
+            int: Nombre d'entrées supprimées.
+        """
+        with self._lock:
+            if model_key is None and schema_fingerprint is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                return removed
+            stale = [
+                key for key in self._entries
+                if (model_key is None or key[1] == model_key)
+                and (schema_fingerprint is None or key[3] == schema_fingerprint)
+            ]
+            for key in stale:
+                del self._entries[key]
+            return len(stale)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -0,0 +1,186 @@
+# src/inference/pipeline.py
+
+import asyncio
+import time
+from dataclasses import dataclass, asdict
+from typing import Any, AsyncIterator, Optional, Tuple
+from src.inference.predict import (
+    generate_raw_sql_async,
+    stream_raw_sql_async,
+    review_sql_response,
+    lookup_cached_sql,
+    store_cached_sql,
+    INCOMPLETE_SCHEMA,
+)
+from src.inference.streaming import ttft_tracker
+from src.inference.templates import TemplateEngine, get_template_engine
+from src.security.safety_checks import validate_input
+from src.security.scope_filter import classify_scope_async
+from src.schema.validator import check_sql_schema
+from src.logging_config import logger
+
+
+@dataclass
+class PredictionResult:
+    """
+    Résultat d'un passage dans le pipeline.
+
+    status : "ok", "invalid_input", "out_of_scope", "incomplete_schema", "unsafe", "invalid_sql" ou "error".
+    source : origine du SQL ("model", "cache" ou "template").
+    ttft_ms : temps jusqu'au premier morceau de SQL (génération en flux uniquement).
+    """
+    status: str
+    sql: Optional[str] = None
+    estimated_cost: Optional[float] = None
+    scope: Optional[str] = None
+    reason: Optional[str] = None
+    source: str = "model"
+    ttft_ms: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class PredictionPipeline:
+    """
+    Chaîne de traitement d'une question : validation → cache → gabarits → scope → génération → sanitization
+    → validation contre le schéma.
+
+    Chaque garde n'est exécutée qu'une seule fois et son résultat est transmis à l'étape
+    suivante. La génération est lancée de manière spéculative pendant la classification
+    de scope, puis annulée si la question est hors-scope : pour une question in-scope,
+    la latence est celle de l'appel le plus long et non la somme des deux.
+    """
+
+    def __init__(self, use_ft_model: bool = True, speculative: bool = True,
+                 template_engine: Optional[TemplateEngine] = None):
+        self.use_ft_model = use_ft_model
+        self.speculative = speculative
+        self.template_engine = template_engine
+
+    async def run(self, question: str) -> PredictionResult:
+        result = await self.answer_without_model(question)
+        if result is not None:
+            return result
+        return await self.generate(question)
+
+    async def answer_without_model(self, question: str) -> Optional[PredictionResult]:
+        """Étapes sans appel au modèle (validation, cache, gabarits) ; None si la génération est nécessaire."""
+        if not validate_input(question):
+            return PredictionResult(status="invalid_input", reason="Entrée invalide.")
+
+        # ♻️ Une requête en cache a déjà passé toutes les gardes
+        cached_sql = await asyncio.to_thread(lookup_cached_sql, question, self.use_ft_model)
+        if cached_sql is not None:
+            return PredictionResult(status="ok", sql=cached_sql, estimated_cost=0.0, scope="in_scope", source="cache")
+
+        # 🧩 Question paramétrique connue : SQL complété sans appel au modèle (déjà sanitisé)
+        if self.template_engine is None:
+            self.template_engine = await asyncio.to_thread(get_template_engine)
+        template_match = self.template_engine.match(question)
+        if template_match is not None:
+            logger.info(f"🧩 Gabarit utilisé ({template_match.support} exemple(s)) : {template_match.skeleton}")
+            return PredictionResult(status="ok", sql=template_match.sql, estimated_cost=0.0, scope="in_scope",
+                                    source="template")
+        return None
+
+    async def generate(self, question: str) -> PredictionResult:
+        """Classification de scope et génération spéculative, puis sanitization et mise en cache."""
+        generation = None
+        if self.speculative:
+            generation = asyncio.create_task(generate_raw_sql_async(question, self.use_ft_model))
+
+        scope = await classify_scope_async(question)
+        if scope == "out_of_scope":
+            if generation is not None:
+                generation.cancel()
+            logger.warning(f"🚫 Question hors-scope détectée : {question}")
+            return PredictionResult(status="out_of_scope", scope=scope, reason="Question hors-scope détectée.")
+
+        try:
+            if generation is None:
+                generation = asyncio.create_task(generate_raw_sql_async(question, self.use_ft_model))
+            response_text, estimated_cost = await generation
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de la prédiction : {e}", exc_info=True)
+            return PredictionResult(status="error", scope=scope, reason="Erreur lors de la génération SQL.")
+
+        return await self._finalize(question, response_text, estimated_cost, scope)
+
+    async def _finalize(self, question: str, response_text: str, estimated_cost: Optional[float],
+                        scope: str) -> PredictionResult:
+        """Sanitization du texte complet et validation contre le schéma, puis mise en cache du SQL accepté."""
+        sql, refusal_reason = review_sql_response(response_text)
+        if refusal_reason is not None:
+            return PredictionResult(
+                status="unsafe", scope=scope, estimated_cost=estimated_cost, reason=refusal_reason
+            )
+        if sql == INCOMPLETE_SCHEMA:
+            return PredictionResult(status="incomplete_schema", sql=sql, scope=scope, estimated_cost=estimated_cost)
+        schema_error = check_sql_schema(sql)
+        if schema_error is not None:
+            return PredictionResult(status="invalid_sql", scope=scope, estimated_cost=estimated_cost, reason=schema_error)
+
+        await asyncio.to_thread(store_cached_sql, question, sql, self.use_ft_model)
+        return PredictionResult(status="ok", sql=sql, scope=scope, estimated_cost=estimated_cost)
+
+    async def stream(self, question: str) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Version en flux de `run` : `("delta", texte partiel)` au fil de la génération, puis
+        `("result", PredictionResult)`.
+
+        Le flux du modèle démarre pendant la classification de scope ; les morceaux reçus sont
+        retenus jusqu'à la décision, puis transmis (ou abandonnés si la question est hors-scope).
+        Le texte partiel n'est qu'un aperçu : seule la requête du résultat final, sanitisée
+        sur le texte complet, peut être exécutée. Le temps jusqu'au premier morceau (TTFT)
+        est mesuré depuis la réception de la question et enregistré dans `ttft_tracker`.
+        """
+        start = time.perf_counter()
+        result = await self.answer_without_model(question)
+        if result is not None:
+            yield "result", result
+            return
+
+        chunks: asyncio.Queue = asyncio.Queue()
+
+        async def produce():
+            try:
+                async for text, cost in stream_raw_sql_async(question, self.use_ft_model):
+                    await chunks.put(("chunk", text, cost))
+                await chunks.put(("end", None, None))
+            except Exception as e:
+                await chunks.put(("error", e, None))
+
+        producer = asyncio.create_task(produce()) if self.speculative else None
+        try:
+            scope = await classify_scope_async(question)
+            if scope == "out_of_scope":
+                logger.warning(f"🚫 Question hors-scope détectée : {question}")
+                yield "result", PredictionResult(status="out_of_scope", scope=scope, reason="Question hors-scope détectée.")
+                return
+            if producer is None:
+                producer = asyncio.create_task(produce())
+
+            parts, estimated_cost, ttft_ms = [], None, None
+            while True:
+                kind, value, cost = await chunks.get()
+                if kind == "end":
+                    break
+                if kind == "error":
+                    logger.error(f"❌ Erreur lors de la prédiction : {value}", exc_info=value)
+                    yield "result", PredictionResult(status="error", scope=scope, reason="Erreur lors de la génération SQL.")
+                    return
+                if value:
+                    if not parts:
+                        ttft_ms = round((time.perf_counter() - start) * 1000, 1)
+                        ttft_tracker.record(ttft_ms)
+                    parts.append(value)
+                    yield "delta", value
+                if cost is not None:
+                    estimated_cost = cost
+            result = await self._finalize(question, "".join(parts), estimated_cost, scope)
+            result.ttft_ms = ttft_ms
+            yield "result", result
+        finally:
+            if producer is not None:
+                producer.cancel()
@@ -1,17 +1,28 @@
 # src/inference/predict.py
 
+import asyncio
 import logging
+import os
+from functools import lru_cache
 from google import genai
 from google.genai import types
-from config.settings import PROJECT_NUMBER, ENDPOINT_ID, VERTEX_LOCATION
+from config.settings import (
+    PROJECT_NUMBER, ENDPOINT_ID, VERTEX_LOCATION, SEMANTIC_CACHE_ENABLED, SEMANTIC_CACHE_DIR, SCHEMA_LINKING_ENABLED,
+    SCHEMA_ENCODING,
+)
 from src.security.safety_checks import sanitize_sql_output
-from src.security.scope_filter import classify_scope
+from src.security.scope_filter import classify_scope, classify_scope_async
 from src.prompts.utils import get_prompt
+from src.schema.extract_schema import schema_fingerprint
+from src.schema.snapshot import on_schema_change
+from src.schema.validator import check_sql_schema
+from src.inference.cache import SQLCache
+from src.inference.semantic_cache import SemanticCache, VertexEmbedder
 from src.logging_config import logger
-from typing import Tuple, Optional, Any # Added Any
+from typing import AsyncIterator, Tuple, Optional, Any # Added Any
 
 
-FT_PROMPT_PREFIX = get_prompt("v1")
+PROMPT_VERSION = "v1"
 
 # Logger
 logger = logging.getLogger(__name__)
@@ -47,6 +58,257 @@ def _calculate_cost(model_key: str, usage_metadata: Optional[Any]) -> Optional[f
         logger.error(f"Error calculating cost: {e}", exc_info=True)
         return None
 
+# --- Client partagé & gabarits de requête ---
+SAFETY_SETTINGS = [
+    types.SafetySetting(category="HARM_CATEGORY_HATE_SPEECH", threshold="BLOCK_NONE"),
+    types.SafetySetting(category="HARM_CATEGORY_DANGEROUS_CONTENT", threshold="BLOCK_NONE"),
+    types.SafetySetting(category="HARM_CATEGORY_SEXUALLY_EXPLICIT", threshold="BLOCK_NONE"),
+    types.SafetySetting(category="HARM_CATEGORY_HARASSMENT", threshold="BLOCK_NONE"),
+]
+
+GENERATION_CONFIG = types.GenerateContentConfig(
+    temperature=0.2,
+    max_output_tokens=2048,
+    response_modalities=["TEXT"],
+    safety_settings=SAFETY_SETTINGS,
+)
+
+FT_MODEL_NAME = f"projects/{PROJECT_NUMBER}/locations/{VERTEX_LOCATION}/endpoints/{ENDPOINT_ID}"
+BASE_MODEL_NAME = "gemini-2.0-flash-001"
+
+INCOMPLETE_SCHEMA = "INCOMPLETE_SCHEMA"
+
+# Cache des requêtes déjà générées (question normalisée, modèle, prompt, schéma)
+sql_cache = SQLCache()
+_semantic_cache: Optional[SemanticCache] = None
+
+
+@lru_cache(maxsize=1)
+def get_genai_client() -> genai.Client:
+    """
+    Retourne le client Gemini partagé par le processus.
+
+    Un seul client longue durée est créé : son pool de connexions HTTP (sync et
+    `client.aio`) et ses credentials sont réutilisés par toutes les requêtes.
+    """
+    return genai.Client(vertexai=True, project=PROJECT_NUMBER, location=VERTEX_LOCATION)
+
+
+def _resolve_model(use_ft_model: bool) -> Tuple[str, str]:
+    """Renvoie le nom du modèle à appeler et la clé de pricing associée."""
+    if use_ft_model:
+        return FT_MODEL_NAME, "ft_endpoint"
+    return BASE_MODEL_NAME, BASE_MODEL_NAME
+
+
+def get_semantic_cache() -> SemanticCache:
+    """Cache sémantique partagé, rechargé depuis `SEMANTIC_CACHE_DIR` s'il y a un snapshot."""
+    global _semantic_cache
+    if _semantic_cache is None:
+        if os.path.exists(os.path.join(SEMANTIC_CACHE_DIR, "entries.json")):
+            _semantic_cache = SemanticCache.load(SEMANTIC_CACHE_DIR, VertexEmbedder())
+        else:
+            _semantic_cache = SemanticCache(VertexEmbedder())
+    return _semantic_cache
+
+
+def save_semantic_cache():
+    """Persiste le cache sémantique sur disque (appelé à l'arrêt de l'API)."""
+    if _semantic_cache is not None and len(_semantic_cache):
+        _semantic_cache.save(SEMANTIC_CACHE_DIR)
+
+
+def _cache_namespace(use_ft_model: bool) -> Tuple[str, str, str]:
+    model_name, _ = _resolve_model(use_ft_model)
+    # Encodage du schéma et schema linking changent le prompt envoyé : chaque variante a son cache
+    prompt_key = PROMPT_VERSION if SCHEMA_ENCODING == "bullets" else f"{PROMPT_VERSION}+{SCHEMA_ENCODING}"
+    if SCHEMA_LINKING_ENABLED:
+        prompt_key += "+linking"
+    return model_name, prompt_key, schema_fingerprint()
+
+
+def lookup_cached_sql(question: str, use_ft_model: bool = True) -> Optional[str]:
+    """
+    Renvoie la requête SQL en cache pour cette question et ce modèle, ou None.
+
+    Cherche d'abord la question normalisée (cache exact), puis une paraphrase
+    dans le cache sémantique.
+    """
+    try:
+        namespace = _cache_namespace(use_ft_model)
+    except Exception as e:
+        logger.warning(f"⚠️ Schéma indisponible, cache SQL ignoré : {e}")
+        return None
+    sql = sql_cache.get(question, *namespace)
+    if sql is not None or not SEMANTIC_CACHE_ENABLED:
+        return sql
+
+    try:
+        hit = get_semantic_cache().lookup(question, namespace=namespace)
+    except Exception as e:
+        logger.warning(f"⚠️ Cache sémantique indisponible : {e}")
+        return None
+    if hit is None:
+        return None
+    logger.info(f"♻️ Paraphrase reconnue (similarité {hit.score:.3f}) : {hit.question}")
+    sql_cache.set(question, *namespace, hit.sql)
+    return hit.sql
+
+
+def store_cached_sql(question: str, sql: str, use_ft_model: bool = True):
+    """Met en cache une requête SQL validée."""
+    try:
+        namespace = _cache_namespace(use_ft_model)
+    except Exception as e:
+        logger.warning(f"⚠️ Schéma indisponible, cache SQL ignoré : {e}")
+        return
+    sql_cache.set(question, *namespace, sql)
+    if SEMANTIC_CACHE_ENABLED:
+        try:
+            get_semantic_cache().add(question, sql, namespace=namespace)
+        except Exception as e:
+            logger.warning(f"⚠️ Cache sémantique indisponible : {e}")
+
+
+def invalidate_sql_cache(use_ft_model: Optional[bool] = None, fingerprint: Optional[str] = None) -> int:
+    """
+    Purge les caches SQL après un changement d'endpoint (`use_ft_model`) ou de schéma (`fingerprint`).
+    Sans argument, vide tout le cache.
+    """
+    model_name = _resolve_model(use_ft_model)[0] if use_ft_model is not None else None
+    removed = sql_cache.invalidate(model_key=model_name, schema_fingerprint=fingerprint)
+    if _semantic_cache is not None:
+        removed += _semantic_cache.invalidate(model_key=model_name, schema_fingerprint=fingerprint)
+    logger.info(f"🧹 Cache SQL invalidé : {removed} entrée(s) supprimée(s)")
+    return removed
+
+
+@on_schema_change
+def _purge_cache_on_schema_change(snapshot, previous):
+    """Les requêtes générées avec l'ancien schéma ne sont plus servies."""
+    invalidate_sql_cache(fingerprint=previous.fingerprint)
+
+
+def _build_contents(question: str, system_prompt: Optional[str] = None) -> list:
+    """Construit le contenu envoyé au modèle pour une question (prompt de `PROMPT_VERSION` par défaut)."""
+    system_prompt = system_prompt if system_prompt is not None else get_prompt(PROMPT_VERSION, question)
+    return [
+        types.Content(role="user", parts=[
+            types.Part(text=f"{system_prompt}\n\nQuestion : {question}")
+        ])
+    ]
+
+
+def _extract_response(response_obj: Any, model_key: str) -> Tuple[str, Optional[float]]:
+    """Extrait le texte brut d'une réponse Gemini et estime son coût."""
+    estimated_cost = None
+
+    # Extract text
+    response_text = (response_obj.text or "").strip()
+    logger.debug(f"🧠 Réponse brute du modèle : {response_text}")
+
+    # --- Cost Calculation ---
+    try:
+        # Attempt to get usage metadata (might be under response_obj.usage_metadata)
+        usage_metadata = getattr(response_obj, 'usage_metadata', None)
+        estimated_cost = _calculate_cost(model_key, usage_metadata)
+    except Exception as cost_e:
+        logger.error(f"Could not extract or calculate cost: {cost_e}", exc_info=True)
+    # -----------------------
+
+    return response_text, estimated_cost
+
+
+def review_sql_response(response_text: str) -> Tuple[str, Optional[str]]:
+    """
+    Applique les contrôles de sortie (réponse vide, refus du modèle, sanitization) au texte généré.
+
+    Returns:
+        Tuple[str, Optional[str]]: Requête SQL (ou 'INCOMPLETE_SCHEMA') et motif de refus
+        si la sanitization a rejeté la requête (None sinon).
+    """
+    # Vérification de la réponse SQL
+    if not response_text or not isinstance(response_text, str):
+        logger.warning("⚠️ Réponse vide ou invalide")
+        return INCOMPLETE_SCHEMA, None
+    if response_text.lower().strip() == "incomplete_schema":
+        logger.info("ℹ️ Modèle a détecté une question ambiguë ou hors schéma.")
+        return INCOMPLETE_SCHEMA, None
+
+    cleaned_sql = response_text.strip()
+    is_safe, reason = sanitize_sql_output(cleaned_sql)
+    if not is_safe:
+        logger.warning(f"🚫 Requête refusée : {reason}")
+        return INCOMPLETE_SCHEMA, reason
+
+    return cleaned_sql, None
+
+
+def _handle_response(response_obj: Any, model_key: str) -> Tuple[str, Optional[float]]:
+    """
+    Extrait le SQL d'une réponse Gemini, estime son coût et applique les contrôles de sécurité.
+
+    Returns:
+        Tuple[str, Optional[float]]: Requête SQL (ou 'INCOMPLETE_SCHEMA') et coût estimé (ou None).
+    """
+    response_text, estimated_cost = _extract_response(response_obj, model_key)
+    sql, _ = review_sql_response(response_text)
+    return sql, estimated_cost
+
+
+async def generate_raw_sql_async(question: str, use_ft_model: bool = True) -> Tuple[str, Optional[float]]:
+    """
+    Génère la réponse brute du modèle, sans contrôle de scope ni sanitization.
+
+    Brique utilisée par `PredictionPipeline`, qui exécute elle-même chaque garde une seule fois.
+    Les erreurs d'appel sont propagées à l'appelant.
+
+    Returns:
+        Tuple[str, Optional[float]]: Texte brut généré et coût estimé (ou None).
+    """
+    model_name, model_key_for_pricing = _resolve_model(use_ft_model)
+    logger.info(f"🔍 Génération SQL (async) | Model: {'FT' if use_ft_model else 'Base'} | Question: {question}")
+
+    response_obj = await get_genai_client().aio.models.generate_content(
+        model=model_name, contents=_build_contents(question), config=GENERATION_CONFIG
+    )
+    return _extract_response(response_obj, model_key_for_pricing)
+
+
+async def stream_raw_sql_async(question: str, use_ft_model: bool = True) -> AsyncIterator[Tuple[str, Optional[float]]]:
+    """
+    Version en flux de `generate_raw_sql_async` (`generate_content_stream`) : renvoie
+    `(texte partiel, None)` pour chaque morceau généré, puis `("", coût estimé)`.
+
+    Le décompte de tokens (`usage_metadata`) n'est complet que sur le dernier morceau :
+    le coût est calculé une fois le flux terminé. Aucun contrôle n'est appliqué au texte.
+    """
+    model_name, model_key_for_pricing = _resolve_model(use_ft_model)
+    logger.info(f"🔍 Génération SQL (flux) | Model: {'FT' if use_ft_model else 'Base'} | Question: {question}")
+
+    usage_metadata = None
+    stream = await get_genai_client().aio.models.generate_content_stream(
+        model=model_name, contents=_build_contents(question), config=GENERATION_CONFIG
+    )
+    async for chunk in stream:
+        usage_metadata = getattr(chunk, "usage_metadata", None) or usage_metadata
+        if chunk.text:
+            yield chunk.text, None
+    yield "", _calculate_cost(model_key_for_pricing, usage_metadata)
+
+
+def generate_sql_with_prompt(question: str, system_prompt: str, use_ft_model: bool = False) -> Tuple[str, Optional[float]]:
+    """
+    Génération brute avec un prompt système imposé, sans cache ni gardes
+    (benchmarks de prompts et d'encodages du schéma).
+    """
+    model_name, model_key_for_pricing = _resolve_model(use_ft_model)
+    response_obj = get_genai_client().models.generate_content(
+        model=model_name, contents=_build_contents(question, system_prompt), config=GENERATION_CONFIG
+    )
+    return _extract_response(response_obj, model_key_for_pricing)
+
+
 def predict_sql(question: str, use_ft_model: bool = True) -> Tuple[str, Optional[float]]:
     """
     Appelle le modèle (base ou fine-tuné) pour générer une requête SQL et estime le coût.
@@ -58,87 +320,72 @@ def predict_sql(question: str, use_ft_model: bool = True) -> Tuple[str, Optional
     Returns:
         Tuple[str, Optional[float]]: Requête SQL générée (ou 'INCOMPLETE_SCHEMA') et coût estimé (ou None).
     """
-    estimated_cost = None
-    sql_result = "INCOMPLETE_SCHEMA" # Default result
+    # ♻️ Question déjà traitée : ni scope ni génération à payer
+    cached_sql = lookup_cached_sql(question, use_ft_model)
+    if cached_sql is not None:
+        return cached_sql, 0.0
 
     # 🔐 Refus immédiat des questions hors-scope
     if classify_scope(question) == "out_of_scope":
         logger.warning(f"🚫 Question hors-scope détectée : {question}")
-        return sql_result, estimated_cost # Return default result and None cost
+        return "INCOMPLETE_SCHEMA", None
 
     try:
-        client = genai.Client(vertexai=True, project=PROJECT_NUMBER, location=VERTEX_LOCATION)
+        model_name, model_key_for_pricing = _resolve_model(use_ft_model)
+        logger.info(f"🔍 Génération SQL | Model: {'FT' if use_ft_model else 'Base'} | Question: {question}")
 
-        # Choix du modèle et pricing key
-        if use_ft_model:
-            model_name = f"projects/{PROJECT_NUMBER}/locations/{VERTEX_LOCATION}/endpoints/{ENDPOINT_ID}"
-            model_key_for_pricing = "ft_endpoint" # Key for pricing dict
-        else:
-            model_name = "gemini-2.0-flash-001"
-            model_key_for_pricing = "gemini-2.0-flash-001" # Key for pricing dict
-
-        # Construction du prompt
-        content = [
-            types.Content(role="user", parts=[
-                types.Part(text=f"{FT_PROMPT_PREFIX}\n\nQuestion : {question}")
-            ])
-        ]
-
-        config = types.GenerateContentConfig(
-            temperature=0.2,
-            max_output_tokens=2048,
-            response_modalities=["TEXT"],
-            safety_settings=[
-                types.SafetySetting(category="HARM_CATEGORY_HATE_SPEECH", threshold="BLOCK_NONE"),
-                types.SafetySetting(category="HARM_CATEGORY_DANGEROUS_CONTENT", threshold="BLOCK_NONE"),
-                types.SafetySetting(category="HARM_CATEGORY_SEXUALLY_EXPLICIT", threshold="BLOCK_NONE"),
-                types.SafetySetting(category="HARM_CATEGORY_HARASSMENT", threshold="BLOCK_NONE"),
-            ]
+        # Génération du contenu - Use non-streaming to easily get usage metadata
+        response_obj = get_genai_client().models.generate_content(
+            model=model_name, contents=_build_contents(question), config=GENERATION_CONFIG
         )
+        sql, estimated_cost = _handle_response(response_obj, model_key_for_pricing)
+        if sql != INCOMPLETE_SCHEMA and check_sql_schema(sql) is not None:
+            return INCOMPLETE_SCHEMA, estimated_cost
+        if sql != INCOMPLETE_SCHEMA:
+            store_cached_sql(question, sql, use_ft_model)
+        return sql, estimated_cost
 
-        logger.info(f"🔍 Génération SQL | Model: {'FT' if use_ft_model else 'Base'} | Question: {question}")
+    except Exception as e:
+        logger.error(f"❌ Erreur lors de la prédiction : {e}", exc_info=True)
+        # Return default SQL and None cost in case of error
+        return "INCOMPLETE_SCHEMA", None
 
-        # Génération du contenu - Use non-streaming to easily get usage metadata
-        # Note: If streaming is strictly required, extracting metadata might need adjustments
-        # based on library specifics or might not be available until the full stream is processed.
-        response_obj = client.models.generate_content(model=model_name, contents=content, config=config)
 
-        # Extract text
-        response_text = response_obj.text.strip()
-        logger.debug(f"🧠 Réponse brute du modèle : {response_text}")
+async def predict_sql_async(question: str, use_ft_model: bool = True) -> Tuple[str, Optional[float]]:
+    """
+    Version asynchrone de `predict_sql`, destinée aux endpoints FastAPI `async`.
 
-        # --- Cost Calculation ---
-        try:
-            # Attempt to get usage metadata (might be under response_obj.usage_metadata)
-            usage_metadata = getattr(response_obj, 'usage_metadata', None)
-            estimated_cost = _calculate_cost(model_key_for_pricing, usage_metadata)
-        except Exception as cost_e:
-            logger.error(f"Could not extract or calculate cost: {cost_e}", exc_info=True)
-        # -----------------------
-
-
-        # Vérification de la réponse SQL
-        if not response_text or not isinstance(response_text, str):
-            logger.warning("⚠️ Réponse vide ou invalide")
-            sql_result = "INCOMPLETE_SCHEMA"
-        elif response_text.lower().strip() == "incomplete_schema":
-            logger.info("ℹ️ Modèle a détecté une question ambiguë ou hors schéma.")
-            sql_result = "INCOMPLETE_SCHEMA"
-        else:
-            cleaned_sql = response_text.strip()
-            is_safe, reason = sanitize_sql_output(cleaned_sql)
+    Utilise l'API asynchrone (`client.aio`) du client partagé : l'attente réseau ne bloque
+    ni la boucle d'événements ni le threadpool, un worker peut donc porter des centaines
+    de générations en parallèle.
+
+    Args:
+        question (str): Question utilisateur en langage naturel.
+        use_ft_model (bool): True pour utiliser le modèle fine-tuné, False pour Gemini base.
+
+    Returns:
+        Tuple[str, Optional[float]]: Requête SQL générée (ou 'INCOMPLETE_SCHEMA') et coût estimé (ou None).
+    """
+    cached_sql = await asyncio.to_thread(lookup_cached_sql, question, use_ft_model)
+    if cached_sql is not None:
+        return cached_sql, 0.0
 
-            if not is_safe:
-                logger.warning(f"🚫 Requête refusée : {reason}")
-                sql_result = "INCOMPLETE_SCHEMA"
-            else:
-                sql_result = cleaned_sql # Assign successful SQL
+    # 🔐 Refus immédiat des questions hors-scope
+    if await classify_scope_async(question) == "out_of_scope":
+        logger.warning(f"🚫 Question hors-scope détectée : {question}")
+        return "INCOMPLETE_SCHEMA", None
 
-        return sql_result, estimated_cost
+    try:
+        response_text, estimated_cost = await generate_raw_sql_async(question, use_ft_model)
+        sql, _ = review_sql_response(response_text)
+        if sql != INCOMPLETE_SCHEMA and check_sql_schema(sql) is not None:
+            return INCOMPLETE_SCHEMA, estimated_cost
+        if sql != INCOMPLETE_SCHEMA:
+            await asyncio.to_thread(store_cached_sql, question, sql, use_ft_model)
+        return sql, estimated_cost
 
     except Exception as e:
         logger.error(f"❌ Erreur lors de la prédiction : {e}", exc_info=True)
-        # Return default SQL and None cost in case of error
         return "INCOMPLETE_SCHEMA", None
 
 
@@ -0,0 +1,183 @@
+# src/inference/results.py
+
+import io
+import itertools
+import json
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, Optional
+import pyarrow as pa
+from config.settings import PROJECT_ID, BQ_LOCATION, RESULT_PAGE_SIZE, RESULT_MAX_ROWS, RESULT_MAX_BYTES, SQL_ALLOWED_DATASETS
+from src.bigquery_clients import get_bq_client, get_bqstorage_client
+from src.logging_config import logger
+
+# Type MIME de chaque format de sortie de /execute
+RESULT_FORMATS = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+# Étiquette des jobs lancés par `run_query` : seuls ces jobs sont relus par `fetch_page`
+RESULT_JOB_LABELS = {"nl2sql": "execute"}
+
+
+def cap_batches(batches: Iterable[pa.RecordBatch], max_rows: int = RESULT_MAX_ROWS, max_bytes: int = RESULT_MAX_BYTES,
+                counters: Optional[Dict] = None) -> Iterator[pa.RecordBatch]:
+    """
+    Lots Arrow tronqués au plafond de lignes et d'octets (taille Arrow en mémoire) : le lot qui
+    dépasse est coupé et la lecture s'arrête, les pages suivantes ne sont jamais demandées.
+    `counters` reçoit les lignes et octets renvoyés et `truncated`.
+    """
+    counters = {} if counters is None else counters
+    counters.update(rows=0, bytes=0, truncated=False)
+    for batch in batches:
+        if batch.num_rows:
+            keep = min(batch.num_rows, max_rows - counters["rows"])
+            row_bytes = batch.nbytes / batch.num_rows
+            if row_bytes:
+                keep = min(keep, int((max_bytes - counters["bytes"]) // row_bytes))
+            if keep < batch.num_rows:
+                counters["truncated"] = True
+                batch = batch.slice(0, max(keep, 0))
+            if batch.num_rows == 0:
+                return
+            counters["rows"] += batch.num_rows
+            counters["bytes"] += batch.nbytes
+        yield batch
+        if counters["truncated"]:
+            return
+
+
+def _drain(sink: io.BytesIO) -> bytes:
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
+
+
+def encode_batches(batches: Iterable[pa.RecordBatch], fmt: str, schema: Optional[pa.Schema] = None) -> Iterator[bytes]:
+    """
+    Encode des lots Arrow au fil de l'eau (un morceau par lot) : `arrow` (format IPC stream),
+    `ndjson` (une ligne JSON par ligne du résultat) ou `csv` (en-tête sur le premier morceau).
+    `schema` n'est utilisé que si aucun lot n'est produit (résultat vide).
+    """
+    batches = iter(batches)
+    first = next(batches, None)
+    if first is None:
+        batches = iter([pa.RecordBatch.from_pylist([], schema=schema or pa.schema([]))])
+    else:
+        batches = itertools.chain([first], batches)
+
+    if fmt == "arrow":
+        sink = io.BytesIO()
+        writer = None
+        for batch in batches:
+            writer = writer or pa.ipc.new_stream(sink, batch.schema)
+            writer.write_batch(batch)
+            yield _drain(sink)
+        writer.close()
+        yield _drain(sink)
+    elif fmt == "ndjson":
+        for batch in batches:
+            lines = (json.dumps(row, ensure_ascii=False, default=str) + "\n" for row in batch.to_pylist())
+            yield "".join(lines).encode("utf-8")
+    elif fmt == "csv":
+        from pyarrow import csv
+
+        sink = io.BytesIO()
+        for i, batch in enumerate(batches):
+            csv.write_csv(batch, sink, csv.WriteOptions(include_header=i == 0))
+            yield _drain(sink)
+    else:
+        raise ValueError(f"Format inconnu : {fmt} (attendu : {', '.join(RESULT_FORMATS)})")
+
+
+class QueryResult:
+    """
+    Résultat d'une requête BigQuery lu par lots Arrow, sans `to_dataframe` sur tout le résultat.
+    Les gros résultats passent par l'API Storage Read (si `google-cloud-bigquery-storage` est
+    installé), les autres par les pages REST de `RESULT_PAGE_SIZE` lignes. Le résultat reste
+    lisible par pages (`fetch_page`) tant que la table de résultats du job existe (24 h).
+    """
+
+    def __init__(self, job, page_size: int = RESULT_PAGE_SIZE):
+        self.job = job
+        self.page_size = page_size
+        self.rows = job.result(page_size=page_size)
+        self.total_rows = self.rows.total_rows or 0
+        self.counters: Dict = {}
+
+    @property
+    def job_id(self) -> str:
+        return self.job.job_id
+
+    @property
+    def location(self) -> str:
+        return self.job.location
+
+    def batches(self, max_rows: int = RESULT_MAX_ROWS, max_bytes: int = RESULT_MAX_BYTES,
+                use_storage: bool = True) -> Iterator[pa.RecordBatch]:
+        """Lots du résultat plafonnés (`cap_batches`) ; ne peut être parcouru qu'une fois."""
+        storage = get_bqstorage_client() if use_storage and self.total_rows > self.page_size else None
+        return cap_batches(self.rows.to_arrow_iterable(bqstorage_client=storage), max_rows, max_bytes, self.counters)
+
+    def headers(self, max_rows: int = RESULT_MAX_ROWS) -> Dict[str, str]:
+        """En-têtes HTTP décrivant le résultat (pagination par GET /execute/{job_id})."""
+        return {
+            "X-Job-Id": self.job_id,
+            "X-Job-Location": self.location or "",
+            "X-Total-Rows": str(self.total_rows),
+            "X-Max-Rows": str(max_rows),
+        }
+
+
+def run_query(sql: str, client=None, page_size: int = RESULT_PAGE_SIZE) -> QueryResult:
+    """Lance la requête et attend la fin du job ; seules les lignes de la première page sont rapatriées."""
+    from google.cloud import bigquery
+
+    client = client or get_bq_client()
+    result = QueryResult(client.query(sql, job_config=bigquery.QueryJobConfig(labels=RESULT_JOB_LABELS)), page_size)
+    logger.info(f"📊 Job {result.job_id} : {result.total_rows} ligne(s)")
+    return result
+
+
+def page_count(total_rows: int, page_size: int = RESULT_PAGE_SIZE) -> int:
+    """Nombre de pages lisibles d'un résultat (au moins une, au plus `RESULT_MAX_ROWS` lignes)."""
+    return max(1, -(-min(total_rows, RESULT_MAX_ROWS) // page_size))
+
+
+@dataclass
+class ResultPage:
+    table: pa.Table
+    page: int
+    page_size: int
+    total_rows: int
+
+    @property
+    def page_count(self) -> int:
+        return page_count(self.total_rows, self.page_size)
+
+
+def fetch_page(job_id: str, page: int, page_size: int = RESULT_PAGE_SIZE, location: str = BQ_LOCATION,
+               client=None) -> ResultPage:
+    """
+    Page `page` (à partir de 0) du résultat d'un job de requête terminé, lue dans sa table de
+    résultats (`list_rows` avec `start_index`) : la requête n'est pas réexécutée. Les pages
+    s'arrêtent au plafond `RESULT_MAX_ROWS`. Seuls les jobs lancés par `run_query` (étiquette
+    `RESULT_JOB_LABELS`) et ne lisant que des datasets de `SQL_ALLOWED_DATASETS` sont lisibles.
+    """
+    client = client or get_bq_client(PROJECT_ID, location)
+    job = client.get_job(job_id, location=location)
+    if job.job_type != "query" or job.statement_type != "SELECT" or job.destination is None:
+        raise ValueError(f"Le job {job_id} n'est pas une requête SELECT")
+    if any((job.labels or {}).get(key) != value for key, value in RESULT_JOB_LABELS.items()):
+        raise PermissionError(f"Le job {job_id} n'a pas été lancé par /execute")
+    for table in job.referenced_tables or []:
+        if f"{table.project}.{table.dataset_id}" not in SQL_ALLOWED_DATASETS:
+            raise PermissionError(f"Le job {job_id} lit un dataset non autorisé : {table.project}.{table.dataset_id}")
+    start = page * page_size
+    if page < 0 or start >= RESULT_MAX_ROWS:
+        raise ValueError(f"Page hors limites : {page} (plafond de {RESULT_MAX_ROWS} lignes)")
+    rows = client.list_rows(job.destination, start_index=start, max_results=min(page_size, RESULT_MAX_ROWS - start))
+    table = rows.to_arrow(create_bqstorage_client=False)
+    return ResultPage(table, page, page_size, rows.total_rows or 0)
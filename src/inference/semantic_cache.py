@@ -0,0 +1,256 @@
+# src/inference/semantic_cache.py
+
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from config.settings import (
+    SEMANTIC_CACHE_CAPACITY,
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_EMBEDDING_MODEL,
+)
+from src.inference.cache import normalize_question
+from src.text_utils import char_ngrams, hashed_counts, tokenize
+from src.logging_config import logger
+
+# Fonction d'embedding : liste de textes → matrice (n, dim)
+EmbedFn = Callable[[List[str]], np.ndarray]
+Namespace = Tuple[str, str, str]
+
+# Nombres (signe et décimales compris) et opérateurs : deux questions proches qui en diffèrent
+# ("CA > 1000" / "CA < 1000", "1,5" / "15") n'appellent pas le même SQL
+_LITERALS = re.compile(r"[<>!]=|[<>=%]|[-+]?\d+(?:[.,]\d+)*")
+
+
+def literals(question: str) -> List[str]:
+    """Nombres et opérateurs d'une question, dans l'ordre."""
+    return _LITERALS.findall(normalize_question(question))
+
+
+class HashingEmbedder:
+    """
+    Embedder local et déterministe (n-grammes de caractères + mots, hashing trick).
+
+    Sans appel réseau : adapté aux tests et aux environnements hors-ligne.
+    """
+
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+
+    def __call__(self, texts: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            features = char_ngrams(text) + [f"w:{token}" for token in tokenize(text)]
+            for bucket, count in hashed_counts(features, self.dim).items():
+                matrix[i, bucket] = count
+        return matrix
+
+
+class VertexEmbedder:
+    """Embeddings Vertex AI via le client Gemini partagé."""
+
+    def __init__(self, model: str = SEMANTIC_CACHE_EMBEDDING_MODEL):
+        self.model = model
+
+    def __call__(self, texts: List[str]) -> np.ndarray:
+        from src.inference.predict import get_genai_client
+
+        response = get_genai_client().models.embed_content(model=self.model, contents=texts)
+        return np.array([embedding.values for embedding in response.embeddings], dtype=np.float32)
+
+
+@dataclass
+class SemanticHit:
+    sql: str
+    question: str
+    score: float
+
+
+class SemanticCache:
+    """
+    Cache de plus proches voisins : réutilise le SQL d'une question déjà traitée
+    lorsqu'une nouvelle question en est une paraphrase.
+
+    Les embeddings (normalisés) sont stockés dans une matrice en mémoire ; la recherche
+    est un produit matriciel NumPy suivi d'un top-k. Un hit exige une similarité cosinus
+    au moins égale à `threshold`, le même espace de noms (modèle, prompt, schéma) et les
+    mêmes nombres dans la question : « CA 2022 » ne réutilise jamais le SQL de « CA 2023 ».
+
+    Au-delà de `capacity` entrées, l'entrée la moins récemment utilisée est remplacée.
+    `save` / `load` persistent l'index (`embeddings.npy` chargé en memory-map + `entries.json`).
+    """
+
+    def __init__(self, embed_fn: EmbedFn, threshold: float = SEMANTIC_CACHE_THRESHOLD,
+                 capacity: int = SEMANTIC_CACHE_CAPACITY):
+        self.embed_fn = embed_fn
+        self.threshold = threshold
+        self.capacity = capacity
+        self._matrix: Optional[np.ndarray] = None
+        self._entries: List[dict] = []
+        self._last_used = np.zeros(capacity, dtype=np.int64)
+        self._namespace_ids = np.zeros(capacity, dtype=np.int32)
+        self._namespaces: Dict[Namespace, int] = {}
+        self._tick = 0
+        self._recent_vectors: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _embed(self, question: str) -> np.ndarray:
+        """Embedding normalisé d'une question (mémorisé brièvement pour enchaîner lookup puis add)."""
+        key = normalize_question(question)
+        vector = self._recent_vectors.get(key)
+        if vector is None:
+            vector = np.asarray(self.embed_fn([question])[0], dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            vector = vector / norm if norm else vector
+            self._recent_vectors[key] = vector
+            if len(self._recent_vectors) > 256:
+                self._recent_vectors.popitem(last=False)
+        return vector
+
+    def _ensure_writable(self, dim: int):
+        """Alloue la matrice (ou copie le memory-map en lecture seule) avant une écriture."""
+        if self._matrix is None:
+            self._matrix = np.zeros((self.capacity, dim), dtype=np.float32)
+        elif not self._matrix.flags.writeable or len(self._matrix) < self.capacity:
+            matrix = np.zeros((self.capacity, self._matrix.shape[1]), dtype=np.float32)
+            matrix[:len(self._entries)] = self._matrix[:len(self._entries)]
+            self._matrix = matrix
+
+    def _namespace_id(self, namespace: Namespace) -> int:
+        return self._namespaces.setdefault(tuple(namespace), len(self._namespaces))
+
+    def search(self, question: str, k: int = 1, namespace: Optional[Namespace] = None) -> List[SemanticHit]:
+        """Top-k des entrées les plus proches (sans seuil), filtrées par espace de noms."""
+        vector = self._embed(question)
+        with self._lock:
+            return self._search(vector, k, namespace)[0]
+
+    def _search(self, vector: np.ndarray, k: int, namespace: Optional[Namespace]):
+        size = len(self._entries)
+        if size == 0:
+            return [], []
+        scores = self._matrix[:size] @ vector
+        if namespace is not None:
+            scores[self._namespace_ids[:size] != self._namespaces.get(tuple(namespace), -1)] = -np.inf
+        k = min(k, size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        top = [i for i in top if np.isfinite(scores[i])]
+        hits = [SemanticHit(self._entries[i]["sql"], self._entries[i]["question"], float(scores[i])) for i in top]
+        return hits, top
+
+    def lookup(self, question: str, namespace: Optional[Namespace] = None, k: int = 5) -> Optional[SemanticHit]:
+        """Renvoie le meilleur voisin au-dessus du seuil et compatible (mêmes nombres et opérateurs), ou None."""
+        numbers = literals(question)
+        vector = self._embed(question)
+        with self._lock:
+            hits, slots = self._search(vector, k, namespace)
+            for hit, slot in zip(hits, slots):
+                if hit.score < self.threshold:
+                    break
+                if self._entries[slot]["numbers"] == numbers:
+                    self._tick += 1
+                    self._last_used[slot] = self._tick
+                    self.hits += 1
+                    return hit
+            self.misses += 1
+            return None
+
+    def add(self, question: str, sql: str, namespace: Namespace = ("", "", "")):
+        """Insère une question (ou met à jour son SQL si elle est déjà indexée)."""
+        vector = self._embed(question)
+        normalized = normalize_question(question)
+        entry = {
+            "question": question,
+            "normalized": normalized,
+            "sql": sql,
+            "namespace": list(namespace),
+            "numbers": literals(question),
+        }
+        with self._lock:
+            self._ensure_writable(len(vector))
+            slot = next(
+                (i for i, e in enumerate(self._entries)
+                 if e["normalized"] == normalized and tuple(e["namespace"]) == tuple(namespace)),
+                None,
+            )
+            if slot is None and len(self._entries) < self.capacity:
+                slot = len(self._entries)
+                self._entries.append(entry)
+            elif slot is None:
+                slot = int(np.argmin(self._last_used[:len(self._entries)]))
+                self._entries[slot] = entry
+            else:
+                self._entries[slot] = entry
+            self._matrix[slot] = vector
+            self._namespace_ids[slot] = self._namespace_id(namespace)
+            self._tick += 1
+            self._last_used[slot] = self._tick
+
+    def invalidate(self, model_key: Optional[str] = None, schema_fingerprint: Optional[str] = None) -> int:
+        """Supprime les entrées d'un modèle et/ou d'une empreinte de schéma (tout l'index sans filtre)."""
+        with self._lock:
+            keep = [
+                i for i, entry in enumerate(self._entries)
+                if not ((model_key is None or entry["namespace"][0] == model_key)
+                        and (schema_fingerprint is None or entry["namespace"][2] == schema_fingerprint))
+            ]
+            removed = len(self._entries) - len(keep)
+            if removed:
+                self._ensure_writable(self._matrix.shape[1])
+                self._matrix[:len(keep)] = self._matrix[keep]
+                self._last_used[:len(keep)] = self._last_used[keep]
+                self._namespace_ids[:len(keep)] = self._namespace_ids[keep]
+                self._entries = [self._entries[i] for i in keep]
+            return removed
+
+    def save(self, directory: str):
+        """Écrit l'index sur disque (écriture atomique de chaque fichier)."""
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            size = len(self._entries)
+            matrix = self._matrix[:size] if self._matrix is not None else np.zeros((0, 0), dtype=np.float32)
+            tmp_npy = os.path.join(directory, "embeddings.tmp.npy")
+            np.save(tmp_npy, matrix)
+            os.replace(tmp_npy, os.path.join(directory, "embeddings.npy"))
+            tmp_json = os.path.join(directory, "entries.json.tmp")
+            with open(tmp_json, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f, ensure_ascii=False)
+            os.replace(tmp_json, os.path.join(directory, "entries.json"))
+
+    @classmethod
+    def load(cls, directory: str, embed_fn: EmbedFn, **kwargs) -> "SemanticCache":
+        """Recharge un index ; la matrice reste en memory-map jusqu'à la première écriture."""
+        cache = cls(embed_fn, **kwargs)
+        with open(os.path.join(directory, "entries.json"), encoding="utf-8") as f:
+            entries = json.load(f)
+        matrix = np.load(os.path.join(directory, "embeddings.npy"), mmap_mode="r")
+        if len(entries) > cache.capacity:
+            logger.warning(f"⚠️ Index sémantique tronqué à {cache.capacity} entrées ({len(entries)} sur disque)")
+            entries, matrix = entries[-cache.capacity:], matrix[-cache.capacity:]
+        cache._entries = entries
+        cache._matrix = matrix if len(entries) else None
+        for slot, entry in enumerate(entries):
+            cache._namespace_ids[slot] = cache._namespace_id(entry["namespace"])
+            # Index écrits avant la prise en compte des opérateurs : clés recalculées
+            entry["normalized"], entry["numbers"] = normalize_question(entry["question"]), literals(entry["question"])
+        return cache
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
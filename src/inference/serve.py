@@ -1,29 +1,162 @@
 # src/inference/serve.py
 
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import List, Optional
 from fastapi import FastAPI, HTTPException
+from google.api_core.exceptions import BadRequest, NotFound
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from src.inference.predict import predict_sql
-from src.security.safety_checks import validate_input, sanitize_sql_output
-from src.security.scope_filter import classify_scope
+from config.settings import BATCH_CONCURRENCY, BATCH_MAX_QUESTIONS, BQ_LOCATION, RESULT_PAGE_SIZE, RESULT_MAX_ROWS
+from src.bigquery_clients import close_bq_clients
+from src.inference.batch import predict_sql_batch_async
+from src.inference.pipeline import PredictionPipeline
+from src.inference.predict import save_semantic_cache, sql_cache
+from src.inference.results import RESULT_FORMATS, encode_batches, fetch_page, run_query
+from src.inference.streaming import format_sse, ttft_tracker
+from src.schema.snapshot import SchemaRefresher
+from src.schema.validator import check_sql_schema, validation_stats
+from src.security.safety_checks import sanitize_sql_output
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Le snapshot de schéma est chargé depuis le disque au premier usage, puis rafraîchi en fond
+    refresher = SchemaRefresher()
+    refresher.start()
+    yield
+    refresher.stop()
+    save_semantic_cache()
+    close_bq_clients()
+
+
+app = FastAPI(lifespan=lifespan)
+pipeline = PredictionPipeline()
+
+# Code HTTP renvoyé pour chaque statut d'échec du pipeline
+STATUS_CODES = {
+    "invalid_input": 400,
+    "out_of_scope": 400,
+    "unsafe": 403,
+    "invalid_sql": 422,
+    "error": 502,
+}
 
 class QueryRequest(BaseModel):
     question: str
 
 @app.post("/predict")
-def get_prediction(payload: QueryRequest):
-    if not validate_input(payload.question):
-        raise HTTPException(status_code=400, detail="Entrée invalide.")
-    if classify_scope(payload.question) == "out_of_scope":
-        raise HTTPException(status_code=400, detail="Question hors-scope détectée.")
+async def get_prediction(payload: QueryRequest):
+    result = await pipeline.run(payload.question)
+
+    if result.status == "unsafe":
+        raise HTTPException(status_code=403, detail=f"Sortie SQL non autorisée : {result.reason}")
+    if result.status in STATUS_CODES:
+        raise HTTPException(status_code=STATUS_CODES[result.status], detail=result.reason)
+
+    return {"sql": result.sql, "estimated_cost": result.estimated_cost}
+
+
+class BatchRequest(BaseModel):
+    questions: List[str]
+    concurrency: Optional[int] = None
+
+@app.post("/predict/batch")
+async def get_batch_prediction(payload: BatchRequest):
+    """
+    SQL d'une liste de questions, en NDJSON : une ligne par question (`index`, `status`, `sql`,
+    `estimated_cost`, `latency_ms`...) dès qu'elle est prête, sans attendre la plus lente.
+    """
+    if not payload.questions:
+        raise HTTPException(status_code=400, detail="Aucune question fournie.")
+    if len(payload.questions) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"Lot trop grand ({len(payload.questions)} > {BATCH_MAX_QUESTIONS} questions).")
+    concurrency = min(payload.concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY)
+
+    async def lines():
+        async for item in predict_sql_batch_async(payload.questions, concurrency=concurrency, pipeline=pipeline):
+            yield json.dumps(item.to_dict(), ensure_ascii=False) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 
-    sql = predict_sql(payload.question)
+@app.post("/predict/stream")
+async def get_streamed_prediction(payload: QueryRequest):
+    """
+    Génération en Server-Sent Events : `delta` (`{"text"}`, aperçu du SQL au fil de l'eau) puis
+    `result` (statut, SQL sanitisé sur le texte complet, coût, `ttft_ms`). Seul le SQL de
+    `result` avec le statut "ok" est exécutable.
+    """
+    async def events():
+        async for event, value in pipeline.stream(payload.question):
+            yield format_sse(event, {"text": value} if event == "delta" else value.to_dict())
 
-    is_safe, reason = sanitize_sql_output(sql)
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+class ExecuteRequest(BaseModel):
+    sql: str
+    format: str = "arrow"
+    max_rows: Optional[int] = None
+
+
+def _result_format(fmt: str) -> str:
+    if fmt not in RESULT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format inconnu : {fmt} (attendu : {', '.join(RESULT_FORMATS)}).")
+    return fmt
+
+
+@app.post("/execute")
+async def execute_query(payload: ExecuteRequest):
+    """
+    Exécute une requête (mêmes contrôles que le SQL généré : lecture seule, datasets autorisés,
+    schéma) et renvoie son résultat en flux, lu par lots Arrow : `arrow` (IPC stream), `ndjson`
+    ou `csv`, plafonné à `RESULT_MAX_ROWS` lignes et `RESULT_MAX_BYTES` octets. `X-Job-Id`,
+    `X-Job-Location` et `X-Total-Rows` permettent de lire ensuite le résultat par pages.
+    """
+    fmt = _result_format(payload.format)
+    is_safe, reason = sanitize_sql_output(payload.sql)
     if not is_safe:
-        raise HTTPException(status_code=403, detail=f"Sortie SQL non autorisée : {reason}")
+        raise HTTPException(status_code=403, detail=f"Requête non autorisée : {reason}")
+    schema_error = check_sql_schema(payload.sql)
+    if schema_error is not None:
+        raise HTTPException(status_code=422, detail=schema_error)
+    try:
+        result = await asyncio.to_thread(run_query, payload.sql)
+    except (BadRequest, NotFound) as e:
+        raise HTTPException(status_code=400, detail=e.message)
+
+    max_rows = min(payload.max_rows or RESULT_MAX_ROWS, RESULT_MAX_ROWS)
+    # Itérateur synchrone : Starlette le lit dans un thread, page après page
+    body = encode_batches(result.batches(max_rows=max_rows), fmt)
+    return StreamingResponse(body, media_type=RESULT_FORMATS[fmt], headers=result.headers(max_rows))
+
+
+@app.get("/execute/{job_id}")
+async def get_result_page(job_id: str, page: int = 0, page_size: int = RESULT_PAGE_SIZE, format: str = "arrow",
+                          location: str = BQ_LOCATION):
+    """
+    Page `page` (à partir de 0) du résultat d'un `/execute`, sans réexécuter la requête. Les
+    autres jobs du projet (sans l'étiquette de `/execute` ou hors `SQL_ALLOWED_DATASETS`) sont refusés.
+    """
+    fmt = _result_format(format)
+    page_size = max(1, min(page_size, RESULT_PAGE_SIZE))
+    try:
+        result_page = await asyncio.to_thread(fetch_page, job_id, page, page_size, location)
+    except NotFound:
+        raise HTTPException(status_code=404, detail=f"Job ou résultat introuvable : {job_id}")
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    table = result_page.table
+    headers = {"X-Total-Rows": str(result_page.total_rows), "X-Page-Count": str(result_page.page_count)}
+    return StreamingResponse(encode_batches(table.to_batches(), fmt, table.schema), media_type=RESULT_FORMATS[fmt], headers=headers)
 
 
-    return {"sql": sql}
+@app.get("/metrics")
+async def get_metrics():
+    """Temps jusqu'au premier morceau de SQL (/predict/stream), état du cache SQL et validation locale du SQL."""
+    return {"ttft": ttft_tracker.stats(), "sql_cache": sql_cache.stats(), "sql_validation": validation_stats()}
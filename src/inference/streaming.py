@@ -0,0 +1,83 @@
+# src/inference/streaming.py
+
+import json
+import threading
+from collections import deque
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+import numpy as np
+from config.settings import STREAM_METRICS_WINDOW
+from src.async_utils import iterate_sync
+
+
+class LatencyTracker:
+    """Dernières mesures d'une latence (fenêtre glissante) et leurs percentiles. Thread-safe."""
+
+    def __init__(self, name: str, window: int = STREAM_METRICS_WINDOW):
+        self.name = name
+        self._values = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def record(self, value_ms: float):
+        with self._lock:
+            self._values.append(value_ms)
+            self.count += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            values = np.array(self._values)
+            count = self.count
+        if not len(values):
+            return {"count": count, "p50_ms": None, "p95_ms": None, "max_ms": None}
+        return {
+            "count": count,
+            "p50_ms": round(float(np.percentile(values, 50)), 1),
+            "p95_ms": round(float(np.percentile(values, 95)), 1),
+            "max_ms": round(float(values.max()), 1),
+        }
+
+
+# Temps entre la réception d'une question et le premier morceau de SQL généré (/predict/stream)
+ttft_tracker = LatencyTracker("ttft")
+
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """Message Server-Sent Events (`event:` + une ligne `data:` JSON)."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def parse_sse(lines: Iterable[str]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Relit un flux SSE ligne par ligne : `(événement, données JSON)`."""
+    event, data = "message", []
+    for line in lines:
+        if not line:
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+    if data:
+        yield event, json.loads("\n".join(data))
+
+
+def stream_prediction(question: str, api_url: Optional[str] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Événements de génération d'une question : `("delta", {"text"})` puis `("result", {...})`.
+
+    Avec `api_url`, lit le flux SSE de `/predict/stream` ; sinon exécute le pipeline en local.
+    """
+    if api_url:
+        import httpx
+
+        with httpx.stream("POST", f"{api_url.rstrip('/')}/predict/stream", json={"question": question},
+                          timeout=None) as response:
+            response.raise_for_status()
+            yield from parse_sse(response.iter_lines())
+        return
+
+    from src.inference.pipeline import PredictionPipeline
+
+    for event, value in iterate_sync(PredictionPipeline().stream(question)):
+        yield event, {"text": value} if event == "delta" else value.to_dict()
@@ -0,0 +1,233 @@
+# src/inference/templates.py
+
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+from config.settings import PROJECT_ID, DATASET_ID, BQ_LOGS_TABLE, FIELDS_TO_ENHANCE
+from src.security.safety_checks import sanitize_sql_output
+from src.text_utils import normalize_text, tokenize
+from src.logging_config import logger
+
+YEAR = "YEAR"
+_YEAR_TOKEN = re.compile(r"^(19|20)\d{2}$")
+_PLACEHOLDER = "⟦{}⟧"
+
+
+@dataclass
+class Slot:
+    kind: str          # "YEAR" ou nom(s) de colonne, ex. "VILLE" / "REGIONS|VILLE"
+    value: str         # littéral tel qu'il apparaît dans le SQL
+
+
+@dataclass
+class TemplateMatch:
+    sql: str
+    skeleton: str
+    support: int
+    slots: List[Slot]
+
+
+def _normalize_sql(sql: str) -> str:
+    return " ".join(sql.strip().rstrip(";").split())
+
+
+class TemplateEngine:
+    """
+    Réponses déterministes aux questions paramétriques (« Combien de tickets en 2022 à Lyon ? »).
+
+    Les paires (question, SQL) approuvées sont réduites à un squelette : les littéraux
+    (années, valeurs des colonnes `FIELDS_TO_ENHANCE`) présents à la fois dans la question
+    et dans le SQL deviennent des emplacements. Une question entrante dont le squelette est
+    connu reçoit le SQL du gabarit, complété avec ses propres littéraux, sans appel au modèle.
+
+    Un gabarit n'est utilisé que s'il est non ambigu (toutes les paires minées donnent le
+    même SQL) et observé au moins `min_support` fois. Le SQL produit passe toujours par
+    `sanitize_sql_output`.
+    """
+
+    def __init__(self, slot_values: Dict[str, Iterable[str]], min_support: int = 1, min_slots: int = 1):
+        self.min_support = min_support
+        self.min_slots = min_slots
+        self._values: Dict[Tuple[str, ...], Tuple[str, str]] = {}
+        for column, values in slot_values.items():
+            for value in values:
+                if value is None:
+                    continue
+                key = tuple(tokenize(str(value)))
+                if not key or len("".join(key)) < 3:
+                    continue
+                kind, original = self._values.get(key, ("", str(value)))
+                kinds = sorted(set(filter(None, kind.split("|"))) | {column})
+                self._values[key] = ("|".join(kinds), original)
+        self._max_value_len = max((len(key) for key in self._values), default=0)
+        self._templates: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def extract_slots(self, question: str) -> Tuple[List[str], List[Slot]]:
+        """Découpe la question en jetons, les littéraux reconnus étant remplacés par `<TYPE>`."""
+        tokens = tokenize(question)
+        skeleton, slots = [], []
+        i = 0
+        while i < len(tokens):
+            for n in range(min(self._max_value_len, len(tokens) - i), 0, -1):
+                match = self._values.get(tuple(tokens[i:i + n]))
+                if match:
+                    kind, original = match
+                    skeleton.append(f"<{kind}>")
+                    slots.append(Slot(kind, original))
+                    i += n
+                    break
+            else:
+                if _YEAR_TOKEN.match(tokens[i]):
+                    skeleton.append(f"<{YEAR}>")
+                    slots.append(Slot(YEAR, tokens[i]))
+                else:
+                    skeleton.append(tokens[i])
+                i += 1
+        return skeleton, slots
+
+    @staticmethod
+    def _literal_pattern(slot: Slot) -> str:
+        if slot.kind == YEAR:
+            return rf"(?<!\d){slot.value}(?!\d)"
+        return rf"(['\"]){re.escape(slot.value)}\1"
+
+    def _templatize(self, question: str, sql: str) -> Optional[Tuple[str, str]]:
+        """Squelette de la question et SQL à emplacements, ou None si la paire n'est pas exploitable."""
+        tokens, slots = self.extract_slots(question)
+        if len({slot.value for slot in slots}) != len(slots):
+            return None
+
+        sql_template, kept, skeleton = sql, 0, []
+        slot_iter = iter(slots)
+        for token in tokens:
+            if not token.startswith("<"):
+                skeleton.append(token)
+                continue
+            slot = next(slot_iter)
+            pattern = self._literal_pattern(slot)
+            if re.search(pattern, sql_template):
+                replacement = _PLACEHOLDER.format(kept) if slot.kind == YEAR else rf"\g<1>{_PLACEHOLDER.format(kept)}\g<1>"
+                sql_template = re.sub(pattern, replacement, sql_template)
+                skeleton.append(token)
+                kept += 1
+            else:
+                # Littéral absent du SQL : il fait partie du texte fixe de la question
+                skeleton.extend(tokenize(slot.value) if slot.kind != YEAR else [slot.value])
+        if kept < self.min_slots:
+            return None
+        return " ".join(skeleton), _normalize_sql(sql_template)
+
+    def add_example(self, question: str, sql: str) -> bool:
+        """Mine une paire approuvée ; renvoie True si elle a produit un gabarit."""
+        templated = self._templatize(question, sql)
+        if templated is None:
+            return False
+        skeleton, sql_template = templated
+        self._templates[skeleton][sql_template] += 1
+        return True
+
+    def fit(self, pairs: Iterable[Tuple[str, str]]) -> "TemplateEngine":
+        for question, sql in pairs:
+            if question and sql:
+                self.add_example(question, sql)
+        return self
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+    def match(self, question: str) -> Optional[TemplateMatch]:
+        """Gabarit confiant pour la question, avec le SQL complété et validé, ou None."""
+        tokens, slots = self.extract_slots(question)
+        variants = self._templates.get(" ".join(tokens))
+        if not variants or len(variants) != 1:
+            return None
+        sql_template, support = next(iter(variants.items()))
+        if support < self.min_support:
+            return None
+
+        sql = sql_template
+        for i, slot in enumerate(slots):
+            value = slot.value if slot.kind == YEAR else slot.value.replace("\\", "\\\\").replace("'", "\\'")
+            sql = sql.replace(_PLACEHOLDER.format(i), value)
+        if "⟦" in sql:
+            return None
+
+        is_safe, reason = sanitize_sql_output(sql)
+        if not is_safe:
+            logger.warning(f"🚫 SQL de gabarit refusé : {reason}")
+            return None
+        return TemplateMatch(sql=sql, skeleton=" ".join(tokens), support=support, slots=slots)
+
+
+def evaluate_template_engine(examples: List[Dict[str, str]], slot_values: Dict[str, Iterable[str]],
+                             **engine_kwargs) -> dict:
+    """
+    Couverture et précision en leave-one-out : chaque exemple est interrogé sur un moteur
+    miné à partir de tous les autres. Un SQL correct est identique à la référence (espaces normalisés).
+    """
+    answered, correct = 0, 0
+    for i, example in enumerate(examples):
+        others = [(e["question"], e["sql"]) for j, e in enumerate(examples) if j != i]
+        engine = TemplateEngine(slot_values, **engine_kwargs).fit(others)
+        match = engine.match(example["question"])
+        if match is not None:
+            answered += 1
+            correct += _normalize_sql(match.sql) == _normalize_sql(example["sql"])
+    total = len(examples)
+    return {
+        "total": total,
+        "answered": answered,
+        "correct": correct,
+        "coverage": answered / total if total else 0.0,
+        "precision": correct / answered if answered else 0.0,
+    }
+
+
+def fetch_slot_values(limit: int = 150) -> Dict[str, List[str]]:
+    """Valeurs distinctes des colonnes `FIELDS_TO_ENHANCE` dans BigQuery."""
+    from src.bigquery_clients import get_bq_client
+
+    client = get_bq_client()
+    slot_values = {}
+    for table, columns in FIELDS_TO_ENHANCE.items():
+        for column in columns:
+            query = f"""
+                SELECT DISTINCT {column}
+                FROM `{PROJECT_ID}.{DATASET_ID}.{table}`
+                WHERE {column} IS NOT NULL
+                LIMIT {limit}
+            """
+            slot_values.setdefault(column, []).extend(str(row[column]) for row in client.query(query).result())
+    return slot_values
+
+
+def load_template_engine() -> TemplateEngine:
+    """Mine les gabarits à partir des paires approuvées de `working.logs`."""
+    from src.bigquery_clients import get_bq_client
+
+    client = get_bq_client()
+    query = f"""
+        SELECT DISTINCT original_question, query
+        FROM `{BQ_LOGS_TABLE}`
+        WHERE approved = TRUE AND scope = 'RDM'
+    """
+    pairs = [(row["original_question"], row["query"]) for row in client.query(query).result()]
+    engine = TemplateEngine(fetch_slot_values()).fit(pairs)
+    logger.info(f"🧩 {len(engine)} gabarits minés à partir de {len(pairs)} paires approuvées")
+    return engine
+
+
+_engine: Optional[TemplateEngine] = None
+
+
+def get_template_engine() -> TemplateEngine:
+    """Moteur de gabarits partagé, miné au premier appel (vide si BigQuery est indisponible)."""
+    global _engine
+    if _engine is None:
+        try:
+            _engine = load_template_engine()
+        except Exception as e:
+            logger.warning(f"⚠️ Gabarits indisponibles, passage systématique par le modèle : {e}")
+            _engine = TemplateEngine({})
+    return _engine
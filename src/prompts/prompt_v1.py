@@ -1,9 +1,9 @@
-from src.schema.extract_schema import extract_formatted_schema_for_prompt
-from config.settings import PROJECT_ID, DATASET_ID
+from functools import lru_cache
+from typing import Optional
+from src.schema.extract_schema import extract_formatted_schema_for_prompt, schema_fingerprint
+from config.settings import PROJECT_ID, DATASET_ID, SCHEMA_LINKING_ENABLED
 
-formatted_schema = extract_formatted_schema_for_prompt(PROJECT_ID, DATASET_ID)
-
-SYSTEM_INSTRUCTION = f"""
+SYSTEM_INSTRUCTION_TEMPLATE = """
 Tu es un assistant de requête SQL spécialisé dans la base de données de l'entreprise Reine des Maracas.
 Ton rôle est de traduire des questions en langage naturel en requêtes SQL valides pour BigQuery.
 Génère des requêtes SQL correctes, efficaces et sécurisées.
@@ -24,3 +24,38 @@ Instructions :
 - IMPORTANT: La colonne DATE_TICKET est de type STRING (JJ/MM/AAAA). Utilise PARSE_DATE('%d/%m/%Y', DATE_TICKET).
 - **Toutes les requêtes DOIVENT prendre en compte que les dates de DATE_TICKET sont UNIQUEMENT comprises entre le 2018-09-12 et le 2023-12-31.**
 """
+
+
+@lru_cache(maxsize=4)
+def _system_instruction_for(fingerprint: str) -> str:
+    formatted_schema = extract_formatted_schema_for_prompt(PROJECT_ID, DATASET_ID)
+    return SYSTEM_INSTRUCTION_TEMPLATE.format(formatted_schema=formatted_schema)
+
+
+def get_system_instruction(question: Optional[str] = None) -> str:
+    """
+    Prompt système v1 construit à partir du snapshot de schéma courant,
+    mémorisé par empreinte de schéma (reconstruit après un rafraîchissement).
+
+    Avec `question` (et `SCHEMA_LINKING_ENABLED`), le schéma est réduit aux tables et
+    colonnes pertinentes pour la question.
+    """
+    try:
+        fingerprint = schema_fingerprint(PROJECT_ID, DATASET_ID)
+    except Exception:
+        # Schéma indisponible : prompt sans schéma, comme avant l'introduction des snapshots
+        fingerprint = ""
+    if question and SCHEMA_LINKING_ENABLED and fingerprint:
+        from src.schema.linking import get_schema_linker
+
+        linked = get_schema_linker(PROJECT_ID, DATASET_ID).link(question)
+        if linked.pruned:
+            return SYSTEM_INSTRUCTION_TEMPLATE.format(formatted_schema=linked.render())
+    return _system_instruction_for(fingerprint)
+
+
+def __getattr__(name):
+    # Compatibilité : `from src.prompts.prompt_v1 import SYSTEM_INSTRUCTION` reste possible, sans coût à l'import
+    if name == "SYSTEM_INSTRUCTION":
+        return get_system_instruction()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,9 +1,15 @@
 # src/prompts/utils.py
+from typing import Optional
 
-def get_prompt(version: str = "v1") -> str:
+
+def get_prompt(version: str = "v1", question: Optional[str] = None) -> str:
+    """
+    Prompt système d'une version donnée. Avec `question`, le prompt v1 ne contient que
+    le schéma utile à la question (schema linking, voir `src.schema.linking`).
+    """
     if version == "v2":
         from .prompt_v2 import SYSTEM_INSTRUCTION_V2
         return SYSTEM_INSTRUCTION_V2
     else:
-        from .prompt_v1 import SYSTEM_INSTRUCTION
-        return SYSTEM_INSTRUCTION
+        from .prompt_v1 import get_system_instruction
+        return get_system_instruction(question)
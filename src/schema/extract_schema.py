@@ -1,26 +1,157 @@
-from google.cloud import bigquery
-from config.settings import PROJECT_ID, DATASET_ID
-from functools import lru_cache
+import json
+from config.settings import PROJECT_ID, DATASET_ID, FIELDS_TO_IGNORE, FIELDS_TO_ENHANCE, SCHEMA_ENCODING, VALUE_CATALOG_LIMIT
+from typing import Any, Dict, List
+from src.bigquery_clients import get_bq_client
+from src.schema.information_schema import BigQuerySchemaBackend, fetch_schema, field_description
 
 
-bq_client = bigquery.Client(project=PROJECT_ID)
-@lru_cache()
+def get_table_schemas(project_id=PROJECT_ID, dataset_id=DATASET_ID, fields_to_ignore=FIELDS_TO_IGNORE,
+                      client=None) -> Dict[str, Dict[str, Any]]:
+    """
+    Lit les tables du dataset et leurs colonnes (nom, type, mode, description)
+    en une seule requête INFORMATION_SCHEMA (voir `src.schema.information_schema`).
+
+    Returns:
+        Dict[str, Dict[str, Any]]: {table_id: {"fields": [...], "description": ...}}
+    """
+    try:
+        schemas, _ = fetch_schema(project_id, dataset_id, fields_to_ignore, BigQuerySchemaBackend(client))
+        return schemas
+    except Exception as e:
+        print(f"⚠️ Requête INFORMATION_SCHEMA impossible ({e}), lecture table par table")
+        return get_table_schemas_by_table(project_id, dataset_id, fields_to_ignore, client)
 
-def extract_formatted_schema_for_prompt(project_id=PROJECT_ID, dataset_id=DATASET_ID):
+
+def get_table_schemas_by_table(project_id=PROJECT_ID, dataset_id=DATASET_ID, fields_to_ignore=FIELDS_TO_IGNORE,
+                               client=None) -> Dict[str, Dict[str, Any]]:
+    """Même résultat que `get_table_schemas`, via `list_tables` puis un `get_table` par table (N+1 appels)."""
+    client = client or get_bq_client()
+    schemas = {}
+    for table in client.list_tables(f"{project_id}.{dataset_id}"):
+        table_obj = client.get_table(table)
+        fields = []
+        for field in table_obj.schema:
+            if field.name not in fields_to_ignore:
+                fields.append({
+                    "name": field.name,
+                    "type": field.field_type,
+                    "mode": field.mode,
+                    "description": field_description(field.name, field.description)
+                })
+        schemas[table.table_id] = {
+            "fields": fields,
+            "description": table_obj.description or ""
+        }
+    return schemas
+
+
+def get_distinct_values(client, project_id, dataset_id, table, column) -> list:
+    """Valeurs distinctes d'une seule colonne (une requête ; voir `get_column_values` pour un lot)."""
+    query = f"""
+        SELECT DISTINCT {column}
+        FROM `{project_id}.{dataset_id}.{table}`
+        ORDER BY {column}
+        LIMIT {VALUE_CATALOG_LIMIT}
     """
-    Extrait le schéma des tables d'un dataset BigQuery et le formate pour l'injection dans un prompt LLM.
+    return [row[column] for row in client.query(query).result()]
+
+
+def get_column_values(project_id=PROJECT_ID, dataset_id=DATASET_ID, fields_to_enhance=FIELDS_TO_ENHANCE,
+                      client=None, backend=None, last_modified=None) -> Dict[str, Dict[str, List[Any]]]:
     """
+    Valeurs distinctes des colonnes à enrichir, via le catalogue persistant
+    (`src.schema.value_catalog`) : seules les colonnes dont la table a changé depuis la
+    dernière lecture sont relues, en une requête `UNION ALL`.
+
+    Returns:
+        Dict[str, Dict[str, list]]: {table: {colonne: [valeurs]}}
+    """
+    from src.schema.value_catalog import get_value_catalog
+
+    catalog = get_value_catalog(project_id, dataset_id)
+    if catalog.refresh(fields_to_enhance, backend or BigQuerySchemaBackend(client), last_modified):
+        catalog.save()
+    return catalog.values(fields_to_enhance)
+
+
+def add_values_to_schema(schemas, column_values):
+    """Range les valeurs distinctes dans le champ `values` des colonnes concernées."""
+    for table, columns in column_values.items():
+        for field in schemas.get(table, {}).get("fields", []):
+            if field["name"] in columns:
+                field["values"] = list(columns[field["name"]])
+    return schemas
+
+
+def describe_with_values(field: Dict[str, Any]) -> str:
+    """Description d'une colonne suivie de ses valeurs connues (`Available values: ...`)."""
+    desc = field.get("description", "")
+    if field.get("values"):
+        val_str = ', '.join(f'"{v}"' for v in field["values"])
+        desc += f" Available values: {val_str}"
+    return desc
+
+
+def enhance_schema_with_values(project_id, dataset_id, schemas, fields_to_enhance):
+    """Ajoute les valeurs distinctes des colonnes à enrichir à leur description."""
+    add_values_to_schema(schemas, get_column_values(project_id, dataset_id, fields_to_enhance))
+    for info in schemas.values():
+        for field in info["fields"]:
+            field["description"] = describe_with_values(field)
+            field.pop("values", None)
+    return schemas
+
+
+def format_schema_for_prompt(schemas: Dict[str, Any]) -> str:
+    """Schéma au format JSON du dataset de fine-tuning (`[{"table", "columns", "description"}]`)."""
+    formatted = []
+    for table_name, info in schemas.items():
+        table_data = {
+            "table": table_name,
+            "columns": info["fields"]
+        }
+        if info.get("description"):
+            table_data["description"] = info["description"]
+        formatted.append(table_data)
+    return json.dumps(formatted, ensure_ascii=False, indent=2)
+
+
+def format_schema_bullets(schemas: Dict[str, Any], project_id=PROJECT_ID, dataset_id=DATASET_ID) -> str:
+    """Schéma sous forme de liste `- projet.dataset.table :` suivie des colonnes `NOM (TYPE)` (prompt v1)."""
     formatted_schema = []
+    for table_id, info in schemas.items():
+        full_table_id = f"{project_id}.{dataset_id}.{table_id}"
+        fields = [f"{field['name']} ({field['type']})" for field in info["fields"]]
+        formatted_schema.append(f"- {full_table_id} :\n    " + "\n    ".join(fields))
+    return "\n".join(formatted_schema)
+
+
+def extract_formatted_schema_for_prompt(project_id=PROJECT_ID, dataset_id=DATASET_ID, encoding=SCHEMA_ENCODING):
+    """
+    Formate le schéma des tables d'un dataset BigQuery pour l'injection dans un prompt LLM,
+    dans l'encodage demandé (voir `src.schema.render`).
+
+    Lit le snapshot de schéma local (voir `src.schema.snapshot`) : aucun appel BigQuery
+    si un snapshot est déjà présent sur disque ou en mémoire.
+    """
+    from src.schema.render import render_schema
+    from src.schema.snapshot import get_schema_snapshot
+
     try:
-        tables = bq_client.list_tables(dataset_id)
-        for table in tables:
-            full_table_id = f"{project_id}.{dataset_id}.{table.table_id}"
-            table_obj = bq_client.get_table(full_table_id)
-            fields = [f"{field.name} ({field.field_type})" for field in table_obj.schema]
-            formatted_schema.append(f"- {full_table_id} :\n    " + "\n    ".join(fields))
+        return render_schema(get_schema_snapshot(project_id, dataset_id).tables, encoding, project_id, dataset_id)
     except Exception as e:
         print(f"❌ Erreur lors de l'extraction du schéma : {e}")
-    return "\n".join(formatted_schema)
+        return ""
+
+
+def schema_fingerprint(project_id=PROJECT_ID, dataset_id=DATASET_ID) -> str:
+    """
+    Empreinte du snapshot de schéma courant, utilisée pour invalider les caches dépendant du schéma.
+    """
+    from src.schema.snapshot import get_schema_snapshot
+
+    return get_schema_snapshot(project_id, dataset_id).fingerprint
+
 
 if __name__ == "__main__":
     print(extract_formatted_schema_for_prompt())
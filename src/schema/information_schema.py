@@ -0,0 +1,253 @@
+# src/schema/information_schema.py
+
+import json
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from config.settings import PROJECT_ID, DATASET_ID, FIELDS_TO_IGNORE, VALUE_CATALOG_LIMIT
+
+ColumnKey = Tuple[str, str]
+
+# Types INFORMATION_SCHEMA (GoogleSQL) → types legacy renvoyés par `get_table().schema`,
+# pour que le schéma (et donc son empreinte et le prompt) ne dépende pas du mode d'extraction.
+_LEGACY_TYPES = {
+    "INT64": "INTEGER",
+    "FLOAT64": "FLOAT",
+    "BOOL": "BOOLEAN",
+    "STRUCT": "RECORD",
+}
+_GOOGLESQL_TYPES = {legacy: name for name, legacy in _LEGACY_TYPES.items()}
+_TYPE_PARAMS = re.compile(r"[<(].*$", re.DOTALL)
+
+SCHEMA_QUERY = """
+    SELECT
+        c.table_name,
+        c.column_name,
+        c.data_type,
+        c.description,
+        col.is_nullable,
+        col.ordinal_position,
+        opt.option_value AS table_description,
+        meta.last_modified_time
+    FROM `{project_id}.{dataset_id}.INFORMATION_SCHEMA.COLUMN_FIELD_PATHS` AS c
+    JOIN `{project_id}.{dataset_id}.INFORMATION_SCHEMA.COLUMNS` AS col
+        ON col.table_name = c.table_name AND col.column_name = c.column_name
+    JOIN `{project_id}.{dataset_id}.__TABLES__` AS meta
+        ON meta.table_id = c.table_name
+    LEFT JOIN `{project_id}.{dataset_id}.INFORMATION_SCHEMA.TABLE_OPTIONS` AS opt
+        ON opt.table_name = c.table_name AND opt.option_name = 'description'
+    WHERE c.field_path = c.column_name
+    ORDER BY c.table_name, col.ordinal_position
+"""
+
+LAST_MODIFIED_QUERY = """
+    SELECT table_id, last_modified_time
+    FROM `{project_id}.{dataset_id}.__TABLES__`
+"""
+
+# Une sous-requête par colonne, réunies par UNION ALL : un seul job BigQuery pour tout le catalogue.
+# TO_JSON_STRING conserve le type des valeurs malgré le schéma commun (STRING) de l'union.
+DISTINCT_VALUES_QUERY = """
+    SELECT
+        '{table}' AS table_name,
+        '{column}' AS column_name,
+        TO_JSON_STRING(ARRAY_AGG(DISTINCT {column} IGNORE NULLS ORDER BY {column} LIMIT {limit})) AS distinct_values
+    FROM `{project_id}.{dataset_id}.{table}`
+"""
+
+
+def distinct_values_query(project_id: str, dataset_id: str, columns: Iterable[ColumnKey],
+                          limit: int = VALUE_CATALOG_LIMIT) -> str:
+    """Requête `UNION ALL` renvoyant une ligne `(table_name, column_name, distinct_values)` par colonne."""
+    return "    UNION ALL".join(
+        DISTINCT_VALUES_QUERY.format(project_id=project_id, dataset_id=dataset_id, table=table, column=column, limit=limit)
+        for table, column in columns
+    )
+
+
+def rows_to_values(rows: Iterable[Dict[str, Any]]) -> Dict[ColumnKey, List[Any]]:
+    return {
+        (row["table_name"], row["column_name"]): json.loads(row["distinct_values"]) if row["distinct_values"] else []
+        for row in rows
+    }
+
+
+def legacy_field_type(data_type: str, is_nullable: str = "YES") -> Tuple[str, str]:
+    """
+    Convertit un type INFORMATION_SCHEMA (`ARRAY<INT64>`, `NUMERIC(10, 2)`...) en (type, mode) legacy.
+    """
+    mode = "REQUIRED" if (is_nullable or "YES").upper() == "NO" else "NULLABLE"
+    data_type = data_type.strip()
+    if data_type.upper().startswith("ARRAY<"):
+        mode = "REPEATED"
+        data_type = data_type[len("ARRAY<"):-1]
+    base = _TYPE_PARAMS.sub("", data_type).strip().upper()
+    return _LEGACY_TYPES.get(base, base), mode
+
+
+def googlesql_type(field_type: str, mode: Optional[str] = None) -> str:
+    """Type legacy (`INTEGER`, mode `REPEATED`...) vers son nom GoogleSQL (`INT64`, `ARRAY<...>`)."""
+    name = _GOOGLESQL_TYPES.get(field_type, field_type)
+    return f"ARRAY<{name}>" if mode == "REPEATED" else name
+
+
+def _table_description(option_value: Optional[str]) -> str:
+    """`option_value` est un littéral SQL (`"Table des magasins"`)."""
+    if not option_value:
+        return ""
+    try:
+        return json.loads(option_value)
+    except ValueError:
+        return option_value.strip('"')
+
+
+def field_description(name: str, description: Optional[str]) -> str:
+    """Description d'une colonne, complétée des consignes de format connues (DATE_TICKET)."""
+    desc = description or ""
+    if name == "DATE_TICKET":
+        desc += " (Format: JJ/MM/AAAA. Utilisez PARSE_DATE('%d/%m/%Y', DATE_TICKET))."
+    return desc
+
+
+def rows_to_schemas(rows: Iterable[Dict[str, Any]], fields_to_ignore=FIELDS_TO_IGNORE
+                    ) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, int]]:
+    """
+    Regroupe les lignes de `SCHEMA_QUERY` (une par colonne) par table.
+
+    Returns:
+        Tuple: ({table_id: {"fields": [...], "description": ...}}, {table_id: last_modified_time})
+    """
+    schemas, last_modified = {}, {}
+    for row in sorted(rows, key=lambda r: (r["table_name"], r["ordinal_position"])):
+        table = row["table_name"]
+        if table not in schemas:
+            schemas[table] = {"fields": [], "description": _table_description(row.get("table_description"))}
+            last_modified[table] = int(row["last_modified_time"])
+        if row["column_name"] in fields_to_ignore:
+            continue
+        field_type, mode = legacy_field_type(row["data_type"], row.get("is_nullable"))
+        schemas[table]["fields"].append({
+            "name": row["column_name"],
+            "type": field_type,
+            "mode": mode,
+            "description": field_description(row["column_name"], row.get("description")),
+        })
+    return schemas, last_modified
+
+
+class BigQuerySchemaBackend:
+    """Exécute les requêtes de métadonnées sur BigQuery (une requête par appel)."""
+
+    def __init__(self, client=None):
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            from src.bigquery_clients import get_bq_client
+            self._client = get_bq_client()
+        return self._client
+
+    def _rows(self, query: str) -> List[Dict[str, Any]]:
+        return [dict(row.items()) for row in self.client.query(query).result()]
+
+    def fetch_columns(self, project_id: str, dataset_id: str) -> List[Dict[str, Any]]:
+        return self._rows(SCHEMA_QUERY.format(project_id=project_id, dataset_id=dataset_id))
+
+    def fetch_last_modified(self, project_id: str, dataset_id: str) -> Dict[str, int]:
+        rows = self._rows(LAST_MODIFIED_QUERY.format(project_id=project_id, dataset_id=dataset_id))
+        return {row["table_id"]: int(row["last_modified_time"]) for row in rows}
+
+    def fetch_distinct_values(self, project_id: str, dataset_id: str, columns: List[ColumnKey],
+                              limit: int = VALUE_CATALOG_LIMIT) -> Dict[ColumnKey, List[Any]]:
+        return rows_to_values(self._rows(distinct_values_query(project_id, dataset_id, columns, limit)))
+
+
+class InMemorySchemaBackend:
+    """
+    Remplaçant hors-ligne de BigQuery, construit à partir de tables au format `get_table_schemas`.
+
+    Sert les mêmes lignes que `SCHEMA_QUERY` et expose aussi `list_tables` / `get_table`,
+    ce qui permet de comparer l'extraction en une requête à la boucle table par table.
+    Chaque aller-retour est compté dans `round_trips` et coûte `latency` secondes.
+    """
+
+    def __init__(self, tables: Dict[str, Dict[str, Any]], last_modified: Optional[Dict[str, int]] = None,
+                 latency: float = 0.0):
+        self.tables = tables
+        self.last_modified = dict(last_modified or {table: 0 for table in tables})
+        self.latency = latency
+        self.round_trips = 0
+        self._lock = threading.Lock()
+
+    def _round_trip(self):
+        with self._lock:
+            self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def touch(self, table: str, timestamp: Optional[int] = None):
+        """Simule une modification de la table (données ou schéma)."""
+        self.last_modified[table] = timestamp if timestamp is not None else self.last_modified.get(table, 0) + 1
+
+    def fetch_columns(self, project_id: str, dataset_id: str) -> List[Dict[str, Any]]:
+        self._round_trip()
+        rows = []
+        for table, info in self.tables.items():
+            for position, field in enumerate(info["fields"], start=1):
+                rows.append({
+                    "table_name": table,
+                    "column_name": field["name"],
+                    "data_type": googlesql_type(field["type"], field.get("mode")),
+                    "description": field.get("description") or None,
+                    "is_nullable": "NO" if field.get("mode") == "REQUIRED" else "YES",
+                    "ordinal_position": position,
+                    "table_description": json.dumps(info["description"]) if info.get("description") else None,
+                    "last_modified_time": self.last_modified[table],
+                })
+        return rows
+
+    def fetch_last_modified(self, project_id: str, dataset_id: str) -> Dict[str, int]:
+        self._round_trip()
+        return dict(self.last_modified)
+
+    def fetch_distinct_values(self, project_id: str, dataset_id: str, columns: List[ColumnKey],
+                              limit: int = VALUE_CATALOG_LIMIT) -> Dict[ColumnKey, List[Any]]:
+        """Valeurs connues (`values`) des colonnes, triées et sans NULL, comme `distinct_values_query`."""
+        self._round_trip()
+        values = {}
+        for table, column in columns:
+            fields = {f["name"]: f for f in self.tables[table]["fields"]}
+            values[(table, column)] = sorted({v for v in fields[column].get("values", []) if v is not None})[:limit]
+        return values
+
+    def list_tables(self, dataset: str):
+        self._round_trip()
+        return [SimpleNamespace(table_id=table) for table in self.tables]
+
+    def get_table(self, table):
+        self._round_trip()
+        info = self.tables[getattr(table, "table_id", table)]
+        schema = [
+            SimpleNamespace(name=f["name"], field_type=f["type"], mode=f.get("mode") or "NULLABLE",
+                            description=f.get("description") or None)
+            for f in info["fields"]
+        ]
+        return SimpleNamespace(schema=schema, description=info.get("description") or None)
+
+
+def fetch_schema(project_id=PROJECT_ID, dataset_id=DATASET_ID, fields_to_ignore=FIELDS_TO_IGNORE,
+                 backend=None) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, int]]:
+    """
+    Schéma complet du dataset et dates de dernière modification des tables, en une seule requête.
+    """
+    backend = backend or BigQuerySchemaBackend()
+    return rows_to_schemas(backend.fetch_columns(project_id, dataset_id), fields_to_ignore)
+
+
+def fetch_last_modified(project_id=PROJECT_ID, dataset_id=DATASET_ID, backend=None) -> Dict[str, int]:
+    """Dates de dernière modification des tables (requête de métadonnées, sans lecture de données)."""
+    backend = backend or BigQuerySchemaBackend()
+    return backend.fetch_last_modified(project_id, dataset_id)
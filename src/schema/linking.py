@@ -0,0 +1,333 @@
+# src/schema/linking.py
+
+import math
+import re
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from config.settings import PROJECT_ID, DATASET_ID, SCHEMA_ENCODING, SCHEMA_LINKING_TOP_TABLES, SCHEMA_LINKING_TOP_COLUMNS
+from src.schema.value_index import ValueIndex, ValueMatch, format_value_matches
+from src.text_utils import STOPWORDS, normalize_text, stem, tokenize
+
+# Vocabulaire métier → colonnes (`table.COLONNE`) ou tables. Clés normalisées (minuscules,
+# sans accents) ; une clé de plusieurs mots est cherchée telle quelle dans la question.
+SCHEMA_SYNONYMS: Dict[str, List[str]] = {
+    "chiffre d affaire": ["ticket_caisse.PRIX_AP_REMISE", "ticket_caisse.QUANTITE"],
+    "chiffre d affaires": ["ticket_caisse.PRIX_AP_REMISE", "ticket_caisse.QUANTITE"],
+    "ca": ["ticket_caisse.PRIX_AP_REMISE", "ticket_caisse.QUANTITE"],
+    "vente": ["ticket_caisse.PRIX_AP_REMISE", "ticket_caisse.QUANTITE"],
+    "vendu": ["ticket_caisse.QUANTITE"],
+    "achat": ["ticket_caisse.PRIX_AP_REMISE", "ticket_caisse.QUANTITE"],
+    "achete": ["ticket_caisse.PRIX_AP_REMISE", "ticket_caisse.QUANTITE"],
+    "achetent": ["ticket_caisse.PRIX_AP_REMISE", "ticket_caisse.QUANTITE"],
+    "acheter": ["ticket_caisse.PRIX_AP_REMISE", "ticket_caisse.QUANTITE"],
+    "depense": ["ticket_caisse.PRIX_AP_REMISE", "ticket_caisse.QUANTITE"],
+    "montant": ["ticket_caisse.PRIX_AP_REMISE", "ticket_caisse.QUANTITE"],
+    "revenu": ["ticket_caisse.PRIX_AP_REMISE", "ticket_caisse.QUANTITE"],
+    "panier": ["ticket_caisse.PRIX_AP_REMISE", "ticket_caisse.NUM_TICKET"],
+    "volume": ["ticket_caisse.QUANTITE"],
+    "client": ["ticket_caisse.ID_INDIVIDU", "individu.ID_INDIVIDU"],
+    "acheteur": ["ticket_caisse.ID_INDIVIDU"],
+    "age": ["individu.DATE_NAISS_A"],
+    "naissance": ["individu.DATE_NAISS_A", "individu.DATE_NAISS_M", "individu.DATE_NAISS_J"],
+    "anniversaire": ["individu.DATE_NAISS_M", "individu.DATE_NAISS_J"],
+    "demographique": ["individu.DATE_NAISS_A", "individu.SEXE"],
+    "sexe": ["individu.SEXE"],
+    "genre": ["individu.SEXE"],
+    "homme": ["individu.SEXE"],
+    "femme": ["individu.SEXE"],
+    "fidelite": ["individu.DATE_CREATION"],
+    "anciennete": ["individu.DATE_CREATION"],
+    "annee": ["ticket_caisse.DATE_TICKET"],
+    "mois": ["ticket_caisse.DATE_TICKET"],
+    "jour": ["ticket_caisse.DATE_TICKET"],
+    "semaine": ["ticket_caisse.DATE_TICKET"],
+    "trimestre": ["ticket_caisse.DATE_TICKET"],
+    "saison": ["ticket_caisse.DATE_TICKET"],
+    "saisonniere": ["ticket_caisse.DATE_TICKET"],
+    "periode": ["ticket_caisse.DATE_TICKET"],
+    "tendance": ["ticket_caisse.DATE_TICKET"],
+    "evolution": ["ticket_caisse.DATE_TICKET"],
+    "croissance": ["ticket_caisse.DATE_TICKET"],
+    "recence": ["ticket_caisse.DATE_TICKET"],
+    "frequence": ["ticket_caisse.NUM_TICKET"],
+    "transaction": ["ticket_caisse.NUM_TICKET"],
+    "magasin": ["magasin", "ticket_caisse.CODE_BOUTIQUE"],
+    "boutique": ["magasin", "ticket_caisse.CODE_BOUTIQUE"],
+    "point de vente": ["magasin", "ticket_caisse.CODE_BOUTIQUE"],
+    "region": ["magasin.REGIONS"],
+    "geographique": ["magasin.REGIONS", "magasin.VILLE"],
+    "succursale": ["magasin.TYPE_MAGASIN"],
+    "franchise": ["magasin.TYPE_MAGASIN"],
+    "emplacement": ["magasin.CENTRE_VILLE"],
+    "produit": ["typo_produit.FAMILLE", "typo_produit.LIBELLE_MODELE", "referentiel.EAN"],
+    "maillot": ["typo_produit.FAMILLE"],
+    "article": ["referentiel.ID_ARTICLE", "referentiel.EAN"],
+    "categorie": ["typo_produit.LIGNE", "typo_produit.FAMILLE"],
+    "lingerie": ["typo_produit.LIGNE", "typo_produit.FAMILLE"],
+    "vetement": ["typo_produit.FAMILLE"],
+    "remise": ["ticket_caisse.REMISE", "ticket_caisse.REMISE_VALEUR"],
+    "promotion": ["ticket_caisse.REMISE", "ticket_caisse.REMISE_VALEUR"],
+    "promo": ["ticket_caisse.REMISE", "ticket_caisse.REMISE_VALEUR"],
+    "solde": ["ticket_caisse.REMISE", "ticket_caisse.REMISE_VALEUR"],
+    "reduction": ["ticket_caisse.REMISE", "ticket_caisse.REMISE_VALEUR"],
+    "annulation": ["ticket_caisse.ANNULATION"],
+    "annule": ["ticket_caisse.ANNULATION"],
+    "retour": ["ticket_caisse.ANNULATION"],
+    "segment": ["complement_individu.SEGACT", "complement_individu.SOUSSEG"],
+    "segmentation": ["complement_individu.SEGACT", "complement_individu.SOUSSEG"],
+    "profil": ["complement_individu.SEGACT", "complement_individu.SOUSSEG"],
+    "inactif": ["complement_individu.SEGACT"],
+    "taille": ["complement_individu.TAILLE_BAS", "complement_individu.TAILLE_HAUT"],
+}
+
+# Colonnes toujours conservées quand leur table l'est (règles du prompt : filtre de dates, annulations)
+ALWAYS_KEEP: Dict[str, List[str]] = {
+    "ticket_caisse": ["DATE_TICKET", "ANNULATION"],
+}
+
+_GOLD_TABLE = re.compile(r"\b(?:from|join)\s+`?(?:[\w-]+\.)?(?:[\w-]+\.)?(\w+)`?", re.IGNORECASE)
+
+
+def _terms(text: str) -> List[str]:
+    return [stem(t) for t in tokenize(text) if t not in STOPWORDS and len(t) > 1]
+
+
+@dataclass
+class LinkedSchema:
+    """
+    Résultat du schema linking : tables/colonnes conservées (format snapshot), scores et
+    valeurs de la base reconnues dans la question.
+    """
+    tables: Dict[str, Dict[str, Any]]
+    table_scores: Dict[str, float]
+    column_scores: Dict[Tuple[str, str], float] = field(default_factory=dict)
+    pruned: bool = True
+    value_matches: List[ValueMatch] = field(default_factory=list)
+
+    @property
+    def columns(self) -> Set[Tuple[str, str]]:
+        return {(table, f["name"]) for table, info in self.tables.items() for f in info["fields"]}
+
+    def render(self, encoding: str = SCHEMA_ENCODING, project_id: str = PROJECT_ID, dataset_id: str = DATASET_ID) -> str:
+        """Schéma réduit dans l'encodage demandé, suivi des valeurs citées dans la question."""
+        from src.schema.render import render_schema
+
+        schema = render_schema(self.tables, encoding, project_id, dataset_id)
+        values = format_value_matches(self.value_matches)
+        return f"{schema}\n\n{values}" if values else schema
+
+
+class SchemaLinker:
+    """
+    Sélectionne les tables et colonnes utiles à une question avant la génération SQL.
+
+    Chaque colonne est notée par recouvrement lexical pondéré par IDF (nom de la colonne,
+    description), synonymes métier (`SCHEMA_SYNONYMS`) et valeurs de la base citées dans la
+    question (`ValueIndex`) ; une table cumule sa propre note et celle de ses meilleures colonnes.
+    Les `top_tables` meilleures tables sont reliées par le plus court chemin de jointure
+    (colonnes de même nom) et ne gardent que leurs `top_columns` meilleures colonnes,
+    les clés de jointure et `ALWAYS_KEEP`. Sans aucun signal, le schéma complet est renvoyé.
+    Le schéma réduit ne liste plus toutes les valeurs connues : seules celles citées dans la
+    question sont transmises (`LinkedSchema.value_matches`).
+    """
+
+    def __init__(self, tables: Dict[str, Dict[str, Any]], synonyms: Optional[Dict[str, List[str]]] = None,
+                 top_tables: int = SCHEMA_LINKING_TOP_TABLES, top_columns: int = SCHEMA_LINKING_TOP_COLUMNS,
+                 value_index: Optional[ValueIndex] = None):
+        self.tables = tables
+        self.top_tables = top_tables
+        self.top_columns = top_columns
+        self.synonyms = SCHEMA_SYNONYMS if synonyms is None else synonyms
+        self.value_index = ValueIndex.from_tables(tables) if value_index is None else value_index
+
+        self._name_terms: Dict[Tuple[str, str], Set[str]] = {}
+        self._desc_terms: Dict[Tuple[str, str], Set[str]] = {}
+        self._table_terms = {table: set(_terms(table.replace("_", " "))) for table in tables}
+        self._table_desc_terms = {table: set(_terms(info.get("description", ""))) for table, info in tables.items()}
+        for table, info in tables.items():
+            for column in info["fields"]:
+                key = (table, column["name"])
+                self._name_terms[key] = set(_terms(column["name"].replace("_", " ")))
+                self._desc_terms[key] = set(_terms(column.get("description", "")))
+
+        documents = list(self._desc_terms.values()) + list(self._table_desc_terms.values())
+        df = Counter(term for doc in documents for term in doc)
+        self._idf = {term: math.log(1 + len(documents) / count) for term, count in df.items()}
+        self._max_idf = math.log(1 + len(documents))
+        self._graph = self._join_graph()
+
+    def _join_graph(self) -> Dict[str, Dict[str, List[str]]]:
+        """Tables voisines et colonnes de jointure (colonnes de même nom)."""
+        names = {table: {f["name"] for f in info["fields"]} for table, info in self.tables.items()}
+        graph = {table: {} for table in self.tables}
+        for a in self.tables:
+            for b in self.tables:
+                shared = sorted(names[a] & names[b])
+                if a != b and shared:
+                    graph[a][b] = shared
+        return graph
+
+    def _synonym_targets(self, normalized: str, terms: Set[str]) -> Counter:
+        targets = Counter()
+        padded = f" {normalized} "
+        for key, values in self.synonyms.items():
+            hit = f" {key} " in padded if " " in key else stem(key) in terms
+            if hit:
+                targets.update(values)
+        return targets
+
+    def _value_scores(self, matches: List[ValueMatch]) -> Counter:
+        """Valeur citée telle quelle (ou à une faute près) : 4 points ; un mot ou une valeur incluse : 1 point."""
+        scores = Counter()
+        for match in matches:
+            scores[(match.table, match.column)] += 1.0 if match.kind == "partial" else 4.0
+        return Counter({key: min(score, 8.0) for key, score in scores.items()})
+
+    def score(self, question: str, matches: Optional[List[ValueMatch]] = None
+              ) -> Tuple[Dict[str, float], Dict[Tuple[str, str], float]]:
+        """Notes des tables et des colonnes pour une question."""
+        normalized = normalize_text(question)
+        terms = set(_terms(question))
+        synonyms = self._synonym_targets(normalized, terms)
+        values = self._value_scores(self.value_index.lookup(question) if matches is None else matches)
+
+        column_scores = {}
+        for key in self._name_terms:
+            table, name = key
+            score = 2.0 * sum(self._idf.get(t, self._max_idf) for t in terms & self._name_terms[key])
+            score += sum(self._idf[t] for t in terms & self._desc_terms[key]) / 2
+            score += 3.0 * synonyms.get(f"{table}.{name}", 0)
+            score += values.get(key, 0.0)
+            column_scores[key] = score
+
+        table_scores = {}
+        for table, info in self.tables.items():
+            best = sorted((column_scores[(table, f["name"])] for f in info["fields"]), reverse=True)[:3]
+            score = 3.0 * sum(self._idf.get(t, self._max_idf) for t in terms & self._table_terms[table])
+            score += sum(self._idf[t] for t in terms & self._table_desc_terms[table]) / 2
+            score += 3.0 * synonyms.get(table, 0)
+            table_scores[table] = score + sum(best)
+        return table_scores, column_scores
+
+    def _connect(self, selected: List[str]) -> List[str]:
+        """Ajoute les tables intermédiaires nécessaires pour relier les tables retenues."""
+        kept = [selected[0]]
+        for target in selected[1:]:
+            if target in kept:
+                continue
+            # BFS depuis l'ensemble déjà relié
+            parents = {table: None for table in kept}
+            queue = deque(kept)
+            while queue:
+                table = queue.popleft()
+                if table == target:
+                    break
+                for neighbour in self._graph[table]:
+                    if neighbour not in parents:
+                        parents[neighbour] = table
+                        queue.append(neighbour)
+            node = target if target in parents else None
+            path = []
+            while node is not None and node not in kept:
+                path.append(node)
+                node = parents[node]
+            kept.extend(reversed(path))
+            if target not in kept:
+                kept.append(target)
+        return kept
+
+    def link(self, question: str) -> LinkedSchema:
+        """Schéma réduit aux tables/colonnes pertinentes (schéma complet si aucun signal)."""
+        matches = self.value_index.lookup(question)
+        table_scores, column_scores = self.score(question, matches)
+        ranked = [t for t, s in sorted(table_scores.items(), key=lambda kv: -kv[1]) if s > 0][:self.top_tables]
+        if not ranked:
+            return LinkedSchema(self.tables, table_scores, column_scores, pruned=False, value_matches=matches)
+
+        kept = self._connect(ranked)
+        join_keys = {
+            (a, column)
+            for a in kept for b, columns in self._graph[a].items() if b in kept
+            for column in columns
+        }
+
+        tables = {}
+        for table in self.tables:
+            if table not in kept:
+                continue
+            info = self.tables[table]
+            scored = [f for f in info["fields"] if column_scores[(table, f["name"])] > 0]
+            if table in ranked and not scored:
+                # Table citée sans colonne précise : on la garde entière
+                fields = info["fields"]
+            else:
+                top = {f["name"] for f in sorted(scored, key=lambda f: -column_scores[(table, f["name"])])[:self.top_columns]}
+                top |= {column for t, column in join_keys if t == table}
+                top |= set(ALWAYS_KEEP.get(table, []))
+                fields = [f for f in info["fields"] if f["name"] in top]
+            # Les valeurs connues passent par `value_matches` : seules celles citées vont au prompt
+            tables[table] = {**info, "fields": [{k: v for k, v in f.items() if k != "values"} for f in fields]}
+        return LinkedSchema(tables, table_scores, column_scores, value_matches=matches)
+
+
+@lru_cache(maxsize=4)
+def _linker_for(project_id: str, dataset_id: str, fingerprint: str) -> SchemaLinker:
+    from src.schema.snapshot import get_schema_snapshot
+
+    from src.schema.value_index import get_value_index
+
+    return SchemaLinker(get_schema_snapshot(project_id, dataset_id).tables, value_index=get_value_index(project_id, dataset_id))
+
+
+def get_schema_linker(project_id: str = PROJECT_ID, dataset_id: str = DATASET_ID) -> SchemaLinker:
+    """Linker du snapshot de schéma courant (reconstruit quand l'empreinte change)."""
+    from src.schema.extract_schema import schema_fingerprint
+
+    return _linker_for(project_id, dataset_id, schema_fingerprint(project_id, dataset_id))
+
+
+def gold_tables(sql: str) -> Set[str]:
+    """Tables citées dans les FROM / JOIN d'une requête (les CTE sont ignorées par l'appelant)."""
+    return {match.lower() for match in _GOLD_TABLE.findall(sql or "")}
+
+
+def gold_columns(sql: str, tables: Dict[str, Dict[str, Any]]) -> Set[Tuple[str, str]]:
+    """Colonnes du schéma citées dans une requête, rattachées aux tables qui y sont utilisées."""
+    used = gold_tables(sql) & set(tables)
+    identifiers = set(re.findall(r"\b[A-Z][A-Z0-9_]+\b", sql or ""))
+    return {
+        (table, f["name"])
+        for table in used for f in tables[table]["fields"]
+        if f["name"] in identifiers
+    }
+
+
+def evaluate_schema_linking(linker: SchemaLinker, examples: Iterable[Dict[str, str]]) -> dict:
+    """
+    Rappel du schema linking sur des paires (question, SQL de référence) : part des exemples
+    dont toutes les tables de référence survivent à l'élagage, et rappel moyen des colonnes.
+    """
+    total, all_tables_kept, table_hits, table_refs, column_hits, column_refs = 0, 0, 0, 0, 0, 0
+    misses = []
+    for example in examples:
+        linked = linker.link(example["question"])
+        expected = gold_tables(example["sql"]) & set(linker.tables)
+        columns = gold_columns(example["sql"], linker.tables)
+        total += 1
+        kept = expected & set(linked.tables)
+        all_tables_kept += kept == expected
+        table_hits += len(kept)
+        table_refs += len(expected)
+        column_hits += len(columns & linked.columns)
+        column_refs += len(columns)
+        if kept != expected:
+            misses.append({"question": example["question"], "missing": sorted(expected - kept)})
+    return {
+        "total": total,
+        "table_recall_examples": all_tables_kept / total if total else 0.0,
+        "table_recall": table_hits / table_refs if table_refs else 0.0,
+        "column_recall": column_hits / column_refs if column_refs else 0.0,
+        "misses": misses,
+    }
@@ -0,0 +1,136 @@
+# src/schema/render.py
+
+import re
+from typing import Any, Callable, Dict, List, Optional
+from config.settings import PROJECT_ID, DATASET_ID, SCHEMA_ENCODING
+from src.schema.extract_schema import format_schema_bullets, format_schema_for_prompt
+from src.schema.information_schema import googlesql_type
+
+# Tables au format snapshot : {table: {"fields": [{"name", "type", "mode", "description", "values"?}], "description"}}
+Tables = Dict[str, Dict[str, Any]]
+Renderer = Callable[[Tables, str, str], str]
+
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+
+
+def _sentences(text: str) -> List[str]:
+    return [s.strip() for s in _SENTENCE.split(text or "") if s.strip()]
+
+
+def _first_sentence(text: str) -> str:
+    sentences = _sentences(text)
+    return sentences[0] if sentences else ""
+
+
+def _values(field: Dict[str, Any], separator: str) -> str:
+    return separator.join(str(v) for v in field.get("values", []) if v is not None)
+
+
+def render_json(tables: Tables, project_id: str = PROJECT_ID, dataset_id: str = DATASET_ID) -> str:
+    """JSON indenté du dataset de fine-tuning, valeurs connues dans les descriptions."""
+    from src.schema.snapshot import enrich_tables
+
+    return format_schema_for_prompt(enrich_tables(tables))
+
+
+def render_bullets(tables: Tables, project_id: str = PROJECT_ID, dataset_id: str = DATASET_ID) -> str:
+    """Liste `- projet.dataset.table :` / `NOM (TYPE)` du prompt v1 (sans descriptions ni valeurs)."""
+    return format_schema_bullets(tables, project_id, dataset_id)
+
+
+def render_ddl(tables: Tables, project_id: str = PROJECT_ID, dataset_id: str = DATASET_ID) -> str:
+    """
+    `CREATE TABLE` GoogleSQL ; la première phrase de chaque description et les valeurs
+    connues sont en commentaires.
+    """
+    statements = []
+    for table, info in tables.items():
+        lines = [f"CREATE TABLE `{project_id}.{dataset_id}.{table}` ( -- {_first_sentence(info.get('description'))}"]
+        for i, field in enumerate(info["fields"]):
+            comment = _first_sentence(field.get("description"))
+            if field.get("values"):
+                comment = f"{comment} Valeurs : {_values(field, ', ')}".strip()
+            comma = "," if i < len(info["fields"]) - 1 else ""
+            column = f"  {field['name']} {googlesql_type(field['type'], field.get('mode'))}{comma}"
+            lines.append(f"{column} -- {comment}" if comment else column)
+        lines.append(");")
+        statements.append("\n".join(lines))
+    return "\n".join(statements)
+
+
+def render_terse(tables: Tables, project_id: str = PROJECT_ID, dataset_id: str = DATASET_ID) -> str:
+    """Une ligne par table : `table(COL:TYPE, COL:TYPE[v1|v2], ...)`, sans descriptions."""
+    lines = [f"Dataset `{project_id}.{dataset_id}` :"]
+    for table, info in tables.items():
+        columns = []
+        for field in info["fields"]:
+            column = f"{field['name']}:{googlesql_type(field['type'], field.get('mode'))}"
+            if field.get("values"):
+                column += f"[{_values(field, '|')}]"
+            columns.append(column)
+        lines.append(f"{table}({', '.join(columns)})")
+    return "\n".join(lines)
+
+
+def render_dedup(tables: Tables, project_id: str = PROJECT_ID, dataset_id: str = DATASET_ID) -> str:
+    """
+    Descriptions dédupliquées : une colonne présente dans plusieurs tables (clé de jointure)
+    est décrite une seule fois dans un glossaire, et une phrase déjà écrite n'est pas répétée.
+    """
+    occurrences: Dict[str, int] = {}
+    for info in tables.values():
+        for field in info["fields"]:
+            occurrences[field["name"]] = occurrences.get(field["name"], 0) + 1
+    shared = {name for name, count in occurrences.items() if count > 1}
+
+    seen = set()
+
+    def describe(text: Optional[str]) -> str:
+        kept = []
+        for sentence in _sentences(text):
+            key = sentence.lower()
+            if key not in seen:
+                seen.add(key)
+                kept.append(sentence)
+        return " ".join(kept)
+
+    lines = [f"Dataset `{project_id}.{dataset_id}` :"]
+    glossary = {}
+    for table, info in tables.items():
+        header = describe(info.get("description"))
+        lines.append(f"## {table}" + (f" : {header}" if header else ""))
+        for field in info["fields"]:
+            line = f"- {field['name']} {googlesql_type(field['type'], field.get('mode'))}"
+            if field["name"] in shared:
+                glossary.setdefault(field["name"], field)
+            else:
+                description = describe(field.get("description"))
+                if description:
+                    line += f" : {description}"
+                if field.get("values"):
+                    line += f" Valeurs : {_values(field, ', ')}"
+            lines.append(line)
+    if glossary:
+        lines.append("## Colonnes de jointure (même sens dans chaque table)")
+        for name, field in glossary.items():
+            lines.append(f"- {name} : {_first_sentence(field.get('description'))}")
+    return "\n".join(lines)
+
+
+SCHEMA_RENDERERS: Dict[str, Renderer] = {
+    "json": render_json,
+    "bullets": render_bullets,
+    "ddl": render_ddl,
+    "terse": render_terse,
+    "dedup": render_dedup,
+}
+
+
+def render_schema(tables: Tables, encoding: str = SCHEMA_ENCODING,
+                  project_id: str = PROJECT_ID, dataset_id: str = DATASET_ID) -> str:
+    """Rend le schéma dans l'encodage demandé (voir `SCHEMA_RENDERERS`)."""
+    try:
+        renderer = SCHEMA_RENDERERS[encoding]
+    except KeyError:
+        raise ValueError(f"Encodage de schéma inconnu : {encoding} (attendus : {', '.join(SCHEMA_RENDERERS)})")
+    return renderer(tables, project_id, dataset_id)
@@ -0,0 +1,244 @@
+# src/schema/snapshot.py
+
+import copy
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from config.settings import PROJECT_ID, DATASET_ID, SCHEMA_SNAPSHOT_DIR, SCHEMA_REFRESH_INTERVAL_SECONDS
+from src.schema.extract_schema import get_column_values, add_values_to_schema, describe_with_values
+from src.schema.information_schema import fetch_schema, fetch_last_modified
+from src.logging_config import logger
+
+SNAPSHOT_FORMAT_VERSION = 1
+
+
+def compute_fingerprint(tables: Dict[str, Any]) -> str:
+    """Empreinte de contenu (sha256 tronqué) d'un schéma, indépendante de l'ordre des clés."""
+    canonical = json.dumps(tables, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def enrich_tables(tables: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Copie des tables où les valeurs connues (`values`) sont ajoutées aux descriptions."""
+    tables = copy.deepcopy(tables)
+    for info in tables.values():
+        for column in info["fields"]:
+            column["description"] = describe_with_values(column)
+            column.pop("values", None)
+    return tables
+
+
+@dataclass
+class SchemaSnapshot:
+    """
+    Version figée du schéma d'un dataset : tables, colonnes et valeurs distinctes
+    des colonnes enrichies (`values`), identifiée par une empreinte de contenu.
+    """
+    project_id: str
+    dataset_id: str
+    tables: Dict[str, Dict[str, Any]]
+    fingerprint: str = ""
+    created_at: str = ""
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+    def __post_init__(self):
+        if not self.fingerprint:
+            self.fingerprint = compute_fingerprint(self.tables)
+        if not self.created_at:
+            self.created_at = datetime.now(timezone.utc).isoformat()
+
+    def enriched_tables(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Tables au format historique de `get_table_schemas` + `enhance_schema_with_values` :
+        les valeurs connues sont ajoutées à la description (`Available values: ...`).
+        """
+        return enrich_tables(self.tables)
+
+    def to_dict(self) -> dict:
+        return {
+            "version": SNAPSHOT_FORMAT_VERSION,
+            "project_id": self.project_id,
+            "dataset_id": self.dataset_id,
+            "fingerprint": self.fingerprint,
+            "created_at": self.created_at,
+            "metadata": self.metadata,
+            "tables": self.tables,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SchemaSnapshot":
+        return cls(
+            project_id=data["project_id"],
+            dataset_id=data["dataset_id"],
+            tables=data["tables"],
+            fingerprint=data["fingerprint"],
+            created_at=data.get("created_at", ""),
+            metadata=data.get("metadata", {}),
+        )
+
+
+def snapshot_path(project_id: str = PROJECT_ID, dataset_id: str = DATASET_ID) -> str:
+    return os.path.join(SCHEMA_SNAPSHOT_DIR, f"{project_id}.{dataset_id}.json")
+
+
+def build_snapshot(project_id: str = PROJECT_ID, dataset_id: str = DATASET_ID, backend=None) -> SchemaSnapshot:
+    """
+    Construit un snapshot depuis BigQuery : schéma des tables (une requête INFORMATION_SCHEMA)
+    et valeurs distinctes (catalogue de valeurs, une requête pour les seules colonnes dont la
+    table a changé). Les dates de dernière modification sont conservées dans `metadata`.
+    """
+    tables, last_modified = fetch_schema(project_id, dataset_id, backend=backend)
+    add_values_to_schema(tables, get_column_values(project_id, dataset_id, backend=backend, last_modified=last_modified))
+    return SchemaSnapshot(project_id, dataset_id, tables, metadata={"last_modified": last_modified})
+
+
+def save_snapshot(snapshot: SchemaSnapshot, path: Optional[str] = None) -> str:
+    """Écrit le snapshot de manière atomique (fichier temporaire puis `os.replace`)."""
+    path = path or snapshot_path(snapshot.project_id, snapshot.dataset_id)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(snapshot.to_dict(), f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_snapshot(path: str) -> Optional[SchemaSnapshot]:
+    """Charge un snapshot depuis le disque (None s'il est absent ou illisible)."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            return SchemaSnapshot.from_dict(json.load(f))
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"⚠️ Snapshot de schéma illisible ({path}) : {e}")
+        return None
+
+
+# Snapshots courants, par (projet, dataset), et abonnés aux changements
+_current: Dict[Tuple[str, str], SchemaSnapshot] = {}
+_listeners: List[Callable[[SchemaSnapshot, Optional[SchemaSnapshot]], None]] = []
+_lock = threading.Lock()
+
+
+def on_schema_change(callback: Callable[[SchemaSnapshot, Optional[SchemaSnapshot]], None]):
+    """Enregistre un callback `(nouveau, ancien)` appelé à chaque changement d'empreinte."""
+    _listeners.append(callback)
+    return callback
+
+
+def set_schema_snapshot(snapshot: SchemaSnapshot) -> bool:
+    """
+    Remplace atomiquement le snapshot courant et prévient les abonnés si l'empreinte a changé.
+
+    Returns:
+        bool: True si le schéma a changé.
+    """
+    key = (snapshot.project_id, snapshot.dataset_id)
+    with _lock:
+        previous = _current.get(key)
+        _current[key] = snapshot
+    changed = previous is None or previous.fingerprint != snapshot.fingerprint
+    if changed and previous is not None:
+        logger.info(f"🔄 Nouveau schéma {key[1]} : {previous.fingerprint} → {snapshot.fingerprint}")
+        for callback in list(_listeners):
+            try:
+                callback(snapshot, previous)
+            except Exception as e:
+                logger.error(f"❌ Erreur dans un abonné au changement de schéma : {e}", exc_info=True)
+    return changed
+
+
+def get_cached_schema_snapshot(project_id: str = PROJECT_ID, dataset_id: str = DATASET_ID) -> Optional[SchemaSnapshot]:
+    """Snapshot courant s'il est en mémoire ou sur disque, sans jamais interroger BigQuery (None sinon)."""
+    snapshot = _current.get((project_id, dataset_id))
+    if snapshot is not None:
+        return snapshot
+    with _lock:
+        snapshot = _current.get((project_id, dataset_id))
+        if snapshot is None:
+            snapshot = load_snapshot(snapshot_path(project_id, dataset_id))
+            if snapshot is not None:
+                _current[(project_id, dataset_id)] = snapshot
+    return snapshot
+
+
+def get_schema_snapshot(project_id: str = PROJECT_ID, dataset_id: str = DATASET_ID) -> SchemaSnapshot:
+    """
+    Snapshot courant : en mémoire, sinon chargé depuis le disque, sinon construit depuis
+    BigQuery puis sauvegardé pour les prochains processus.
+    """
+    snapshot = _current.get((project_id, dataset_id))
+    if snapshot is not None:
+        return snapshot
+    with _lock:
+        snapshot = _current.get((project_id, dataset_id))
+        if snapshot is None:
+            snapshot = load_snapshot(snapshot_path(project_id, dataset_id))
+            if snapshot is None:
+                logger.info(f"📥 Aucun snapshot local pour {dataset_id}, extraction depuis BigQuery...")
+                snapshot = build_snapshot(project_id, dataset_id)
+                save_snapshot(snapshot)
+            _current[(project_id, dataset_id)] = snapshot
+    return snapshot
+
+
+def tables_modified_since(snapshot: SchemaSnapshot, backend=None) -> List[str]:
+    """
+    Tables ajoutées, supprimées ou modifiées depuis le snapshot, d'après `__TABLES__.last_modified_time`
+    (requête de métadonnées gratuite). Toutes les tables si le snapshot ne connaît pas ces dates.
+    """
+    known = snapshot.metadata.get("last_modified")
+    current = fetch_last_modified(snapshot.project_id, snapshot.dataset_id, backend)
+    if not known:
+        return sorted(current)
+    return sorted(table for table in set(known) | set(current) if known.get(table) != current.get(table))
+
+
+def refresh_schema_snapshot(project_id: str = PROJECT_ID, dataset_id: str = DATASET_ID, backend=None) -> bool:
+    """
+    Reconstruit le snapshot si des tables ont été modifiées depuis le snapshot courant ;
+    le sauvegarde et l'active si l'empreinte a changé.
+    """
+    current = _current.get((project_id, dataset_id))
+    if current is not None and not tables_modified_since(current, backend):
+        return False
+    snapshot = build_snapshot(project_id, dataset_id, backend)
+    if current is not None and current.fingerprint == snapshot.fingerprint:
+        # Modification des données sans effet sur le schéma : on garde les nouvelles dates
+        current.metadata["last_modified"] = snapshot.metadata["last_modified"]
+        save_snapshot(current)
+        return False
+    save_snapshot(snapshot)
+    return set_schema_snapshot(snapshot)
+
+
+class SchemaRefresher(threading.Thread):
+    """Thread de fond qui rafraîchit périodiquement le snapshot de schéma."""
+
+    def __init__(self, interval: float = SCHEMA_REFRESH_INTERVAL_SECONDS,
+                 project_id: str = PROJECT_ID, dataset_id: str = DATASET_ID):
+        super().__init__(name="schema-refresher", daemon=True)
+        self.interval = interval
+        self.project_id = project_id
+        self.dataset_id = dataset_id
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                refresh_schema_snapshot(self.project_id, self.dataset_id)
+            except Exception as e:
+                logger.warning(f"⚠️ Rafraîchissement du schéma impossible, snapshot courant conservé : {e}")
+
+    def stop(self):
+        self._stop_event.set()
+
+
+if __name__ == "__main__":
+    built = build_snapshot()
+    print(f"✅ Snapshot de schéma {built.fingerprint} écrit : {save_snapshot(built)}")
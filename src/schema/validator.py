@@ -0,0 +1,346 @@
+# src/schema/validator.py
+
+import difflib
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+from config.settings import PROJECT_ID, DATASET_ID, SQL_SCHEMA_VALIDATION
+from src.logging_config import logger
+
+SCHEMA_VALIDATION_MODES = ("reject", "flag", "off")
+
+# Alternatives dans l'ordre de fréquence (les mots d'abord, sauf préfixes de chaînes r'' / b'')
+_TOKEN_RE = re.compile(r"""
+    (?P<skip>\s+|--[^\n]*|\#[^\n]*|/\*.*?\*/)
+  | (?P<word>(?![rRbB]{1,2}['"])[A-Za-z_]\w*)
+  | (?P<punct>[().,;\[\]])
+  | (?P<op>[^\s\w'"`().,;\[\]@]+)
+  | (?P<string>[rRbB]{0,2}(?:'''.*?'''|\"\"\".*?\"\"\"|'(?:[^'\\\n]|\\.)*'|"(?:[^"\\\n]|\\.)*"))
+  | (?P<number>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?)
+  | (?P<quoted>`[^`]*`)
+  | (?P<param>@@?\w+)
+  | (?P<unclosed>['"`])
+""", re.VERBOSE | re.DOTALL)
+
+# Mots qui ne sont jamais des colonnes non qualifiées : mots-clés, parties de dates, types
+_KEYWORDS = frozenset("""
+    ALL AND ANY ARRAY AS ASC AT BETWEEN BY CASE CAST COLLATE CROSS CURRENT CURRENT_DATE CURRENT_DATETIME
+    CURRENT_TIME CURRENT_TIMESTAMP DEFAULT DESC DISTINCT ELSE END ESCAPE EXCEPT EXISTS EXTRACT FALSE FIRST
+    FOLLOWING FOR FROM FULL GROUP HAVING IGNORE IN INNER INTERSECT INTERVAL IS JOIN LAST LATERAL LEFT LIKE
+    LIMIT NATURAL NOT NULL NULLS OF OFFSET ON OR ORDER OUTER OVER PARTITION PIVOT PRECEDING QUALIFY RANGE
+    RECURSIVE REPLACE RESPECT RIGHT ROW ROWS SAFE_CAST SELECT SOME STRUCT SYSTEM_TIME TABLESAMPLE THEN TRUE
+    UNBOUNDED UNION UNNEST UNPIVOT USING WHEN WHERE WINDOW WITH
+    MICROSECOND MILLISECOND SECOND MINUTE HOUR DAY DAYOFWEEK DAYOFYEAR WEEK ISOWEEK MONTH QUARTER YEAR ISOYEAR
+    MONDAY TUESDAY WEDNESDAY THURSDAY FRIDAY SATURDAY SUNDAY DATE TIME DATETIME TIMESTAMP
+    INT64 INT INTEGER SMALLINT BIGINT TINYINT BYTEINT FLOAT64 NUMERIC BIGNUMERIC DECIMAL BIGDECIMAL
+    BOOL BOOLEAN STRING BYTES JSON GEOGRAPHY
+""".split())
+
+# Mots qui terminent une clause FROM (les virgules suivantes ne séparent plus des tables)
+_FROM_END = frozenset("WHERE GROUP HAVING QUALIFY ORDER LIMIT WINDOW UNION INTERSECT EXCEPT SELECT".split())
+
+
+@dataclass
+class SchemaCheck:
+    valid: bool
+    errors: List[str] = field(default_factory=list)
+    tables: List[str] = field(default_factory=list)
+
+    @property
+    def reason(self) -> Optional[str]:
+        return "; ".join(self.errors) if self.errors else None
+
+
+def _tokenize(sql: str) -> List[Tuple[str, str, int, int]]:
+    """(type, texte, début, fin) de chaque lexème, sans espaces ni commentaires."""
+    return [
+        (m.lastgroup, m.group(), m.start(), m.end())
+        for m in _TOKEN_RE.finditer(sql) if m.lastgroup != "skip"
+    ]
+
+
+def _is_name(token) -> bool:
+    return token[0] in ("word", "quoted")
+
+
+def _name_parts(token) -> List[str]:
+    return token[1][1:-1].split(".") if token[0] == "quoted" else [token[1]]
+
+
+def _read_path(tokens, i: int, hyphens: bool = False) -> Tuple[List[str], int, bool]:
+    """
+    Chemin pointé à partir du lexème i (`a.b`, `` `p.d.t` ``, `p-1.d.t` si `hyphens`) :
+    (parties, index suivant, se termine par `.*`).
+    """
+    n = len(tokens)
+    parts = _name_parts(tokens[i])
+    i += 1
+    while True:
+        # Projet avec tirets, non quoté : seulement dans une clause FROM, lexèmes accolés
+        while (hyphens and i + 1 < n and tokens[i][1] == "-" and tokens[i + 1][0] in ("word", "number")
+               and tokens[i - 1][3] == tokens[i][2] and tokens[i][3] == tokens[i + 1][2]):
+            parts[-1] += "-" + tokens[i + 1][1]
+            i += 2
+        if i + 1 < n and tokens[i][1] == ".":
+            if _is_name(tokens[i + 1]):
+                parts.extend(_name_parts(tokens[i + 1]))
+                i += 2
+                continue
+            if tokens[i + 1][1] == "*":
+                return parts, i + 2, True
+        return parts, i, False
+
+
+class SchemaValidator:
+    """
+    Validation locale d'une requête GoogleSQL contre un schéma, sans appel à BigQuery.
+
+    Un seul passage sur les lexèmes (expression régulière) relève les tables (clauses FROM
+    et JOIN), leurs alias, les CTE, les alias de colonnes et les références de colonnes ;
+    chaque table doit exister dans le dataset et chaque colonne dans une table de la
+    requête (ou dans celle de son alias). Les erreurs de syntaxe détectées sont lexicales
+    (chaîne non fermée, parenthèses non équilibrées, virgule avant FROM) ; le reste de la
+    grammaire est laissé à BigQuery. Les cas ambigus (champs de STRUCT, colonnes d'une
+    sous-requête ou d'UNNEST) sont acceptés : le validateur ne rejette que des erreurs certaines.
+
+    Compteurs (`stats`) : requêtes vérifiées, invalides, et appels BigQuery évités (`should_skip`).
+    """
+
+    def __init__(self, tables: Dict[str, Dict[str, Any]], project_id: str = PROJECT_ID,
+                 dataset_id: str = DATASET_ID, mode: str = SQL_SCHEMA_VALIDATION, stats: Optional[Counter] = None):
+        if mode not in SCHEMA_VALIDATION_MODES:
+            raise ValueError(f"Mode de validation inconnu : {mode} (attendus : {', '.join(SCHEMA_VALIDATION_MODES)})")
+        self.project_id = project_id
+        self.dataset_id = dataset_id
+        self.mode = mode
+        self.columns: Dict[str, Set[str]] = {
+            table: {column["name"].upper() for column in info["fields"]} for table, info in tables.items()
+        }
+        self.stats = stats if stats is not None else Counter()
+
+    def _resolve_table(self, parts: List[str], errors: List[str]) -> Optional[str]:
+        name = parts[-1]
+        if len(parts) >= 2 and parts[-2] != self.dataset_id or len(parts) >= 3 and parts[-3] != self.project_id:
+            errors.append(f"Table hors du dataset {self.dataset_id} : {'.'.join(parts)}")
+            return None
+        if name not in self.columns:
+            close = difflib.get_close_matches(name, self.columns, n=1)
+            errors.append(f"Table inconnue : {name}" + (f" (vouliez-vous dire {close[0]} ?)" if close else ""))
+            return None
+        return name
+
+    def check(self, sql: str) -> SchemaCheck:
+        self.stats["checked"] += 1
+        if self.mode == "off":
+            return SchemaCheck(True)
+        result = self._check(sql)
+        if not result.valid:
+            self.stats["invalid"] += 1
+        return result
+
+    def should_skip(self, check: SchemaCheck) -> bool:
+        """True si la requête ne doit pas être envoyée à BigQuery (mode "reject") ; compte l'appel évité."""
+        if check.valid or self.mode != "reject":
+            return False
+        self.stats["remote_calls_saved"] += 1
+        return True
+
+    def _check(self, sql: str) -> SchemaCheck:
+        tokens = _tokenize(sql)
+        n = len(tokens)
+        errors: List[str] = []
+        table_refs: List[Tuple[List[str], Optional[str]]] = []  # (chemin, alias)
+        derived: Set[str] = set()  # CTE, sous-requêtes, UNNEST : noms et alias sans schéma connu
+        aliases: Set[str] = set()  # alias de colonnes (et autres noms définis par AS)
+        columns: List[List[str]] = []
+        depth, expect_table = 0, False
+        from_depths: Set[int] = set()
+        extract_depths: Set[int] = set()
+        previous = None  # rôle du lexème précédent : "name", "value", "keyword" ou None
+
+        i = 0
+        while i < n:
+            kind, text, _, _ = tokens[i]
+            upper = text.upper() if kind == "word" else None
+            if kind == "unclosed":
+                errors.append("Chaîne ou identifiant non fermé")
+                break
+            if kind == "punct":
+                if text == "(":
+                    depth += 1
+                    if i and tokens[i - 1][0] == "word" and tokens[i - 1][1].upper() == "EXTRACT":
+                        extract_depths.add(depth)
+                    if expect_table:
+                        expect_table = False
+                elif text == ")":
+                    from_depths.discard(depth)
+                    extract_depths.discard(depth)
+                    depth -= 1
+                    if depth < 0:
+                        errors.append("Parenthèses non équilibrées")
+                        break
+                    previous = "value"
+                    i += 1
+                    continue
+                elif text == "," and depth in from_depths:
+                    expect_table = True
+                previous = None
+                i += 1
+                continue
+            if upper in ("FROM", "JOIN") and depth not in extract_depths:
+                if upper == "FROM" and i and tokens[i - 1][1] == ",":
+                    errors.append("Virgule avant FROM")
+                from_depths.add(depth)
+                expect_table = True
+                previous = "keyword"
+                i += 1
+                continue
+            if upper in _FROM_END:
+                from_depths.discard(depth)
+
+            if expect_table and _is_name(tokens[i]) and upper != "UNNEST":
+                expect_table = False
+                parts, i, _ = _read_path(tokens, i, hyphens=True)
+                alias = None
+                if i + 1 < n and tokens[i][0] == "word" and tokens[i][1].upper() == "AS" and _is_name(tokens[i + 1]):
+                    alias, i = tokens[i + 1][1], i + 2
+                elif i < n and _is_name(tokens[i]) and tokens[i][1].upper() not in _KEYWORDS:
+                    alias, i = tokens[i][1], i + 1
+                table_refs.append((parts, alias))
+                previous = "name"
+                continue
+            expect_table = False
+
+            if kind == "word" and upper == "AS":
+                if i + 1 < n and _is_name(tokens[i + 1]):
+                    name = tokens[i + 1][1].upper()
+                    aliases.add(name)
+                    if previous == "value" and depth in from_depths:
+                        # `) AS alias` : sous-requête ou UNNEST dans FROM
+                        derived.add(name)
+                    i += 2
+                    previous = "name"
+                    continue
+                previous = "keyword"
+                i += 1
+                continue
+
+            if _is_name(tokens[i]):
+                start = i
+                parts, i, star = _read_path(tokens, i)
+                following = tokens[i][1] if i < n else None
+                if following == "(":
+                    previous = "keyword"  # appel de fonction
+                    continue
+                if len(parts) == 1 and following and following.upper() == "AS" and i + 1 < n and tokens[i + 1][1] == "(":
+                    # `nom AS (` : CTE (ou fenêtre nommée)
+                    derived.add(parts[0].upper())
+                    aliases.add(parts[0].upper())
+                    i += 1
+                    previous = "keyword"
+                    continue
+                if len(parts) == 1 and not star and tokens[start][0] == "word" and parts[0].upper() in _KEYWORDS:
+                    previous = "keyword"
+                    continue
+                if len(parts) == 1 and previous in ("name", "value"):
+                    # Alias implicite : `SUM(x) total`, `(SELECT ...) t`
+                    aliases.add(parts[0].upper())
+                    if previous == "value" and depth in from_depths:
+                        derived.add(parts[0].upper())
+                    previous = "name"
+                    continue
+                columns.append(parts[:-1] if star else parts)
+                previous = "name"
+                continue
+
+            previous = "value" if kind in ("string", "number", "param") else None
+            i += 1
+
+        if depth > 0 and not errors:
+            errors.append("Parenthèses non équilibrées")
+
+        # Résolution des tables, puis des colonnes
+        qualifiers: Dict[str, Optional[str]] = {}
+        tables: List[str] = []
+        for parts, alias in table_refs:
+            if len(parts) == 1 and parts[0].upper() in derived:
+                table = None
+            else:
+                table = self._resolve_table(parts, errors)
+                if table is None:
+                    continue
+                if table not in tables:
+                    tables.append(table)
+            qualifiers[(alias or parts[-1]).upper()] = table
+        for name in derived:
+            qualifiers.setdefault(name, None)
+        known = set().union(*(self.columns[t] for t in tables)) if tables else set()
+
+        for parts in columns:
+            if not parts:
+                continue
+            first = parts[0].upper()
+            if len(parts) == 1:
+                if first not in known and first not in aliases:
+                    errors.append(f"Colonne inconnue : {parts[0]}")
+            elif first in qualifiers:
+                table = qualifiers[first]
+                if table is not None and parts[1].upper() not in self.columns[table]:
+                    close = difflib.get_close_matches(parts[1].upper(), self.columns[table], n=1)
+                    errors.append(f"Colonne inconnue dans {table} : {parts[1]}"
+                                  + (f" (vouliez-vous dire {close[0]} ?)" if close else ""))
+            elif first not in known and first not in aliases:
+                errors.append(f"Table ou alias inconnu : {parts[0]}")
+
+        errors = list(dict.fromkeys(errors))
+        return SchemaCheck(not errors, errors, tables)
+
+
+# Compteurs partagés par les validateurs successifs (un par version du schéma)
+VALIDATION_STATS: Counter = Counter()
+_validator: Optional[SchemaValidator] = None
+_validator_key: Optional[Tuple[str, str, str]] = None
+_lock = threading.Lock()
+
+
+def get_schema_validator(project_id: str = PROJECT_ID, dataset_id: str = DATASET_ID) -> Optional[SchemaValidator]:
+    """
+    Validateur du snapshot de schéma en cache (mémoire ou disque), reconstruit quand son
+    empreinte change ; None si aucun snapshot local n'existe (jamais d'appel BigQuery).
+    """
+    global _validator, _validator_key
+    from src.schema.snapshot import get_cached_schema_snapshot
+
+    snapshot = get_cached_schema_snapshot(project_id, dataset_id)
+    if snapshot is None:
+        return None
+    key = (project_id, dataset_id, snapshot.fingerprint)
+    with _lock:
+        if _validator_key != key:
+            _validator = SchemaValidator(snapshot.tables, project_id, dataset_id, stats=VALIDATION_STATS)
+            _validator_key = key
+        return _validator
+
+
+def check_sql_schema(sql: str, project_id: str = PROJECT_ID, dataset_id: str = DATASET_ID) -> Optional[str]:
+    """
+    Motif de rejet d'une requête incohérente avec le schéma en cache (mode "reject"), None
+    si elle peut être envoyée à BigQuery. En mode "flag", l'erreur est seulement journalisée.
+    """
+    if SQL_SCHEMA_VALIDATION == "off":
+        return None
+    validator = get_schema_validator(project_id, dataset_id)
+    if validator is None:
+        return None
+    result = validator.check(sql)
+    if result.valid:
+        return None
+    logger.warning(f"🧾 SQL incohérent avec le schéma : {result.reason}")
+    return result.reason if validator.should_skip(result) else None
+
+
+def validation_stats() -> Dict[str, int]:
+    """Requêtes vérifiées, invalides et appels BigQuery évités depuis le démarrage du processus."""
+    return {key: VALIDATION_STATS[key] for key in ("checked", "invalid", "remote_calls_saved")}
@@ -0,0 +1,196 @@
+# src/schema/value_catalog.py
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from config.settings import (
+    PROJECT_ID,
+    DATASET_ID,
+    FIELDS_TO_ENHANCE,
+    SCHEMA_SNAPSHOT_DIR,
+    VALUE_CATALOG_LIMIT,
+    VALUE_CATALOG_MAX_AGE_SECONDS,
+    VALUE_CATALOG_MAX_WORKERS,
+    VALUE_CATALOG_METHOD,
+)
+from src.schema.information_schema import BigQuerySchemaBackend, ColumnKey, fetch_last_modified
+from src.logging_config import logger
+
+CATALOG_FORMAT_VERSION = 1
+
+
+def fetch_distinct_values(columns: List[ColumnKey], project_id: str = PROJECT_ID, dataset_id: str = DATASET_ID,
+                          backend=None, method: str = VALUE_CATALOG_METHOD, max_workers: int = VALUE_CATALOG_MAX_WORKERS,
+                          limit: int = VALUE_CATALOG_LIMIT) -> Dict[ColumnKey, List[Any]]:
+    """
+    Valeurs distinctes de plusieurs colonnes.
+
+    - `union` : une seule requête `UNION ALL` ; en cas d'échec (type non agrégeable, quota...),
+      repli sur la méthode `parallel`.
+    - `parallel` : une requête par colonne, au plus `max_workers` en parallèle ; une colonne en
+      erreur est ignorée (journalisée), les autres sont renvoyées.
+    """
+    backend = backend or BigQuerySchemaBackend()
+    if not columns:
+        return {}
+    if method == "union":
+        try:
+            return backend.fetch_distinct_values(project_id, dataset_id, columns, limit)
+        except Exception as e:
+            logger.warning(f"⚠️ Requête UNION ALL des valeurs distinctes impossible ({e}), repli sur {max_workers} requêtes parallèles")
+    elif method != "parallel":
+        raise ValueError(f"Méthode de récupération inconnue : {method} (attendues : union, parallel)")
+
+    def fetch_one(key: ColumnKey) -> Dict[ColumnKey, List[Any]]:
+        try:
+            return backend.fetch_distinct_values(project_id, dataset_id, [key], limit)
+        except Exception as e:
+            logger.warning(f"⚠️ Valeurs distinctes de {key[0]}.{key[1]} indisponibles : {e}")
+            return {}
+
+    values = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(columns)))) as pool:
+        for result in pool.map(fetch_one, columns):
+            values.update(result)
+    return values
+
+
+class ValueCatalog:
+    """
+    Catalogue persistant des valeurs distinctes des colonnes `FIELDS_TO_ENHANCE`.
+
+    Chaque colonne garde ses valeurs, la version de sa table (`__TABLES__.last_modified_time`)
+    au moment de la lecture et l'heure de lecture. `refresh` ne relit que les colonnes
+    absentes, dont la table a été modifiée depuis, ou (table sans date de modification)
+    lues il y a plus de `max_age` secondes — le tout en une requête (voir `fetch_distinct_values`).
+    """
+
+    def __init__(self, project_id: str = PROJECT_ID, dataset_id: str = DATASET_ID):
+        self.project_id = project_id
+        self.dataset_id = dataset_id
+        self.columns: Dict[ColumnKey, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def version(self, table: str, column: str) -> Optional[Any]:
+        entry = self.columns.get((table, column))
+        return entry["version"] if entry else None
+
+    def stale_columns(self, fields_to_enhance=FIELDS_TO_ENHANCE, last_modified: Optional[Dict[str, int]] = None,
+                      max_age: float = VALUE_CATALOG_MAX_AGE_SECONDS, now: Optional[float] = None) -> List[ColumnKey]:
+        """Colonnes à relire : absentes, table modifiée depuis la lecture, ou lecture trop ancienne."""
+        last_modified = last_modified or {}
+        now = time.time() if now is None else now
+        stale = []
+        for table, columns in fields_to_enhance.items():
+            for column in columns:
+                entry = self.columns.get((table, column))
+                version = last_modified.get(table)
+                if entry is None or (version is not None and entry["version"] != version) \
+                        or (version is None and now - entry["fetched_at"] > max_age):
+                    stale.append((table, column))
+        return stale
+
+    def refresh(self, fields_to_enhance=FIELDS_TO_ENHANCE, backend=None, last_modified: Optional[Dict[str, int]] = None,
+                method: str = VALUE_CATALOG_METHOD, max_workers: int = VALUE_CATALOG_MAX_WORKERS) -> List[ColumnKey]:
+        """
+        Relit les colonnes périmées. `last_modified` évite une requête `__TABLES__` quand
+        l'appelant l'a déjà (construction d'un snapshot).
+
+        Returns:
+            List[ColumnKey]: Colonnes relues.
+        """
+        backend = backend or BigQuerySchemaBackend()
+        start = time.perf_counter()
+        if last_modified is None:
+            last_modified = fetch_last_modified(self.project_id, self.dataset_id, backend)
+        stale = self.stale_columns(fields_to_enhance, last_modified)
+        values = fetch_distinct_values(stale, self.project_id, self.dataset_id, backend, method, max_workers)
+        now = time.time()
+        with self._lock:
+            for table, column in stale:
+                if (table, column) in values:
+                    self.columns[(table, column)] = {
+                        "values": values[(table, column)], "version": last_modified.get(table), "fetched_at": now,
+                    }
+        total = sum(len(columns) for columns in fields_to_enhance.values())
+        logger.info(
+            f"📚 Catalogue de valeurs : {len(values)}/{len(stale)} colonne(s) relue(s) ({method}), "
+            f"{total - len(stale)} à jour, en {(time.perf_counter() - start) * 1000:.0f} ms"
+        )
+        return [key for key in stale if key in values]
+
+    def values(self, fields_to_enhance=FIELDS_TO_ENHANCE) -> Dict[str, Dict[str, List[Any]]]:
+        """Valeurs au format de `get_column_values` : {table: {colonne: [valeurs]}}."""
+        return {
+            table: {column: list(self.columns[(table, column)]["values"])
+                    for column in columns if (table, column) in self.columns}
+            for table, columns in fields_to_enhance.items()
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "version": CATALOG_FORMAT_VERSION,
+            "project_id": self.project_id,
+            "dataset_id": self.dataset_id,
+            "columns": [
+                {"table": table, "column": column, **entry}
+                for (table, column), entry in sorted(self.columns.items())
+            ],
+        }
+
+    def save(self, path: Optional[str] = None) -> str:
+        """Écriture atomique (fichier temporaire puis `os.replace`)."""
+        path = path or catalog_path(self.project_id, self.dataset_id)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> Optional["ValueCatalog"]:
+        """Recharge un catalogue (None s'il est absent ou illisible)."""
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            catalog = cls(data["project_id"], data["dataset_id"])
+            catalog.columns = {
+                (column["table"], column["column"]): {
+                    "values": column["values"], "version": column.get("version"), "fetched_at": column.get("fetched_at", 0.0),
+                }
+                for column in data.get("columns", [])
+            }
+            return catalog
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"⚠️ Catalogue de valeurs illisible ({path}) : {e}")
+            return None
+
+
+def catalog_path(project_id: str = PROJECT_ID, dataset_id: str = DATASET_ID) -> str:
+    return os.path.join(SCHEMA_SNAPSHOT_DIR, f"{project_id}.{dataset_id}.values.json")
+
+
+_catalogs: Dict[ColumnKey, ValueCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_value_catalog(project_id: str = PROJECT_ID, dataset_id: str = DATASET_ID) -> ValueCatalog:
+    """Catalogue partagé du dataset, rechargé depuis le disque au premier appel."""
+    key = (project_id, dataset_id)
+    if key not in _catalogs:
+        with _catalogs_lock:
+            if key not in _catalogs:
+                _catalogs[key] = ValueCatalog.load(catalog_path(project_id, dataset_id)) or ValueCatalog(project_id, dataset_id)
+    return _catalogs[key]
+
+
+if __name__ == "__main__":
+    catalog = get_value_catalog()
+    refreshed = catalog.refresh()
+    print(f"✅ {len(refreshed)} colonne(s) relue(s) : {catalog.save()}")
@@ -0,0 +1,392 @@
+# src/schema/value_index.py
+
+import json
+import os
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from itertools import accumulate, chain
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+from config.settings import (
+    PROJECT_ID,
+    DATASET_ID,
+    FIELDS_TO_ENHANCE,
+    VALUE_INDEX_PATH,
+    VALUE_INDEX_FUZZY_THRESHOLD,
+    VALUE_INDEX_MAX_PARTIAL,
+    VALUE_INDEX_MAX_FUZZY_CANDIDATES,
+)
+from src.schema.snapshot import get_schema_snapshot, on_schema_change
+from src.text_utils import STOPWORDS, stem, tokenize
+from src.logging_config import logger
+
+ColumnKey = Tuple[str, str]
+
+INDEX_FORMAT_VERSION = 1
+
+
+@dataclass
+class ValueMatch:
+    table: str
+    column: str
+    value: str          # valeur telle qu'en base
+    text: str           # passage de la question reconnu
+    kind: str           # "exact", "fuzzy" ou "partial"
+    score: float
+
+
+class _IndexState(NamedTuple):
+    """Index inversés d'une version des valeurs ; jamais modifiés après construction."""
+    entries: List[Tuple[str, str, str]]
+    normalized: List[str]
+    exact: Dict[str, List[int]]
+    bags: Dict[Tuple[str, ...], List[int]]
+    by_token: Dict[str, List[int]]
+    by_trigram: Dict[str, Set[int]]
+    lengths: List[int]
+    max_tokens: int
+    max_length: int
+
+
+def _trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _stems(tokens: Iterable[str]) -> List[str]:
+    return [stem(t) for t in tokens]
+
+
+class ValueIndex:
+    """
+    Index local des valeurs distinctes des colonnes `FIELDS_TO_ENHANCE` (villes, familles, segments...),
+    pour ne mettre dans le prompt que les valeurs citées par la question.
+
+    La recherche est insensible à la casse, aux accents et aux pluriels, et s'effectue en quatre passes
+    sur les n-grammes de la question, du plus long au plus court, sans recouvrement :
+    correspondance exacte, mêmes mots dans un autre ordre (« maillots de bain » → `Bain_Maillot`),
+    approximation (fautes de frappe, index de trigrammes + `SequenceMatcher`) et enfin mot isolé
+    d'une valeur composée (« Lyon » → `LYON SAXE`, `LYON BREST`...).
+
+    L'index se met à jour colonne par colonne (`update_column`), avec la version (date de dernière
+    modification de la table) des valeurs indexées, et se sauvegarde sur disque en JSON.
+    """
+
+    def __init__(self, fuzzy_threshold: float = VALUE_INDEX_FUZZY_THRESHOLD,
+                 max_partial: int = VALUE_INDEX_MAX_PARTIAL,
+                 max_fuzzy_candidates: int = VALUE_INDEX_MAX_FUZZY_CANDIDATES):
+        self.fuzzy_threshold = fuzzy_threshold
+        self.max_partial = max_partial
+        self.max_fuzzy_candidates = max_fuzzy_candidates
+        self._columns: Dict[ColumnKey, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._rebuild()
+
+    def __len__(self) -> int:
+        return len(self._state.entries)
+
+    @property
+    def max_tokens(self) -> int:
+        return self._state.max_tokens
+
+    @property
+    def columns(self) -> Dict[ColumnKey, Dict[str, Any]]:
+        return self._columns
+
+    def version(self, table: str, column: str) -> Optional[Any]:
+        entry = self._columns.get((table, column))
+        return entry["version"] if entry else None
+
+    # --- Construction -----------------------------------------------------------------
+
+    def update_column(self, table: str, column: str, values: Iterable[Any], version: Any = None) -> bool:
+        """Remplace les valeurs indexées d'une colonne ; renvoie False si rien n'a changé."""
+        values = sorted({str(v) for v in values if v is not None and str(v) != "None"})
+        with self._lock:
+            current = self._columns.get((table, column))
+            if current and current["values"] == values:
+                current["version"] = version if version is not None else current["version"]
+                return False
+            self._columns[(table, column)] = {"values": values, "version": version}
+            self._rebuild()
+        return True
+
+    def remove_column(self, table: str, column: str):
+        with self._lock:
+            if self._columns.pop((table, column), None) is not None:
+                self._rebuild()
+
+    def _rebuild(self):
+        """
+        Reconstruit les index inversés (quelques centaines de valeurs : quelques millisecondes).
+        Les index sont construits à part puis publiés en remplaçant un seul attribut (`_state`) :
+        une recherche concurrente, qui lit `_state` une fois, voit l'ancienne ou la nouvelle
+        version, jamais un mélange des deux.
+        """
+        entries: List[Tuple[str, str, str]] = []
+        normalized_values: List[str] = []
+        exact: Dict[str, List[int]] = defaultdict(list)
+        bags: Dict[Tuple[str, ...], List[int]] = defaultdict(list)
+        by_token: Dict[str, List[int]] = defaultdict(list)
+        by_trigram: Dict[str, Set[int]] = defaultdict(set)
+        max_tokens = 0
+        for (table, column), entry in self._columns.items():
+            for value in entry["values"]:
+                tokens = _stems(tokenize(value))
+                if not tokens or len("".join(tokens)) < 3:
+                    continue
+                entry_id = len(entries)
+                entries.append((table, column, value))
+                normalized = " ".join(tokens)
+                normalized_values.append(normalized)
+                exact[normalized].append(entry_id)
+                content = [t for t in tokens if t not in STOPWORDS]
+                if len(content) > 1:
+                    bags[tuple(sorted(content))].append(entry_id)
+                    # Seul le premier mot désigne la valeur seul (« Lyon », pas « Haut » ou « Ensemble »)
+                    if len(content[0]) >= 4:
+                        by_token[content[0]].append(entry_id)
+                for trigram in _trigrams(normalized):
+                    by_trigram[trigram].add(entry_id)
+                max_tokens = max(max_tokens, len(tokens))
+        self._state = _IndexState(entries, normalized_values, dict(exact), dict(bags), dict(by_token), dict(by_trigram),
+                                  [len(v) for v in normalized_values], max_tokens, max(map(len, normalized_values), default=0))
+
+    @classmethod
+    def from_tables(cls, tables: Dict[str, Dict[str, Any]], versions: Optional[Dict[str, Any]] = None,
+                    **kwargs) -> "ValueIndex":
+        """Index des valeurs (`values`) d'un schéma au format snapshot."""
+        index = cls(**kwargs)
+        index.sync_from_tables(tables, versions)
+        return index
+
+    def sync_from_tables(self, tables: Dict[str, Dict[str, Any]], versions: Optional[Dict[str, Any]] = None
+                         ) -> List[ColumnKey]:
+        """Met à jour les colonnes dont les valeurs ont changé dans le schéma ; renvoie les colonnes modifiées."""
+        versions = versions or {}
+        changed = []
+        for table, info in tables.items():
+            for field in info["fields"]:
+                if field.get("values"):
+                    if self.update_column(table, field["name"], field["values"], versions.get(table)):
+                        changed.append((table, field["name"]))
+        return changed
+
+    # --- Recherche --------------------------------------------------------------------
+
+    def lookup(self, question: str) -> List[ValueMatch]:
+        """Valeurs connues citées dans la question, dans l'ordre d'apparition."""
+        state = self._state
+        words = tokenize(question)
+        tokens = _stems(words)
+        used = [False] * len(tokens)
+        found: List[Tuple[int, List[ValueMatch]]] = []
+
+        def free(start: int, end: int) -> bool:
+            return not any(used[start:end])
+
+        def match(ids: Iterable[int], text: str, kind: str, score: float) -> List[ValueMatch]:
+            return [ValueMatch(*state.entries[i], text=text, kind=kind, score=score) for i in ids]
+
+        def take(start: int, end: int, matches: List[ValueMatch]):
+            for i in range(start, end):
+                used[i] = True
+            found.append((start, matches))
+
+        max_n = min(state.max_tokens, len(tokens))
+        content = [i for i, t in enumerate(tokens) if t not in STOPWORDS]
+        for n in range(max_n, 0, -1):
+            # 1. Correspondance exacte, n-grammes les plus longs d'abord
+            for i in range(len(tokens) - n + 1):
+                ids = state.exact.get(" ".join(tokens[i:i + n]))
+                if ids and free(i, i + n):
+                    take(i, i + n, match(ids, " ".join(words[i:i + n]), "exact", 1.0))
+                elif ids and all(used[i:i + n]):
+                    # Valeur incluse dans une correspondance plus longue (LIGNE « Bain » dans « maillots
+                    # de bain » → Bain_Maillot) : gardée comme alternative
+                    found.append((i, match(ids, " ".join(words[i:i + n]), "partial", 0.5)))
+            # 2. Mêmes mots dans un autre ordre, mots vides ignorés (« maillots de bain » → Bain_Maillot)
+            for k in range(len(content) - n + 1 if n > 1 else 0):
+                positions = content[k:k + n]
+                ids = state.bags.get(tuple(sorted(tokens[p] for p in positions)))
+                if ids and positions[-1] - positions[0] < 2 * n and all(not used[p] for p in positions):
+                    for p in positions:
+                        used[p] = True
+                    found.append((positions[0], match(ids, " ".join(words[p] for p in positions), "exact", 1.0)))
+
+        # 3. Approximation (fautes de frappe) sur les n-grammes d'au moins 5 caractères ; au-delà de
+        # `max_length`, même la borne sur les longueurs (`real_quick_ratio`) est sous le seuil.
+        # Seuls les `max_fuzzy_candidates` candidats partageant le plus de trigrammes sont comparés.
+        threshold = self.fuzzy_threshold
+        max_length = state.max_length * (2 - threshold) / threshold
+        # Trigrammes de la question entière, calculés une fois : ceux d'un n-gramme en sont une tranche
+        # (plus son trigramme de début `  x`), et le cumul des trigrammes présents dans l'index borne
+        # sans calcul le nombre de trigrammes qu'un n-gramme peut partager avec une valeur
+        joined = " ".join(tokens)
+        offsets = list(accumulate((len(t) + 1 for t in tokens), initial=0))
+        padded = f"  {joined} "
+        grams = list(map("".join, zip(padded, padded[1:], padded[2:])))
+        present = list(accumulate(map(state.by_trigram.__contains__, grams), initial=0))
+        for n in range(max_n, 0, -1):
+            for i in range(len(tokens) - n + 1):
+                if tokens[i] in STOPWORDS or tokens[i + n - 1] in STOPWORDS or not free(i, i + n):
+                    continue
+                start, end = offsets[i], offsets[i + n] - 1
+                if not 5 <= end - start <= max_length:
+                    continue
+                head = "  " + joined[start]
+                trigrams = set(grams[start + 1:end + 1])
+                trigrams.add(head)
+                need = (len(trigrams) + 1) // 2
+                if present[end + 1] - present[start + 1] + (head in state.by_trigram) < need:
+                    continue
+                text = joined[start:end]
+                postings = sorted((state.by_trigram[t] for t in trigrams if t in state.by_trigram), key=len)
+                # Un candidat partage au moins la moitié des trigrammes (`need`) : il figure forcément
+                # dans l'une des `len(postings) - need + 1` listes les plus courtes (filtrage par préfixe)
+                if len(postings) < need:
+                    continue
+                # Longueurs compatibles avec le seuil (`real_quick_ratio`), vérifiées avant le comptage
+                min_length, max_candidate_length = (end - start) * threshold / (2 - threshold), (end - start) * (2 - threshold) / threshold
+                candidates = []
+                for entry_id in set(chain.from_iterable(postings[:len(postings) - need + 1])):
+                    if min_length <= state.lengths[entry_id] <= max_candidate_length:
+                        shared = sum(entry_id in posting for posting in postings)
+                        if shared >= need:
+                            candidates.append((-shared, entry_id))
+                candidates.sort()
+                best, best_ids = 0.0, []
+                for _, entry_id in candidates[:self.max_fuzzy_candidates]:
+                    # Borne supérieure du ratio (multiset de caractères) avant le calcul exact
+                    matcher = SequenceMatcher(None, text, state.normalized[entry_id])
+                    if matcher.quick_ratio() < threshold:
+                        continue
+                    ratio = matcher.ratio()
+                    if ratio > best:
+                        best, best_ids = ratio, [entry_id]
+                    elif ratio == best:
+                        best_ids.append(entry_id)
+                if best >= threshold:
+                    take(i, i + n, match(best_ids, " ".join(words[i:i + n]), "fuzzy", round(best, 3)))
+
+        # 4. Mot isolé d'une valeur composée (« Lyon » → toutes les boutiques lyonnaises)
+        for i, token in enumerate(tokens):
+            ids = state.by_token.get(token)
+            if ids and not used[i] and len(ids) <= self.max_partial:
+                take(i, i + 1, match(ids, words[i], "partial", 0.5))
+
+        return [match for _, matches in sorted(found, key=lambda item: item[0]) for match in matches]
+
+    # --- Persistance ------------------------------------------------------------------
+
+    def to_dict(self) -> dict:
+        return {
+            "version": INDEX_FORMAT_VERSION,
+            "columns": [
+                {"table": table, "column": column, "values": entry["values"], "version": entry["version"]}
+                for (table, column), entry in sorted(self._columns.items())
+            ],
+        }
+
+    def save(self, path: str = VALUE_INDEX_PATH) -> str:
+        """Écriture atomique (fichier temporaire puis `os.replace`)."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path: str = VALUE_INDEX_PATH, **kwargs) -> Optional["ValueIndex"]:
+        """Recharge un index (None s'il est absent ou illisible)."""
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Index de valeurs illisible ({path}) : {e}")
+            return None
+        index = cls(**kwargs)
+        index._columns = {
+            (column["table"], column["column"]): {"values": column["values"], "version": column.get("version")}
+            for column in data.get("columns", [])
+        }
+        index._rebuild()
+        return index
+
+
+def format_value_matches(matches: List[ValueMatch]) -> str:
+    """Bloc de prompt listant, par colonne, les valeurs reconnues dans la question."""
+    by_column: Dict[ColumnKey, List[str]] = {}
+    for match in matches:
+        values = by_column.setdefault((match.table, match.column), [])
+        if match.value not in values:
+            values.append(match.value)
+    if not by_column:
+        return ""
+    lines = ["Valeurs citées dans la question (à utiliser telles quelles) :"]
+    for (table, column), values in by_column.items():
+        lines.append(f"- {table}.{column} : " + ", ".join(f'"{v}"' for v in values))
+    return "\n".join(lines)
+
+
+def refresh_value_index(index: ValueIndex, project_id: str = PROJECT_ID, dataset_id: str = DATASET_ID,
+                        fields_to_enhance=FIELDS_TO_ENHANCE, client=None, backend=None) -> List[ColumnKey]:
+    """
+    Met à jour l'index depuis le catalogue de valeurs (`src.schema.value_catalog`), qui ne relit
+    sur BigQuery que les colonnes dont la table a été modifiée (`__TABLES__.last_modified_time`).
+
+    Returns:
+        List[ColumnKey]: Colonnes dont les valeurs indexées ont changé.
+    """
+    from src.schema.information_schema import BigQuerySchemaBackend
+    from src.schema.value_catalog import get_value_catalog
+
+    catalog = get_value_catalog(project_id, dataset_id)
+    if catalog.refresh(fields_to_enhance, backend or BigQuerySchemaBackend(client)):
+        catalog.save()
+    updated = []
+    for table, columns in fields_to_enhance.items():
+        for column in columns:
+            entry = catalog.columns.get((table, column))
+            if entry and index.update_column(table, column, entry["values"], entry["version"]):
+                updated.append((table, column))
+    return updated
+
+
+_index: Optional[ValueIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_value_index(project_id: str = PROJECT_ID, dataset_id: str = DATASET_ID) -> ValueIndex:
+    """
+    Index partagé : rechargé depuis `VALUE_INDEX_PATH`, sinon construit à partir des valeurs du
+    snapshot de schéma courant (sans requête supplémentaire) puis sauvegardé.
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = ValueIndex.load(VALUE_INDEX_PATH)
+                if index is None:
+                    snapshot = get_schema_snapshot(project_id, dataset_id)
+                    index = ValueIndex.from_tables(snapshot.tables, snapshot.metadata.get("last_modified"))
+                    index.save(VALUE_INDEX_PATH)
+                _index = index
+    return _index
+
+
+@on_schema_change
+def _sync_value_index(snapshot, previous):
+    """Nouveau snapshot : seules les colonnes dont les valeurs ont changé sont réindexées."""
+    if _index is not None and _index.sync_from_tables(snapshot.tables, snapshot.metadata.get("last_modified")):
+        _index.save(VALUE_INDEX_PATH)
+
+
+if __name__ == "__main__":
+    value_index = ValueIndex.load(VALUE_INDEX_PATH) or ValueIndex()
+    updated = refresh_value_index(value_index)
+    print(f"✅ {len(updated)} colonne(s) réindexée(s), {len(value_index)} valeurs : {value_index.save(VALUE_INDEX_PATH)}")
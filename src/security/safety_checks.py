@@ -1,18 +1,67 @@
 # src/security/safety_checks.py
 
+import json
 import re
-from config.settings import PROJECT_ID, BQ_LOCATION
+import string
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+from config.settings import PROJECT_ID, JUDGE_BATCH_SIZE, JUDGE_BATCH_MAX_REASKS, SQL_ALLOWED_DATASETS
+from google.api_core import exceptions as api_exceptions
 from google.cloud import bigquery
-from google import genai
+from google.genai import types
+from src.bigquery_clients import get_bq_client
+
+# Mots-clés d'écriture, de DDL, de droits et de script : refusés en tête d'instruction (après `;`
+# ou après la liste WITH), jamais comme colonne, alias ou champ (`t.load`, `SELECT set`)
+SQL_DANGEROUS_KEYWORDS = [
+    "DROP", "DELETE", "ALTER", "TRUNCATE", "UPDATE", "INSERT", "MERGE", "CREATE", "GRANT", "REVOKE",
+    "EXPORT", "LOAD", "CALL", "EXECUTE", "DECLARE", "SET", "BEGIN", "COMMIT", "ROLLBACK", "LOOP", "WHILE",
+    "LEAVE", "RAISE", "RETURN",
+]
+
+_READ_ONLY_START = re.compile(r"[(\s]*(?:SELECT|WITH)\b", re.IGNORECASE)
+_STATEMENT_END = re.compile(r"(?:\s|;|--[^\n]*|#[^\n]*|/\*.*?\*/)*", re.DOTALL)
+# Majuscules ASCII de longueur identique (positions conservées) : l'expression est sensible à la casse, plus rapide
+_ASCII_UPPER = str.maketrans(string.ascii_lowercase, string.ascii_uppercase)
+
+# Jetons de `sanitize_sql_output`, parcourus une seule fois sur la requête en majuscules : chaînes
+# et commentaires sont consommés sans effet ; seuls les noms (chemins `a.b.c` et identifiants
+# quotés compris) et la ponctuation `; , ( ) [ ]` sont capturés. Le premier caractère possible
+# est testé d'abord : la plupart des positions sont écartées en un test.
+_SQL_TOKENS = re.compile(r"""(?=[-#/'"`;,()\[\]A-Z_])(?:
+    [RB]{0,2}(?:'''.*?'''|\"\"\".*?\"\"\"|'(?:[^'\\\n]|\\.)*'|"(?:[^"\\\n]|\\.)*")
+  | --[^\n]*|\#[^\n]*|/\*.*?(?:\*/|\Z)
+  | (?P<name>(?<![\w.])(?:`[^`]*`|[A-Z_]\w*(?:-\w+)*)(?:\s*\.\s*(?:`[^`]*`|\w+(?:-\w+)*))*)
+  | (?P<punct>[;,()\[\]])
+)""", re.VERBOSE | re.DOTALL)
+
+# Mots qui ouvrent une liste de tables, et ceux qui la ferment au même niveau de parenthèses
+_TABLE_LIST_START = frozenset({"FROM", "JOIN"})
+_TABLE_LIST_END = frozenset({"SELECT", "WHERE", "GROUP", "HAVING", "QUALIFY", "WINDOW", "ORDER", "LIMIT",
+                             "UNION", "INTERSECT", "EXCEPT"})
+_SPECIAL_WORDS = _TABLE_LIST_START | _TABLE_LIST_END | frozenset(SQL_DANGEROUS_KEYWORDS)
+
+
+def _dataset(path: str) -> Optional[str]:
+    """Dataset (`projet.dataset`) d'un chemin de table ; None s'il n'est pas qualifié (CTE, alias)."""
+    parts = "".join(path.replace("`", "").split()).split(".")
+    if len(parts) >= 3:
+        return f"{parts[0]}.{parts[1]}"
+    return f"{PROJECT_ID}.{parts[0]}" if len(parts) == 2 else None
 
-SQL_DANGEROUS_KEYWORDS = ["DROP", "DELETE", "ALTER", "TRUNCATE", "UPDATE", "INSERT"]
 
 def validate_input(text):
     return bool(text and len(text.strip()) >= 3)
 
-def sanitize_sql_output(sql):
+def sanitize_sql_output(sql, allowed_datasets=SQL_ALLOWED_DATASETS):
     """
-    Vérifie que la requête SQL générée est valide et sécurisée.
+    Vérifie que la requête SQL générée est valide et sécurisée : une seule instruction, en
+    lecture seule (SELECT / WITH, aucun mot-clé de `SQL_DANGEROUS_KEYWORDS` en tête
+    d'instruction), qui ne lit que des tables des datasets autorisés (`projet.dataset`) : chaque
+    table après FROM, JOIN ou une virgule de liste FROM, sous-requêtes comprises.
+
+    Un seul parcours des jetons (`_SQL_TOKENS`) suit le niveau de parenthèses, les listes de
+    tables et le début du corps de l'instruction (premier SELECT hors parenthèses).
 
     Args:
         sql (str): Requête SQL générée par le modèle.
@@ -20,12 +69,12 @@ def sanitize_sql_output(sql):
     Returns:
         (bool, str): Tuple indiquant si la requête est sûre, et pourquoi sinon.
     """
-    sql = sql.strip().strip('"').strip("'")  
-
     if not isinstance(sql, str):
         return False, "Sortie non textuelle"
-    
+
     sql = sql.strip()
+    if len(sql) >= 2 and sql[0] == sql[-1] and sql[0] in "'\"":
+        sql = sql[1:-1].strip()
 
     if not sql:
         return False, "Sortie vide"
@@ -33,12 +82,54 @@ def sanitize_sql_output(sql):
     if sql.lower() in ["true", "false"]:
         return False, "Sortie booléenne invalide"
 
-    if not sql.lower().startswith("select") and not sql.lower().startswith("with"):
+    if not _READ_ONLY_START.match(sql):
         return False, "La requête ne commence pas par SELECT ou WITH"
 
-    for keyword in SQL_DANGEROUS_KEYWORDS:
-        if re.search(rf'\b{keyword}\b', sql, re.IGNORECASE):
-            return False, f"Mot-clé interdit détecté : {keyword}"
+    # Par niveau de parenthèses : dans une liste de tables (True), non (False), dans EXTRACT (None)
+    table_lists = [False]
+    expect_table = body = False
+    previous = ""
+    statement_end = denied = None
+    for match in _SQL_TOKENS.finditer(sql.translate(_ASCII_UPPER)):
+        kind = match.lastgroup
+        if kind == "name":
+            token = match.group(kind)
+            if expect_table:
+                expect_table = False
+                dataset = _dataset(sql[match.start():match.end()])
+                if dataset is not None and dataset not in allowed_datasets and denied is None:
+                    denied = dataset
+            if token in _SPECIAL_WORDS:
+                if token in _TABLE_LIST_START:
+                    if table_lists[-1] is not None and previous != "DISTINCT":
+                        table_lists[-1] = expect_table = True
+                elif token in _TABLE_LIST_END:
+                    if table_lists[-1] is not None:
+                        table_lists[-1] = False
+                    body = body or (token == "SELECT" and len(table_lists) == 1)
+                elif not body and len(table_lists) == 1 and previous in (";", ")"):
+                    return False, f"Mot-clé interdit détecté : {token}"
+            previous = token
+        elif kind == "punct":
+            token = match.group(kind)
+            expect_table = False
+            if token == ",":
+                expect_table = bool(table_lists[-1])
+            elif token == ";":
+                body = False
+                if statement_end is None:
+                    statement_end = match.start()
+            elif token in "([":
+                table_lists.append(None if previous == "EXTRACT" else False)
+            elif len(table_lists) > 1:
+                table_lists.pop()
+            previous = token
+
+    if statement_end is not None and _STATEMENT_END.match(sql, statement_end).end() != len(sql):
+        return False, "Plusieurs instructions SQL"
+
+    if denied is not None:
+        return False, f"Dataset non autorisé : {denied}"
 
     return True, "OK"
 
@@ -51,24 +142,44 @@ def execute_sql(query: str):
         (bool, pd.DataFrame | None): True si la requête s'exécute sans erreur.
     """
     try:
-        client = bigquery.Client(project=PROJECT_ID, location=BQ_LOCATION)
-        result = client.query(query).result().to_dataframe()
+        result = get_bq_client().query(query).result().to_dataframe()
         return True, result
     except Exception as e:
         return False, None
 
-def evaluate_judge(question: str, reference_sql: str, predicted_sql: str) -> float:
+
+@dataclass
+class SqlValidation:
+    """Résultat d'une validation sans exécution : tables lues et octets qui seraient facturés."""
+    valid: bool
+    tables: List[str] = field(default_factory=list)
+    bytes_processed: int = 0
+    error: Optional[str] = None
+
+
+def dry_run_sql(query: str, client: Optional[bigquery.Client] = None) -> SqlValidation:
     """
-    Utilise Gemini (base) pour juger la similarité sémantique entre deux requêtes SQL pour une question donnée.
+    Valide une requête par un job BigQuery en dry-run : compilée et contrôlée (syntaxe,
+    tables, colonnes, droits) mais ni exécutée, ni facturée ; aucune ligne n'est rapatriée.
 
-    Returns:
-        float: score de similarité entre 0.0 et 2.0
+    Une requête refusée par BigQuery renvoie `valid=False` avec le message d'erreur ; les
+    autres erreurs (réseau, authentification, quota) sont propagées.
     """
+    client = client or get_bq_client()
+    config = bigquery.QueryJobConfig(dry_run=True, use_query_cache=False)
     try:
-        client = genai.Client()
-        content = [
-            {"role": "user", "parts": [{
-                "text": f"""Tu es un assistant qui évalue la similarité entre deux requêtes SQL.
+        job = client.query(query, job_config=config)
+    except (api_exceptions.BadRequest, api_exceptions.NotFound) as e:
+        return SqlValidation(False, error=getattr(e, "message", None) or str(e))
+    return SqlValidation(
+        True,
+        tables=[f"{t.project}.{t.dataset_id}.{t.table_id}" for t in job.referenced_tables or []],
+        bytes_processed=job.total_bytes_processed or 0,
+    )
+
+JUDGE_MODEL_NAME = "gemini-2.0-flash-001"
+
+JUDGE_PROMPT = """Tu es un assistant qui évalue la similarité entre deux requêtes SQL.
 
 Question : {question}
 
@@ -84,10 +195,161 @@ Donne une note entre 0 et 2 :
 - 0 = incorrect
 
 Ta réponse :"""
-            }]}
-        ]
-        response = client.generate_content(content)
-        score = float(response.text.strip())
-        return max(0.0, min(score, 2.0))
+
+
+JUDGE_BATCH_PROMPT = """Tu es un assistant qui évalue la similarité entre des requêtes SQL générées et des requêtes de référence.
+
+Pour chaque paire, donne une note entre 0 et 2 :
+- 2 = mêmes résultats
+- 1 = partiellement correct
+- 0 = incorrect
+
+{pairs}
+
+Réponds uniquement par un tableau JSON avec un objet par paire : [{{"id": 0, "score": 2}}, ...]"""
+
+JUDGE_BATCH_PAIR = """### Paire {id}
+Question : {question}
+
+Référence SQL :
+{reference_sql}
+
+SQL générée :
+{predicted_sql}"""
+
+JUDGE_BATCH_SCHEMA = types.Schema(
+    type="ARRAY",
+    items=types.Schema(
+        type="OBJECT",
+        properties={"id": types.Schema(type="INTEGER"), "score": types.Schema(type="NUMBER")},
+        required=["id", "score"],
+    ),
+)
+
+JudgePair = Tuple[str, str, str]  # (question, SQL de référence, SQL générée)
+
+
+def parse_judge_score(response_text: str) -> float:
+    """Première note trouvée dans la réponse du juge, bornée à [0, 2] (0.0 si aucune)."""
+    match = re.search(r"\d+(?:[.,]\d+)?", response_text or "")
+    if not match:
+        return 0.0
+    return max(0.0, min(float(match.group(0).replace(",", ".")), 2.0))
+
+
+def _record_usage(usage: Optional[dict], response) -> None:
+    if usage is None:
+        return
+    metadata = getattr(response, "usage_metadata", None)
+    usage["calls"] = usage.get("calls", 0) + 1
+    usage["prompt_tokens"] = usage.get("prompt_tokens", 0) + (getattr(metadata, "prompt_token_count", 0) or 0)
+    usage["output_tokens"] = usage.get("output_tokens", 0) + (getattr(metadata, "candidates_token_count", 0) or 0)
+
+
+def judge_sql(question: str, reference_sql: str, predicted_sql: str, usage: Optional[dict] = None) -> float:
+    """
+    Note du juge Gemini (modèle de base, température 0) pour une paire de requêtes.
+
+    Les erreurs d'appel (quota, réseau) sont propagées : l'appelant décide de réessayer
+    (moteur d'évaluation) ou de compter 0 (`evaluate_judge`).
+
+    Returns:
+        float: score de similarité entre 0.0 et 2.0
+    """
+    from src.inference.predict import get_genai_client
+
+    response = get_genai_client().models.generate_content(
+        model=JUDGE_MODEL_NAME,
+        contents=JUDGE_PROMPT.format(question=question, reference_sql=reference_sql, predicted_sql=predicted_sql),
+        config=types.GenerateContentConfig(temperature=0, max_output_tokens=16),
+    )
+    _record_usage(usage, response)
+    return parse_judge_score(response.text)
+
+
+def parse_judge_scores(response_text: str, count: int) -> List[Optional[float]]:
+    """
+    Notes d'une réponse du juge par lots (tableau JSON `[{"id", "score"}]`).
+
+    Une paire sans note valide (id absent ou répété, note non numérique ou hors de [0, 2])
+    vaut None ; une réponse illisible donne None partout.
+    """
+    scores: List[Optional[float]] = [None] * count
+    text = (response_text or "").strip()
+    if text.startswith("```"):
+        text = text.strip("`").removeprefix("json").strip()
+    try:
+        items = json.loads(text)
+    except ValueError:
+        return scores
+    if not isinstance(items, list):
+        return scores
+    seen = set()
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        pair_id, score = item.get("id"), item.get("score")
+        if not isinstance(pair_id, int) or not 0 <= pair_id < count or pair_id in seen:
+            continue
+        seen.add(pair_id)
+        if isinstance(score, (int, float)) and not isinstance(score, bool) and 0 <= score <= 2:
+            scores[pair_id] = float(score)
+    return scores
+
+
+def judge_sql_pairs(pairs: List[JudgePair], usage: Optional[dict] = None) -> List[Optional[float]]:
+    """
+    Note plusieurs paires en un seul appel au juge (sortie JSON structurée).
+
+    Les erreurs d'appel sont propagées ; une paire mal notée vaut None (voir `parse_judge_scores`).
+    """
+    from src.inference.predict import get_genai_client
+
+    if not pairs:
+        return []
+    prompt = JUDGE_BATCH_PROMPT.format(pairs="\n\n".join(
+        JUDGE_BATCH_PAIR.format(id=i, question=q, reference_sql=ref, predicted_sql=pred)
+        for i, (q, ref, pred) in enumerate(pairs)
+    ))
+    response = get_genai_client().models.generate_content(
+        model=JUDGE_MODEL_NAME,
+        contents=prompt,
+        config=types.GenerateContentConfig(
+            temperature=0, max_output_tokens=64 + 24 * len(pairs),
+            response_mime_type="application/json", response_schema=JUDGE_BATCH_SCHEMA,
+        ),
+    )
+    _record_usage(usage, response)
+    return parse_judge_scores(response.text, len(pairs))
+
+
+def judge_sql_batch(pairs: List[JudgePair], batch_size: int = JUDGE_BATCH_SIZE,
+                    max_reasks: int = JUDGE_BATCH_MAX_REASKS, usage: Optional[dict] = None) -> List[Optional[float]]:
+    """
+    Note des paires par lots de `batch_size` ; seules les paires mal notées sont
+    redemandées (au plus `max_reasks` fois). None : paire toujours sans note.
+    """
+    scores: List[Optional[float]] = [None] * len(pairs)
+    pending = list(range(len(pairs)))
+    for _ in range(max_reasks + 1):
+        for start in range(0, len(pending), max(1, batch_size)):
+            chunk = pending[start:start + max(1, batch_size)]
+            for index, score in zip(chunk, judge_sql_pairs([pairs[i] for i in chunk], usage)):
+                scores[index] = score
+        pending = [i for i in pending if scores[i] is None]
+        if not pending:
+            break
+    return scores
+
+
+def evaluate_judge(question: str, reference_sql: str, predicted_sql: str) -> float:
+    """
+    Utilise Gemini (base) pour juger la similarité sémantique entre deux requêtes SQL pour une question donnée.
+
+    Returns:
+        float: score de similarité entre 0.0 et 2.0 (0.0 si le juge est injoignable)
+    """
+    try:
+        return judge_sql(question, reference_sql, predicted_sql)
     except Exception:
         return 0.0
@@ -1,19 +1,30 @@
 # src/security/scope_filter.py
-from vertexai import init as vertexai_init
-from vertexai.generative_models import GenerativeModel, GenerationConfig, Content, Part
+from functools import lru_cache
 from config.settings import PROJECT_ID, VERTEX_LOCATION
+from src.security.scope_classifier import get_scope_classifier
 
 
-vertexai_init(project=PROJECT_ID, location=VERTEX_LOCATION)
-generation_config = GenerationConfig(temperature=0, max_output_tokens=512)
-model_judge = GenerativeModel("gemini-pro")
+# Le SDK Vertex AI (~2 s d'import) n'est chargé qu'au premier appel au juge
+@lru_cache(maxsize=1)
+def get_model_judge():
+    """Initialise Vertex AI et le juge de scope au premier appel."""
+    from vertexai import init as vertexai_init
+    from vertexai.generative_models import GenerativeModel
 
-def classify_scope(question: str) -> str:
-    """
-    Détermine si une question est en lien avec la base métier.
+    vertexai_init(project=PROJECT_ID, location=VERTEX_LOCATION)
+    return GenerativeModel("gemini-pro")
+
+
+@lru_cache(maxsize=1)
+def get_generation_config():
+    from vertexai.generative_models import GenerationConfig
+
+    return GenerationConfig(temperature=0, max_output_tokens=512)
+
+
+def _build_scope_prompt(question: str) -> list:
+    from vertexai.generative_models import Content, Part
 
-    Returns: "in_scope" ou "out_of_scope"
-    """
     prompt = f"""
     Tu dois dire si la question est liée à une base métier sur les ventes, clients, produits, tickets.
 
@@ -28,12 +39,67 @@ def classify_scope(question: str) -> str:
 
     Question : {question}
     """
+    return [Content(role="user", parts=[Part.from_text(prompt)])]
+
 
+def _parse_scope(response_text: str) -> str:
+    return "out_of_scope" if "out" in response_text.strip().lower() else "in_scope"
+
+
+def classify_scope_llm(question: str) -> str:
+    """
+    Détermine si une question est en lien avec la base métier, via le juge Gemini.
+
+    Returns: "in_scope" ou "out_of_scope"
+    """
     try:
-        response = model_judge.generate_content(
-            [Content(role="user", parts=[Part.from_text(prompt)])],
-            generation_config=generation_config
-        ).text.strip().lower()
-        return "out_of_scope" if "out" in response else "in_scope"
+        response = get_model_judge().generate_content(
+            _build_scope_prompt(question),
+            generation_config=get_generation_config()
+        )
+        return _parse_scope(response.text)
     except:
         return "in_scope"
+
+
+async def classify_scope_llm_async(question: str) -> str:
+    """
+    Version asynchrone de `classify_scope_llm` (même prompt, même repli sur "in_scope").
+
+    Returns: "in_scope" ou "out_of_scope"
+    """
+    try:
+        response = await get_model_judge().generate_content_async(
+            _build_scope_prompt(question),
+            generation_config=get_generation_config()
+        )
+        return _parse_scope(response.text)
+    except:
+        return "in_scope"
+
+
+def classify_scope(question: str) -> str:
+    """
+    Détermine si une question est en lien avec la base métier.
+
+    Le pré-classifieur local tranche les cas évidents ; seules les questions
+    de la zone d'incertitude sont envoyées au juge Gemini.
+
+    Returns: "in_scope" ou "out_of_scope"
+    """
+    local_scope = get_scope_classifier().classify(question)
+    if local_scope is not None:
+        return local_scope
+    return classify_scope_llm(question)
+
+
+async def classify_scope_async(question: str) -> str:
+    """
+    Version asynchrone de `classify_scope`.
+
+    Returns: "in_scope" ou "out_of_scope"
+    """
+    local_scope = get_scope_classifier().classify(question)
+    if local_scope is not None:
+        return local_scope
+    return await classify_scope_llm_async(question)
@@ -0,0 +1,81 @@
+# src/text_utils.py
+import re
+import sys
+import unicodedata
+import zlib
+from functools import lru_cache
+from typing import Dict, List
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+# Mots vides des questions (forme normalisée), ignorés pour le rapprochement avec le schéma
+STOPWORDS = set("""
+a au aux avec ce ces cet cette dans de des du elle en est et il ils je la le les leur leurs ma me mes moi mon
+ne nous on ont ou par pas pour qu que quel quelle quelles quels qui quoi sa se ses son sont sur ta te tes toi
+ton tu un une vous y l d s t c n j m donne donnez peux peut faire fais total nombre combien plus moins
+entre depuis tous toutes tout toute ete etre avoir fait chaque selon
+""".split())
+
+
+@lru_cache(maxsize=1)
+def _combining_marks() -> Dict[int, None]:
+    """Table de `str.translate` supprimant les diacritiques (construite une fois, ~0,1 s)."""
+    return dict.fromkeys(c for c in range(sys.maxunicode + 1) if unicodedata.combining(chr(c)))
+
+
+def strip_accents(text: str) -> str:
+    """Supprime les accents (é → e, ç → c...)."""
+    if text.isascii():
+        return text
+    return unicodedata.normalize("NFKD", text).translate(_combining_marks())
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalise un texte pour la comparaison : minuscules, sans accents,
+    ponctuation remplacée par des espaces, espaces fusionnés.
+
+    Ex. : "  Chiffre d'Affaires total en 2023 ?" → "chiffre d affaires total en 2023"
+    """
+    text = strip_accents((text or "").lower())
+    return _NON_ALNUM.sub(" ", text).strip()
+
+
+def tokenize(text: str) -> List[str]:
+    """Découpe un texte normalisé en mots."""
+    return normalize_text(text).split()
+
+
+def stem(token: str) -> str:
+    """Racine grossière d'un mot français (pluriels en -s / -x)."""
+    if len(token) > 3 and token[-1] in "sx":
+        return token[:-1]
+    return token
+
+
+def char_ngrams(text: str, n_min: int = 3, n_max: int = 5) -> List[str]:
+    """N-grammes de caractères (bornés par des espaces) du texte normalisé."""
+    padded = f" {normalize_text(text)} "
+    return [
+        padded[i:i + n]
+        for n in range(n_min, n_max + 1)
+        for i in range(len(padded) - n + 1)
+    ]
+
+
+def hashed_counts(features: List[str], dim: int) -> Dict[int, int]:
+    """
+    Projette des features textuelles dans `dim` buckets (hashing trick).
+
+    Utilise crc32, stable d'un processus à l'autre (contrairement à `hash`).
+    """
+    counts: Dict[int, int] = {}
+    for feature in features:
+        bucket = zlib.crc32(feature.encode("utf-8")) % dim
+        counts[bucket] = counts.get(bucket, 0) + 1
+    return counts
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimation du nombre de tokens d'un prompt (≈ 4 caractères par token pour Gemini)."""
+    return (len(text or "") + 3) // 4
@@ -0,0 +1,266 @@
+# tests/test_evaluation.py
+
+import asyncio
+import time
+
+
+def test_eval_engine_keeps_order_retries_quota_and_bounds_rows():
+    from src.evaluation.engine import EvaluationEngine, EvaluationStages, is_quota_error
+
+    class QuotaExceeded(Exception):
+        code = 429
+
+    in_flight, peak, failures = 0, 0, {"Question 3 ?": 2}
+
+    async def generate(question, use_ft_model):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.05 if question.endswith("0 ?") else 0.001)
+        in_flight -= 1
+        if failures.get(question) and use_ft_model:
+            failures[question] -= 1
+            raise QuotaExceeded("429 RESOURCE_EXHAUSTED")
+        if question == "Question 4 ?":
+            raise ValueError("réponse illisible")
+        return "SELECT 1" if use_ft_model else "DROP TABLE x"
+
+    def execute(sql):
+        return sql == "SELECT 1"
+
+    async def judge(question, expected_sql, predicted_sql):
+        return 2.0 if predicted_sql == "SELECT 1" else 0.0
+
+    engine = EvaluationEngine(
+        stages=EvaluationStages(scope=lambda q: "in_scope", generate=generate, execute=execute, judge=judge,
+                                judge_batch=None, match=None, validate=None),
+        rate_limits={"gemini": (1000.0, 50), "bigquery": (1000.0, 50)},
+        rows_in_flight=2, retry_base_delay=0.001,
+    )
+    rows = [(f"Question {i} ?", "SELECT 1") for i in range(6)]
+    results = engine.run(rows, with_scope=True)
+
+    assert [r["question"] for r in results] == [q for q, _ in rows]
+    assert peak <= 4  # 2 lignes x 2 générations
+    assert engine.stats.retries["gemini"] == 2 and results[3]["ft_sql"] == "SELECT 1"
+    assert results[4]["ft_sql"] == "INCOMPLETE_SCHEMA" and not results[4]["ft_exec"]
+    assert results[0] == {
+        "question": "Question 0 ?", "expected_sql": "SELECT 1", "scope": "in_scope",
+        "base_sql": "DROP TABLE x", "ft_sql": "SELECT 1", "base_safe": False, "ft_safe": True,
+        "base_exec": False, "ft_exec": True, "base_semantic": 0.0, "ft_semantic": 2.0,
+    }
+    assert is_quota_error(Exception("403 Exceeded rate limits: rateLimitExceeded"))
+    assert not is_quota_error(Exception("400 Syntax error"))
+
+
+def test_token_bucket_limits_rate():
+    from src.evaluation.engine import TokenBucket
+
+    async def run():
+        bucket = TokenBucket(rate=100.0, burst=5)
+        start = time.perf_counter()
+        for _ in range(15):
+            await bucket.acquire()
+        return time.perf_counter() - start
+
+    # 5 jetons immédiats, puis 10 à 100/s
+    assert asyncio.run(run()) >= 0.09
+
+
+def test_evaluation_run_checkpoints_rows_and_resumes(tmp_path, monkeypatch):
+    from src.evaluation import engine as engine_module
+    from src.evaluation.engine import EvaluationEngine, EvaluationStages, evaluate_rows
+    from src.evaluation.run_log import RunLog, summarize
+
+    monkeypatch.setattr(engine_module, "RunLog", lambda run_id: RunLog(run_id, directory=str(tmp_path)))
+    generated, failing = [], {"Q2"}
+
+    async def generate(question, use_ft_model):
+        generated.append(question)
+        if question in failing:
+            raise RuntimeError("endpoint indisponible")
+        return "SELECT 1"
+
+    def make_engine():
+        return EvaluationEngine(
+            stages=EvaluationStages(scope=lambda q: "in_scope", generate=generate, execute=lambda sql: True,
+                                    judge=lambda q, e, p: 2.0, judge_batch=None, match=None, validate=None),
+            rate_limits={"gemini": (1000.0, 50), "bigquery": (1000.0, 50)},
+        )
+
+    rows = [(f"Q{i}", "SELECT 1") for i in range(4)]
+    first = evaluate_rows(rows, with_scope=True, engine=make_engine(), run_id="run-a")
+    assert first["ft_sql"].tolist() == ["SELECT 1", "SELECT 1", "INCOMPLETE_SCHEMA", "SELECT 1"]
+    # Q2 (appels en échec) n'est pas journalisée ; une ligne tronquée (arrêt brutal) est ignorée
+    with open(tmp_path / "run-a.jsonl", "a", encoding="utf-8") as f:
+        f.write('{"key": "tronq')
+    log = RunLog("run-a", directory=str(tmp_path))
+    assert sorted(log.completed()) and len(log.completed()) == 3
+    assert summarize(log.to_dataframe())["rows"] == 3
+
+    generated.clear()
+    failing.clear()
+    resumed = evaluate_rows(rows, with_scope=True, engine=make_engine(), run_id="run-a")
+    assert set(generated) == {"Q2"}
+    assert resumed["question"].tolist() == [q for q, _ in rows]
+    assert resumed["ft_sql"].tolist() == ["SELECT 1"] * 4
+    assert len(log.completed()) == 4
+
+
+def test_eval_memo_serves_unchanged_generations_and_judgments(tmp_path):
+    from src.evaluation.engine import EvaluationEngine, EvaluationStages
+    from src.evaluation.memo import MemoStore
+
+    calls = []
+
+    async def generate(question, use_ft_model):
+        calls.append(("generate", question, use_ft_model))
+        if question == "Q1" and not use_ft_model:
+            raise RuntimeError("réponse illisible")
+        return f"SELECT '{question}', {use_ft_model}"
+
+    async def judge(question, expected_sql, predicted_sql):
+        calls.append(("judge", question, predicted_sql))
+        return 1.0
+
+    prompt_version = {"hash": "p1"}
+
+    def run(memo):
+        engine = EvaluationEngine(
+            stages=EvaluationStages(generate=generate, execute=lambda sql: True, judge=judge, judge_batch=None,
+                                    match=None, validate=None,
+                                    generation_key=lambda q, ft: ("ft" if ft else "base", prompt_version["hash"], 0.2)),
+            memo=memo, rate_limits={"gemini": (1000.0, 50), "bigquery": (1000.0, 50)},
+        )
+        calls.clear()
+        return engine.run([("Q0", "SELECT 0"), ("Q1", "SELECT 1")])
+
+    path = str(tmp_path / "memo.sqlite3")
+    first = run(MemoStore(path))
+    # 4 générations et 3 notes : la génération en échec (INCOMPLETE_SCHEMA) n'est pas soumise au juge
+    assert len(calls) == 7 and first[1]["base_sql"] == "INCOMPLETE_SCHEMA" and first[1]["base_semantic"] == 0.0
+
+    # Nouveau processus : seul l'appel en échec est refait
+    memo = MemoStore(path)
+    second = run(memo)
+    assert calls == [("generate", "Q1", False)]
+    assert [r["ft_sql"] for r in second] == [r["ft_sql"] for r in first]
+    assert memo.stats()["generation"] == {"hits": 3, "misses": 1, "hit_rate": 0.75}
+
+    # Prompt modifié : nouvelles générations ; mode "refresh" : tout est recalculé
+    prompt_version["hash"] = "p2"
+    run(MemoStore(path))
+    assert sum(1 for c in calls if c[0] == "generate") == 4
+    run(MemoStore.open("refresh", path=path))
+    assert len(calls) == 7
+    assert MemoStore.open("off", path=path) is None
+    assert MemoStore(path).expire(0) > 0
+
+
+def test_batched_judge_packs_pairs_and_reasks_only_failures():
+    from src.evaluation.engine import EvaluationEngine, EvaluationStages
+    from src.security.safety_checks import parse_judge_scores
+
+    assert parse_judge_scores('```json\n[{"id": 1, "score": 2}, {"id": 0, "score": 7}, {"id": 1, "score": 0}]\n```', 3) == [None, 2.0, None]
+    assert parse_judge_scores("note : 2", 2) == [None, None]
+
+    batches = []
+
+    def judge_batch(pairs):
+        batches.append([pred for _, _, pred in pairs])
+        # Première réponse : la note de la SQL "mal notée" est illisible
+        return [None if pred == "SELECT 'mal notée'" and len(batches) == 1 else 1.0 for _, _, pred in pairs]
+
+    async def generate(question, use_ft_model):
+        return "SELECT 'mal notée'" if question == "Q0" and use_ft_model else f"SELECT '{question}', {use_ft_model}"
+
+    engine = EvaluationEngine(
+        stages=EvaluationStages(generate=generate, execute=lambda sql: True, judge=None, judge_batch=judge_batch, match=None, validate=None),
+        rate_limits={"gemini": (1000.0, 50), "bigquery": (1000.0, 50)},
+        judge_batch_size=4, judge_batch_max_wait=0.01,
+    )
+    results = engine.run([(f"Q{i}", "SELECT 1") for i in range(3)])
+
+    assert sorted(len(batch) for batch in batches) == [1, 2, 4]
+    assert ["SELECT 'mal notée'"] in batches
+    assert all(r["base_semantic"] == r["ft_semantic"] == 1.0 for r in results)
+    assert engine.stats.failures["gemini"] == 0
+
+
+def test_execution_match_on_fixtures_ignores_order_and_aliases():
+    from src.data.validation_set import load_validation_snapshot
+    from src.evaluation.execution_match import FixtureDatabase, build_fixture_tables, execution_match
+
+    tables = load_validation_snapshot().tables
+    seed_sql = ["SELECT 1 FROM `p.d.magasin` WHERE TYPE_MAGASIN = 'Succursale'"]
+    fixtures = build_fixture_tables(tables, seed_sql=seed_sql, rows={"ticket_caisse": 500})
+    again = build_fixture_tables(tables, seed_sql=seed_sql, rows={"ticket_caisse": 500})
+    assert all(fixtures[table].equals(again[table]) for table in tables)
+    assert "Succursale" in set(fixtures["magasin"]["TYPE_MAGASIN"])
+    assert fixtures["magasin"]["CODE_BOUTIQUE"].is_unique
+    db = FixtureDatabase(fixtures)
+
+    gold = """SELECT m.REGIONS, SUM(tc.PRIX_AP_REMISE * tc.QUANTITE) AS ca
+        FROM `avisia-self-service-analytics.reine_des_maracas.ticket_caisse` tc
+        JOIN `avisia-self-service-analytics.reine_des_maracas.magasin` m ON tc.CODE_BOUTIQUE = m.CODE_BOUTIQUE
+        WHERE SUBSTR(tc.DATE_TICKET, 7, 4) = '2023' GROUP BY 1 ORDER BY 1"""
+    reordered = """SELECT SUM(QUANTITE * PRIX_AP_REMISE) AS chiffre, REGIONS
+        FROM avisia-self-service-analytics.reine_des_maracas.magasin AS m
+        JOIN avisia-self-service-analytics.reine_des_maracas.ticket_caisse AS t USING (CODE_BOUTIQUE)
+        WHERE EXTRACT(YEAR FROM PARSE_DATE('%d/%m/%Y', t.DATE_TICKET)) = 2023 GROUP BY REGIONS ORDER BY chiffre DESC"""
+    wrong_year = reordered.replace("2023", "2022")
+
+    assert execution_match(gold, reordered, db).status == "match"
+    assert execution_match(gold, wrong_year, db).status == "mismatch"
+    assert execution_match(gold, "SELECT NOPE FROM `p.reine_des_maracas.magasin`", db).status == "pred_error"
+    assert execution_match("SELECT 1 WHERE FALSE", "SELECT 2 WHERE FALSE", db).status == "empty"
+
+
+def test_eval_engine_skips_judge_when_results_match():
+    from src.evaluation.engine import EvaluationEngine, EvaluationStages
+
+    judged = []
+
+    async def generate(question, use_ft_model):
+        return "SELECT 1" if use_ft_model else "SELECT 2"
+
+    def judge(question, expected_sql, predicted_sql):
+        judged.append(predicted_sql)
+        return 1.0
+
+    engine = EvaluationEngine(
+        stages=EvaluationStages(generate=generate, execute=lambda sql: True, judge=judge, judge_batch=None,
+                                match=lambda gold, pred: "match" if gold == pred else "mismatch", validate=None),
+        rate_limits={"gemini": (1000.0, 50), "bigquery": (1000.0, 50)},
+    )
+    [row] = engine.run([("Q", "SELECT 1")])
+    assert (row["ft_match"], row["ft_semantic"], row["base_match"], row["base_semantic"]) == ("match", 2.0, "mismatch", 1.0)
+    assert judged == ["SELECT 2"] and engine.stats.judge_skipped == 1
+
+
+def test_eval_engine_refuses_out_of_scope_rows_without_generating():
+    from src.evaluation.engine import EvaluationEngine, EvaluationStages
+    from src.inference.predict import INCOMPLETE_SCHEMA
+
+    generated, judged = [], []
+
+    async def generate(question, use_ft_model):
+        generated.append(question)
+        return "SELECT 1"
+
+    def judge(question, expected_sql, predicted_sql):
+        judged.append(predicted_sql)
+        return 2.0
+
+    engine = EvaluationEngine(
+        stages=EvaluationStages(scope=lambda q: "out_of_scope" if "capitale" in q else "in_scope", generate=generate,
+                                execute=lambda sql: True, judge=judge, judge_batch=None, match=None, validate=None),
+        rate_limits={"gemini": (1000.0, 50), "bigquery": (1000.0, 50)},
+    )
+    out_row, in_row = engine.run([("Quelle est la capitale ?", "SELECT 0"), ("CA total ?", "SELECT 1")], with_scope=True)
+    assert (out_row["ft_sql"], out_row["base_sql"]) == (INCOMPLETE_SCHEMA, INCOMPLETE_SCHEMA)
+    assert not out_row["ft_safe"] and not out_row["base_safe"] and in_row["ft_safe"]
+    assert generated == ["CA total ?", "CA total ?"]
+    # Un refus est noté comme un échec sans appel au juge
+    assert (out_row["ft_semantic"], out_row["base_semantic"], in_row["ft_semantic"]) == (0.0, 0.0, 2.0)
+    assert judged == ["SELECT 1", "SELECT 1"] and engine.stats.refusals_scored == 2
@@ -1,8 +1,50 @@
 # tests/test_inference.py
 
+import json
+import pytest
+
 from src.inference.predict import predict_sql
 from src.security.safety_checks import sanitize_sql_output
 
+
+class FakeStages:
+    """
+    Étapes du pipeline sans réseau : scope `scope`, cache `cached` (les écritures vont dans
+    `stored`), aucun gabarit, génération de `sql` au coût `cost` (en un seul morceau en
+    streaming). Un test remplace l'attribut ou la méthode dont il a besoin.
+    """
+
+    def __init__(self):
+        self.scope = "in_scope"
+        self.cached = {}
+        self.stored = []
+        self.sql = "SELECT COUNT(*) AS total FROM ticket_caisse"
+        self.cost = 0.001
+
+    async def generate(self, question, use_ft_model=True):
+        return self.sql, self.cost
+
+    async def stream(self, question, use_ft_model=True):
+        yield self.sql, None
+        yield "", self.cost
+
+    async def classify_scope(self, question):
+        return self.scope
+
+
+@pytest.fixture
+def stages(monkeypatch):
+    from src.inference import pipeline as pipeline_module
+
+    fake = FakeStages()
+    monkeypatch.setattr(pipeline_module, "generate_raw_sql_async", lambda *args, **kwargs: fake.generate(*args, **kwargs))
+    monkeypatch.setattr(pipeline_module, "stream_raw_sql_async", lambda *args, **kwargs: fake.stream(*args, **kwargs))
+    monkeypatch.setattr(pipeline_module, "classify_scope_async", lambda question: fake.classify_scope(question))
+    monkeypatch.setattr(pipeline_module, "lookup_cached_sql", lambda question, use_ft_model=True: fake.cached.get(question))
+    monkeypatch.setattr(pipeline_module, "store_cached_sql", lambda question, sql, use_ft_model=True: fake.stored.append(question))
+    monkeypatch.setattr(pipeline_module, "get_template_engine", lambda: pipeline_module.TemplateEngine({}))
+    return fake
+
 def test_inference():
     question = "Quel est le chiffre d'affaires total en 2023 ?"
     sql = predict_sql(question)
@@ -36,3 +78,292 @@ def test_sql_injection():
     is_safe, reason = sanitize_sql_output(sql)
     assert not is_safe
     assert "Mot-clé interdit" in reason or "ne commence pas" in reason
+
+def test_pipeline_cancels_generation_out_of_scope(stages):
+    import asyncio
+    from src.inference import pipeline as pipeline_module
+
+    started, cancelled = [], []
+
+    async def fake_generate(question, use_ft_model=True):
+        started.append(question)
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(question)
+            raise
+        return "SELECT 1", 0.0
+
+    async def fake_scope(question):
+        await asyncio.sleep(0)
+        return "out_of_scope"
+
+    stages.generate, stages.classify_scope = fake_generate, fake_scope
+
+    async def run():
+        result = await pipeline_module.PredictionPipeline().run("Quelle est la capitale de la France ?")
+        await asyncio.sleep(0)
+        return result
+
+    result = asyncio.run(run())
+    assert result.status == "out_of_scope"
+    assert started and cancelled
+
+def test_pipeline_runs_each_guard_once(stages, monkeypatch):
+    import asyncio
+    from src.inference import pipeline as pipeline_module
+
+    calls = {"scope": 0, "sanitize": 0}
+
+    async def fake_scope(question):
+        calls["scope"] += 1
+        return "in_scope"
+
+    original_review = pipeline_module.review_sql_response
+
+    def counting_review(text):
+        calls["sanitize"] += 1
+        return original_review(text)
+
+    stages.classify_scope = fake_scope
+    monkeypatch.setattr(pipeline_module, "review_sql_response", counting_review)
+
+    result = asyncio.run(pipeline_module.PredictionPipeline().run("Combien de tickets en 2023 ?"))
+    assert result.status == "ok"
+    assert result.sql.startswith("SELECT")
+    assert calls == {"scope": 1, "sanitize": 1}
+
+def test_sql_cache_normalization_ttl_and_lru():
+    from src.inference.cache import SQLCache
+
+    now = [0.0]
+    cache = SQLCache(maxsize=2, ttl=60, clock=lambda: now[0])
+    cache.set("Chiffre d'affaires total en 2023 ?", "ft", "v1", "abc", "SELECT 1")
+    assert cache.get("  chiffre d’affaires TOTAL en 2023", "ft", "v1", "abc") == "SELECT 1"
+    assert cache.get("chiffre d'affaires total en 2023", "base", "v1", "abc") is None
+    assert cache.get("chiffre d'affaires total en 2023", "ft", "v1", "other") is None
+
+    cache.set("q2", "ft", "v1", "abc", "SELECT 2")
+    cache.set("q3", "ft", "v1", "abc", "SELECT 3")
+    assert cache.get("q2", "ft", "v1", "abc") == "SELECT 2"
+    assert cache.stats()["evictions"] == 1
+
+    now[0] = 120.0
+    assert cache.get("q3", "ft", "v1", "abc") is None
+    assert cache.invalidate(schema_fingerprint="abc") == 1
+    assert cache.stats()["size"] == 0
+
+    # Opérateurs, signes et séparateurs décimaux font partie de la clé
+    cache.set("Magasins avec un CA > 1000 €", "ft", "v1", "abc", "SELECT 4")
+    assert cache.get("magasins avec un CA < 1000 €", "ft", "v1", "abc") is None
+    assert cache.get("Magasins avec un CA >= 1000 €", "ft", "v1", "abc") is None
+    assert cache.get("Magasins avec un CA > 10.00 €", "ft", "v1", "abc") is None
+    assert cache.get("Évolution de -5 %", "ft", "v1", "abc") is None
+    assert cache.get("magasins  avec un ca > 1000 € ?", "ft", "v1", "abc") == "SELECT 4"
+
+def test_semantic_cache_paraphrase_numbers_and_snapshot(tmp_path):
+    from src.inference.semantic_cache import SemanticCache, HashingEmbedder
+
+    namespace = ("ft", "v1", "abc")
+    cache = SemanticCache(HashingEmbedder(), threshold=0.5, capacity=2)
+    cache.add("Quel est le chiffre d'affaires total en 2023 ?", "SELECT 2023", namespace)
+    cache.add("Combien de clients à Lyon ?", "SELECT lyon", namespace)
+
+    assert cache.lookup("chiffre d'affaires total 2023", namespace).sql == "SELECT 2023"
+    assert cache.lookup("Quel est le chiffre d'affaires total en 2022 ?", namespace) is None
+    assert cache.lookup("combien de clients a lyon", ("base", "v1", "abc")) is None
+
+    cache.add("Combien de magasins ?", "SELECT magasins", namespace)
+    assert len(cache) == 2
+
+    cache.save(str(tmp_path))
+    reloaded = SemanticCache.load(str(tmp_path), HashingEmbedder(), threshold=0.5, capacity=2)
+    assert reloaded.lookup("combien de magasins", namespace).sql == "SELECT magasins"
+
+    cache = SemanticCache(HashingEmbedder(), threshold=0.5, capacity=2)
+    cache.add("Magasins avec un CA > 1000 €", "SELECT plus", namespace)
+    cache.add("Magasins avec un CA < 1000 €", "SELECT moins", namespace)
+    assert len(cache) == 2
+    assert cache.lookup("magasins avec un CA > 1000 €", namespace).sql == "SELECT plus"
+    assert cache.lookup("Magasins avec un CA <= 1000 €", namespace) is None
+    assert cache.lookup("Magasins avec un CA > 10,00 €", namespace) is None
+
+def test_template_engine_fills_slots_and_sanitizes():
+    from src.inference.templates import TemplateEngine
+
+    engine = TemplateEngine({"VILLE": ["MARSEILLE", "LYON SAXE"]}).fit([(
+        "Combien de tickets en 2022 à Marseille ?",
+        "SELECT COUNT(*) AS total FROM ticket_caisse t JOIN magasin m ON t.CODE_BOUTIQUE = m.CODE_BOUTIQUE "
+        "WHERE m.VILLE = 'MARSEILLE' AND EXTRACT(YEAR FROM PARSE_DATE('%d/%m/%Y', t.DATE_TICKET)) = 2022",
+    )])
+    match = engine.match("combien de tickets en 2021 a Lyon Saxe")
+    assert match is not None
+    assert "m.VILLE = 'LYON SAXE'" in match.sql and "= 2021" in match.sql
+    assert engine.match("Combien de clients en 2021 à Lyon Saxe ?") is None
+
+def test_import_serve_without_network():
+    import subprocess
+    import sys
+
+    completed = subprocess.run(
+        [sys.executable, "scripts/benchmark_import.py", "src.inference.serve"],
+        capture_output=True, text=True, env={"PYTHONPATH": ".", "PATH": ""},
+    )
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+
+def test_batch_prediction_dedupes_streams_and_bounds_concurrency(stages):
+    import asyncio
+    from src.inference.batch import predict_sql_batch_async
+
+    running, peak, gates = [0], [0], {}
+
+    async def fake_generate(question, use_ft_model=True):
+        # Chaque génération attend que le test ouvre sa porte : l'ordre de sortie ne dépend pas de l'horloge
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        await gates[question].wait()
+        running[0] -= 1
+        return stages.sql, stages.cost
+
+    stages.generate = fake_generate
+    stages.cached = {"Quel est le CA total ?": "SELECT SUM(PRIX_AP_REMISE) FROM ticket_caisse"}
+
+    questions = ["Combien de tickets en 2021 ?"] + [f"Combien de tickets en {year} ?" for year in range(2010, 2016)]
+    questions += ["Quel est le CA total ?", "combien de tickets en 2021", ""]
+
+    def release(keep_closed=()):
+        for question, gate in gates.items():
+            if question not in keep_closed:
+                gate.set()
+
+    async def run():
+        gates.update({question: asyncio.Event() for question in questions})
+        items = []
+        async for item in predict_sql_batch_async(questions, concurrency=2):
+            items.append(item)
+            if len(items) == 2:
+                release(keep_closed=questions[:1])
+            elif len(items) == 8:
+                release()
+        return items
+
+    items = asyncio.run(run())
+    assert sorted(item.index for item in items) == list(range(len(questions)))
+    # Entrée invalide et réponse en cache sortent pendant que toutes les générations attendent
+    assert {items[0].index, items[1].index} == {7, 9}
+    by_index = {item.index: item for item in items}
+    assert by_index[7].source == "cache" and by_index[7].estimated_cost == 0.0
+    assert by_index[len(questions) - 1].status == "invalid_input"
+    assert by_index[8].duplicate_of == 0 and by_index[8].sql == by_index[0].sql and by_index[8].estimated_cost == 0.0
+    assert by_index[0].estimated_cost == 0.001
+    # La question dupliquée sort avec l'originale, libérée en dernier
+    assert {items[-2].index, items[-1].index} == {0, 8}
+    assert peak[0] == 2 and len(stages.stored) == 7
+
+def test_streamed_prediction_sanitizes_completed_text_and_tracks_ttft(stages, monkeypatch):
+    import asyncio
+    from fastapi.testclient import TestClient
+    from src.inference import serve
+    from src.inference.streaming import parse_sse, ttft_tracker
+
+    responses = {
+        "ok": ["SELECT COUNT(*) ", "AS total ", "FROM ticket_caisse"],
+        "unsafe": ["SELECT 1; ", "DROP TABLE ticket_caisse"],
+    }
+
+    async def fake_stream(question, use_ft_model=True):
+        for chunk in responses[question.split()[-1]]:
+            await asyncio.sleep(0.01)
+            yield chunk, None
+        yield "", 0.0004
+
+    stages.stream = fake_stream
+    # Le pipeline de l'API recharge ses gabarits par `get_template_engine` (sans gabarit ici)
+    monkeypatch.setattr(serve.pipeline, "template_engine", None)
+
+    client = TestClient(serve.app)
+    count = ttft_tracker.count
+    with client.stream("POST", "/predict/stream", json={"question": "Combien de tickets ok"}) as response:
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = list(parse_sse(response.iter_lines()))
+    assert [event for event, _ in events] == ["delta", "delta", "delta", "result"]
+    result = events[-1][1]
+    assert result["status"] == "ok" and result["sql"] == "".join(responses["ok"])
+    assert result["estimated_cost"] == 0.0004 and result["ttft_ms"] >= 10
+    assert ttft_tracker.count == count + 1 and client.get("/metrics").json()["ttft"]["p50_ms"] is not None
+
+    with client.stream("POST", "/predict/stream", json={"question": "Supprime les tickets unsafe"}) as response:
+        events = list(parse_sse(response.iter_lines()))
+    assert events[-1][1]["status"] == "unsafe" and events[-1][1]["sql"] is None
+
+
+def test_result_batches_are_capped_and_streamed_in_every_format():
+    import pyarrow as pa
+    from src.inference.results import cap_batches, encode_batches
+
+    batches = [pa.RecordBatch.from_pylist([{"ville": f"V{i}", "ca": float(i)} for i in range(k * 10, k * 10 + 10)]) for k in range(5)]
+    counters = {}
+    capped = list(cap_batches(iter(batches), max_rows=25, counters=counters))
+    assert [b.num_rows for b in capped] == [10, 10, 5] and counters["truncated"] and counters["rows"] == 25
+    assert sum(b.num_rows for b in cap_batches(batches, max_bytes=batches[0].nbytes * 2)) <= 20
+
+    table = pa.ipc.open_stream(b"".join(encode_batches(capped, "arrow"))).read_all()
+    assert table.num_rows == 25 and table.column_names == ["ville", "ca"]
+    lines = b"".join(encode_batches(capped, "ndjson")).decode().splitlines()
+    assert len(lines) == 25 and json.loads(lines[0]) == {"ville": "V0", "ca": 0.0}
+    csv_text = b"".join(encode_batches(capped, "csv")).decode()
+    assert csv_text.count('"ville","ca"') == 1 and len(csv_text.splitlines()) == 26
+    empty = pa.schema([("ville", pa.string())])
+    assert pa.ipc.open_stream(b"".join(encode_batches([], "arrow", empty))).read_all().schema == empty
+
+
+def test_fetch_page_only_reads_jobs_started_by_execute():
+    import pyarrow as pa
+    import pytest
+    from google.cloud.bigquery import TableReference
+    from src.inference.results import RESULT_JOB_LABELS, fetch_page
+
+    allowed = TableReference.from_string("avisia-self-service-analytics.reine_des_maracas.magasin")
+    foreign = TableReference.from_string("avisia-self-service-analytics.rh.salaires")
+
+    class FakeJob:
+        job_type, statement_type, destination = "query", "SELECT", "projet._anon.resultat"
+
+        def __init__(self, labels, tables):
+            self.labels, self.referenced_tables = labels, tables
+
+    class FakeRows:
+        total_rows = 3
+
+        def to_arrow(self, create_bqstorage_client=False):
+            return pa.table({"ville": ["Lyon"]})
+
+    class FakeClient:
+        jobs = {"ok": FakeJob(RESULT_JOB_LABELS, [allowed]), "autre": FakeJob({}, [allowed]),
+                "fuite": FakeJob(RESULT_JOB_LABELS, [allowed, foreign])}
+
+        def get_job(self, job_id, location=None):
+            return self.jobs[job_id]
+
+        def list_rows(self, table, start_index=None, max_results=None):
+            return FakeRows()
+
+    assert fetch_page("ok", 0, client=FakeClient()).table.num_rows == 1
+    for job_id in ("autre", "fuite"):
+        with pytest.raises(PermissionError):
+            fetch_page(job_id, 0, client=FakeClient())
+
+
+def test_iterate_sync_reuses_one_event_loop_across_questions():
+    import asyncio
+    from src.async_utils import iterate_sync, run_sync
+
+    async def events():
+        for i in range(2):
+            await asyncio.sleep(0)
+            yield asyncio.get_running_loop()
+
+    # Les clients asynchrones en cache restent liés à la première boucle : elle doit servir à chaque question
+    loops = list(iterate_sync(events())) + list(iterate_sync(events()))
+    assert all(loop is loops[0] for loop in loops) and not loops[0].is_closed()
+    assert run_sync(asyncio.sleep(0, result=42)) == 42
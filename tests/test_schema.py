@@ -0,0 +1,214 @@
+# tests/test_schema.py
+
+from src.data.validation_set import load_validation_snapshot
+
+
+def test_snapshot_roundtrip_and_change_notification(tmp_path, monkeypatch):
+    from src.schema import snapshot as snapshot_module
+
+    monkeypatch.setattr(snapshot_module, "SCHEMA_SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(snapshot_module, "_current", {})
+    monkeypatch.setattr(snapshot_module, "_listeners", [])
+
+    snapshot = load_validation_snapshot()
+    path = snapshot_module.save_snapshot(snapshot)
+    loaded = snapshot_module.get_schema_snapshot(snapshot.project_id, snapshot.dataset_id)
+    assert loaded.fingerprint == snapshot.fingerprint
+    assert str(tmp_path) in path
+
+    changes = []
+    snapshot_module.on_schema_change(lambda new, old: changes.append((old.fingerprint, new.fingerprint)))
+    tables = loaded.enriched_tables()
+    tables["magasin"]["description"] += " (modifiée)"
+    updated = snapshot_module.SchemaSnapshot(snapshot.project_id, snapshot.dataset_id, tables)
+    assert snapshot_module.set_schema_snapshot(updated)
+    assert changes == [(snapshot.fingerprint, updated.fingerprint)]
+    assert not snapshot_module.set_schema_snapshot(updated)
+
+
+def test_enriched_tables_keep_training_format():
+    snapshot = load_validation_snapshot()
+    famille = next(f for f in snapshot.enriched_tables()["typo_produit"]["fields"] if f["name"] == "FAMILLE")
+    assert '"Bain_Maillot"' in famille["description"]
+    assert "values" not in famille
+
+
+def test_information_schema_fetch_matches_table_loop():
+    from src.schema.extract_schema import get_table_schemas_by_table
+    from src.schema.information_schema import InMemorySchemaBackend, fetch_schema, legacy_field_type
+
+    tables = load_validation_snapshot().tables
+    tables["magasin"]["fields"].append({"name": "_dlt_id", "type": "STRING", "mode": "REQUIRED", "description": ""})
+    backend = InMemorySchemaBackend(tables, last_modified={table: 1000 for table in tables})
+
+    schemas, last_modified = fetch_schema(backend=backend)
+    assert backend.round_trips == 1
+    assert schemas == get_table_schemas_by_table(client=backend)
+    assert backend.round_trips == 2 + len(tables)
+    assert "_dlt_id" not in [f["name"] for f in schemas["magasin"]["fields"]]
+    assert last_modified["magasin"] == 1000
+    assert legacy_field_type("ARRAY<NUMERIC(10, 2)>") == ("NUMERIC", "REPEATED")
+    assert legacy_field_type("INT64", "NO") == ("INTEGER", "REQUIRED")
+
+
+def test_tables_modified_since_uses_last_modified_times():
+    from src.schema.information_schema import InMemorySchemaBackend
+    from src.schema.snapshot import tables_modified_since
+
+    snapshot = load_validation_snapshot()
+    backend = InMemorySchemaBackend(snapshot.tables, last_modified={table: 1000 for table in snapshot.tables})
+    assert tables_modified_since(snapshot, backend) == sorted(snapshot.tables)
+
+    snapshot.metadata["last_modified"] = dict(backend.last_modified)
+    assert tables_modified_since(snapshot, backend) == []
+    backend.touch("magasin")
+    assert tables_modified_since(snapshot, backend) == ["magasin"]
+
+
+def test_schema_linking_keeps_join_path_and_prunes():
+    from src.data.validation_set import load_validation_examples
+    from src.schema.linking import SchemaLinker, evaluate_schema_linking
+
+    linker = SchemaLinker(load_validation_snapshot().tables)
+    linked = linker.link("Quel est le chiffre d'affaires des maillots de bain à Lyon ?")
+    assert set(linked.tables) == {"ticket_caisse", "referentiel", "typo_produit", "magasin"}
+    assert ("referentiel", "EAN") in linked.columns and ("typo_produit", "ID_MODELE") in linked.columns
+    assert ("ticket_caisse", "DATE_TICKET") in linked.columns
+    assert ("ticket_caisse", "CODE_VENDEUR") not in linked.columns
+
+    assert not linker.link("Bonjour").pruned
+    assert evaluate_schema_linking(linker, load_validation_examples())["table_recall"] > 0.9
+
+
+def test_schema_renderers_cover_every_column():
+    import pytest
+    from src.schema.render import SCHEMA_RENDERERS, render_schema
+    from src.text_utils import estimate_tokens
+
+    tables = load_validation_snapshot().tables
+    tokens = {}
+    for encoding in SCHEMA_RENDERERS:
+        rendered = render_schema(tables, encoding)
+        tokens[encoding] = estimate_tokens(rendered)
+        for table, info in tables.items():
+            assert table in rendered
+            assert all(f["name"] in rendered for f in info["fields"])
+    assert tokens["terse"] < tokens["ddl"] < tokens["dedup"] < tokens["json"]
+    assert render_schema(tables, "dedup").count("Identifiant unique du client.") == 1
+    assert "CREATE TABLE" in render_schema(tables, "ddl") and "INT64" in render_schema(tables, "ddl")
+    with pytest.raises(ValueError):
+        render_schema(tables, "xml")
+
+
+def test_value_index_lookup_and_incremental_update(tmp_path):
+    from src.schema.linking import SchemaLinker
+    from src.schema.value_index import ValueIndex
+
+    tables = load_validation_snapshot().tables
+    index = ValueIndex.from_tables(tables)
+    found = {(m.column, m.value, m.kind) for m in index.lookup("CA des maillots de bain à Marseile")}
+    assert ("FAMILLE", "Bain_Maillot", "exact") in found
+    assert ("VILLE", "MARSEILLE", "fuzzy") in found
+    lyon = index.lookup("Combien de ventes à Lyon en 2022 ?")
+    assert lyon and all(m.kind == "partial" and m.value.startswith("LYON") for m in lyon)
+    assert not index.lookup("Quel est le panier moyen ?")
+
+    loaded = ValueIndex.load(index.save(str(tmp_path / "values.json")))
+    assert len(loaded) == len(index)
+    values = loaded.columns[("magasin", "VILLE")]["values"]
+    assert not loaded.update_column("magasin", "VILLE", values)
+    assert loaded.update_column("magasin", "VILLE", values + ["Brocéliande"], version="v2")
+    assert loaded.lookup("ventes à Broceliande")[0].value == "Brocéliande"
+
+    linked = SchemaLinker(tables, value_index=loaded).link("CA des maillots de bain à Marseile")
+    assert "typo_produit" in linked.tables and "magasin" in linked.tables
+    assert all("values" not in f for info in linked.tables.values() for f in info["fields"])
+    assert '"MARSEILLE"' in linked.render("bullets")
+
+
+def test_value_index_lookup_during_concurrent_updates():
+    import threading
+    from src.schema.value_index import ValueIndex
+
+    index = ValueIndex.from_tables(load_validation_snapshot().tables)
+    values = index.columns[("magasin", "VILLE")]["values"]
+    errors, stop = [], threading.Event()
+
+    def read():
+        while not stop.is_set():
+            try:
+                for match in index.lookup("CA des maillots de bain à Marseile"):
+                    assert match.value in values or match.column != "VILLE"
+            except Exception as e:  # IndexError / valeur d'une autre colonne si la publication n'est pas atomique
+                errors.append(e)
+                return
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for thread in readers:
+        thread.start()
+    for i in range(30):
+        index.update_column("magasin", "VILLE", values[i % 7:] + [f"VILLE_{i}"], version=str(i))
+        index.update_column("magasin", "VILLE", values, version=f"{i}b")
+    stop.set()
+    for thread in readers:
+        thread.join()
+    assert not errors
+
+
+def test_value_catalog_batches_and_skips_unchanged_tables(tmp_path):
+    from config.settings import FIELDS_TO_ENHANCE
+    from src.schema.information_schema import InMemorySchemaBackend, distinct_values_query
+    from src.schema.value_catalog import ValueCatalog, fetch_distinct_values
+
+    tables = load_validation_snapshot().tables
+    backend = InMemorySchemaBackend(tables, last_modified={table: 1000 for table in tables})
+    columns = [(table, column) for table, names in FIELDS_TO_ENHANCE.items() for column in names]
+    union = fetch_distinct_values(columns, backend=backend, method="union")
+    assert backend.round_trips == 1
+    assert union == fetch_distinct_values(columns, backend=backend, method="parallel", max_workers=4)
+    assert backend.round_trips == 1 + len(columns)
+    assert union[("magasin", "VILLE")] == sorted(union[("magasin", "VILLE")]) and None not in union[("magasin", "VILLE")]
+    assert distinct_values_query("p", "d", columns[:2]).count("UNION ALL") == 1
+
+    catalog = ValueCatalog("p", "d")
+    assert len(catalog.refresh(FIELDS_TO_ENHANCE, backend)) == len(columns)
+    assert catalog.refresh(FIELDS_TO_ENHANCE, backend) == []
+    backend.touch("typo_produit")
+    assert catalog.refresh(FIELDS_TO_ENHANCE, backend) == [("typo_produit", "LIGNE"), ("typo_produit", "FAMILLE")]
+
+    loaded = ValueCatalog.load(catalog.save(str(tmp_path / "values.json")))
+    assert loaded.values() == catalog.values()
+    assert loaded.stale_columns(FIELDS_TO_ENHANCE, backend.last_modified) == []
+
+
+def test_schema_validator_accepts_gold_queries_and_rejects_hallucinations():
+    import time
+    from src.data.validation_set import load_validation_examples
+    from src.schema.validator import SchemaValidator
+
+    snapshot = load_validation_snapshot()
+    validator = SchemaValidator(snapshot.tables, snapshot.project_id, snapshot.dataset_id, mode="reject")
+    start = time.perf_counter()
+    for example in load_validation_examples():
+        assert validator.check(example["sql"]).valid, example["sql"]
+    assert validator.stats["checked"] == 35 and validator.stats["invalid"] == 0
+
+    ok = [
+        "WITH t AS (SELECT EAN, SUM(QUANTITE) q FROM ticket_caisse GROUP BY EAN) SELECT t.EAN, q FROM t ORDER BY q DESC",
+        "SELECT s.n FROM (SELECT COUNT(*) n FROM ticket_caisse) s",
+        "SELECT EXTRACT(YEAR FROM CURRENT_DATE()) AS y, tc.* FROM `avisia-self-service-analytics.reine_des_maracas.ticket_caisse` tc",
+    ]
+    for sql in ok:
+        assert validator.check(sql).valid, sql
+    rejected = {
+        "SELECT tc.PRIX FROM ticket_caisse tc": "Colonne inconnue dans ticket_caisse : PRIX",
+        "SELECT COUNT(*) FROM tickets": "Table inconnue : tickets (vouliez-vous dire ticket_caisse ?)",
+        "SELECT x.EAN FROM ticket_caisse tc": "Table ou alias inconnu : x",
+        "SELECT EAN, FROM ticket_caisse": "Virgule avant FROM",
+        "SELECT COUNT(*) FROM ticket_caisse WHERE EAN = 'abc": "Chaîne ou identifiant non fermé",
+    }
+    for sql, reason in rejected.items():
+        check = validator.check(sql)
+        assert check.reason == reason and validator.should_skip(check)
+    assert validator.stats["remote_calls_saved"] == len(rejected)
+    assert (time.perf_counter() - start) / (35 + len(ok) + len(rejected)) < 0.005
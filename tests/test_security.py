@@ -24,6 +24,34 @@ def test_boolean_output():
     assert sanitize_sql_output("True") == (False, "Sortie booléenne invalide")
 
 
+def test_sanitize_sql_output_single_pass_allowlist():
+    assert sanitize_sql_output("SELECT MAX(update_date) FROM ticket_caisse WHERE LIBELLE = 'DELETE' -- DROP") == (True, "OK")
+    assert sanitize_sql_output("SELECT * FROM `avisia-self-service-analytics.reine_des_maracas.ticket_caisse`;") == (True, "OK")
+    assert sanitize_sql_output("SELECT EXTRACT(YEAR FROM tc.DATE_ACHAT) FROM ticket_caisse tc") == (True, "OK")
+    assert sanitize_sql_output("SELECT 1; DROP TABLE users") == (False, "Mot-clé interdit détecté : DROP")
+    assert sanitize_sql_output("WITH t AS (SELECT 1) MERGE users USING t ON TRUE") == (False, "Mot-clé interdit détecté : MERGE")
+    assert sanitize_sql_output("SELECT 1; SELECT 2") == (False, "Plusieurs instructions SQL")
+    assert sanitize_sql_output("SELECT * FROM autre.clients") == (
+        False, "Dataset non autorisé : avisia-self-service-analytics.autre")
+    # Toutes les tables sont résolues : listes séparées par des virgules (avec ou sans alias), sous-requêtes
+    allowed = "`avisia-self-service-analytics.reine_des_maracas.magasin`"
+    assert sanitize_sql_output(f"SELECT * FROM {allowed}, `other-proj.hr.salaries`") == (
+        False, "Dataset non autorisé : other-proj.hr")
+    assert sanitize_sql_output(f"SELECT * FROM {allowed} AS m, `other-proj.hr.salaries` s WHERE m.id = s.id") == (
+        False, "Dataset non autorisé : other-proj.hr")
+    assert sanitize_sql_output(f"SELECT * FROM {allowed} WHERE id IN (SELECT id FROM hr.salaries)") == (
+        False, "Dataset non autorisé : avisia-self-service-analytics.hr")
+    assert sanitize_sql_output(f"WITH t AS (SELECT * FROM {allowed}) SELECT * FROM t, UNNEST([1, 2]) x") == (True, "OK")
+    assert sanitize_sql_output(f"SELECT * FROM (SELECT id FROM {allowed}) s, /* */ hr . salaries") == (
+        False, "Dataset non autorisé : avisia-self-service-analytics.hr")
+    assert sanitize_sql_output(f"SELECT a.x IS DISTINCT FROM b.y, m.VILLE, m.CA FROM {allowed} m JOIN t ON m.id = t.id") == (True, "OK")
+    # Mots-clés de script ou d'écriture employés comme colonne, alias, champ ou nom de CTE
+    assert sanitize_sql_output(f"SELECT t.load, t.return, set FROM {allowed} t") == (True, "OK")
+    assert sanitize_sql_output(f"SELECT load, COUNT(*) set FROM {allowed} GROUP BY load") == (True, "OK")
+    assert sanitize_sql_output(f"WITH load AS (SELECT 1 AS x), set AS (SELECT 2 AS y) SELECT * FROM load, set") == (True, "OK")
+    assert sanitize_sql_output("SELECT 1; BEGIN DECLARE x INT64; END") == (False, "Mot-clé interdit détecté : BEGIN")
+
+
 def test_classify_scope_in_scope():
     from src.security.scope_filter import classify_scope
     assert classify_scope("Quel est le chiffre d'affaires ?") == "in_scope"
@@ -31,3 +59,68 @@ def test_classify_scope_in_scope():
 def test_classify_scope_out_scope():
     from src.security.scope_filter import classify_scope
     assert classify_scope("Quelle est la capitale de la France ?") == "out_of_scope"
+
+
+def test_local_scope_classifier_confident_cases():
+    from src.security.scope_classifier import train_scope_classifier
+    classifier = train_scope_classifier()
+    assert classifier.classify("Quelle est la capitale de l'Espagne ?") == "out_of_scope"
+    assert classifier.classify("Combien de tickets en 2022 à Lyon ?") == "in_scope"
+    assert 0.0 <= classifier.predict_proba("Qui a inventé le téléphone ?") <= 1.0
+
+    from src.security.scope_classifier import SEED_OUT_OF_SCOPE
+    held_out = train_scope_classifier(exclude=["  quelle est la CAPITALE de la France"])
+    assert held_out.predict_proba(SEED_OUT_OF_SCOPE[0]) > classifier.predict_proba(SEED_OUT_OF_SCOPE[0])
+
+
+def test_dry_run_sql_reports_tables_and_bytes_without_executing():
+    from google.api_core.exceptions import BadRequest
+    from google.cloud.bigquery import TableReference
+    from src.security.safety_checks import dry_run_sql
+
+    class FakeJob:
+        referenced_tables = [TableReference.from_string("projet.dataset.ticket_caisse")]
+        total_bytes_processed = 1234
+
+    class FakeClient:
+        def query(self, sql, job_config=None):
+            assert job_config.dry_run and not job_config.use_query_cache
+            if "inconnue" in sql:
+                raise BadRequest("Unrecognized name: inconnue")
+            return FakeJob()
+
+    result = dry_run_sql("SELECT COUNT(*) FROM `projet.dataset.ticket_caisse`", FakeClient())
+    assert (result.valid, result.tables, result.bytes_processed) == (True, ["projet.dataset.ticket_caisse"], 1234)
+    result = dry_run_sql("SELECT inconnue FROM `projet.dataset.ticket_caisse`", FakeClient())
+    assert not result.valid and "inconnue" in result.error
+
+
+def test_bigquery_client_registry_shares_clients_across_threads_and_forks(monkeypatch):
+    import os
+    from concurrent.futures import ThreadPoolExecutor
+    from src.bigquery_clients import BigQueryClientRegistry
+
+    registry = BigQueryClientRegistry(factory=lambda project_id, location: object())
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        clients = list(pool.map(lambda _: registry.get("projet", "EU"), range(64)))
+    assert registry.created == 1 and all(client is clients[0] for client in clients)
+    assert registry.get("projet", "US") is not clients[0] and len(registry) == 2
+
+    if hasattr(os, "fork"):
+        pid = os.fork()
+        if pid == 0:
+            os._exit(0 if registry.get("projet", "EU") is not clients[0] and registry.created == 1 else 1)
+        _, status = os.waitpid(pid, 0)
+        assert os.WEXITSTATUS(status) == 0
+        assert registry.get("projet", "EU") is clients[0]
+
+    # Identifiants chargés une fois, que le premier client soit REST ou Storage
+    import google.auth
+    from google.auth.credentials import AnonymousCredentials
+
+    loads = []
+    monkeypatch.setattr(google.auth, "default", lambda scopes=None: (loads.append(scopes) or AnonymousCredentials(), None))
+    registry = BigQueryClientRegistry()
+    credentials = registry._shared_credentials()
+    assert registry._shared_credentials() is credentials and registry.get("projet", "EU")._credentials is credentials
+    assert len(loads) == 1